@@ -1,20 +1,19 @@
 # eco_cond_toolset.py
 import os
+import time
+import sys
+import importlib
 from functools import partial
-from qgis.core import QgsProject, QgsRasterLayer, QgsLayerTreeLayer, QgsLayerTreeGroup, QgsApplication
+from qgis.core import QgsProject, QgsRasterLayer, QgsLayerTreeLayer, QgsLayerTreeGroup, QgsApplication, QgsMessageLog, Qgis
 
 from qgis.PyQt.QtCore import QCoreApplication
 from qgis.PyQt.QtCore import QUrl
 from qgis.PyQt.QtGui     import QIcon
-from qgis.PyQt.QtWidgets import QAction
+from qgis.PyQt.QtWidgets import QAction, QDialog
 
-# my_plugin/eco_cond_toolset.py
-from .tools.tool_align_layers           import AlignLayersTool
-from .tools.tool_solve_nodata           import SolveNoDataTool
-from .tools.tool_test_multicollinearity import CheckMulticollinearityDialog
-from .tools.tool_normalise_invert       import NormalizeTool
-from .tools.tool_calc_condition         import EcoCondTool
-from .tools.tool_about                  import aboutWindow
+# Tool modules (and their pandas / scipy / statsmodels / .ui loading) are
+# imported when their menu action is first triggered, not at QGIS startup
+LOG_TAG = "EcoCondition Toolset"
 
 
 class EcoConditionToolset:
@@ -22,32 +21,78 @@ class EcoConditionToolset:
         self.iface     = iface
         self.menu_name = "&Ecosystem Condition Toolset"
         self.actions   = []
+        # tool instances, created on first launch and reused afterwards
+        self.tools     = {}
 
     def initGui(self):
+        start = time.perf_counter()
         res = os.path.join(os.path.dirname(__file__), 'resources')
         tools = [
-            ("icon_AlignRasters_mini.png",     "1. Align layers (with clip and resample)",       AlignLayersTool),
-            ("icon_noDataCorr_mini.png",       "2. Solve no-data issues",                        SolveNoDataTool),
-            ("icon_Multicollinearity_mini.png","3. Multicollinearity assessment",                CheckMulticollinearityDialog),
-            ("icon_Normalization_mini.png",    "4. Normalise and invert (with no-data options)", NormalizeTool),
-            ("icon_EcoCond_mini.png",          "5. Ecosystem Condition assessment",              EcoCondTool),
-            ("icon_about.png",                 "About",                                          aboutWindow),
+            ("icon_AlignRasters_mini.png",     "1. Align layers (with clip and resample)",       "tool_align_layers",           "AlignLayersTool"),
+            ("icon_noDataCorr_mini.png",       "2. Solve no-data issues",                        "tool_solve_nodata",           "SolveNoDataTool"),
+            ("icon_Multicollinearity_mini.png","3. Multicollinearity assessment",                "tool_test_multicollinearity", "CheckMulticollinearityDialog"),
+            ("icon_Normalization_mini.png",    "4. Normalise and invert (with no-data options)", "tool_normalise_invert",       "NormalizeTool"),
+            ("icon_EcoCond_mini.png",          "5. Ecosystem Condition assessment",              "tool_calc_condition",         "EcoCondTool"),
+            ("icon_about.png",                 "About",                                          "tool_about",                  "aboutWindow"),
         ]
-        for icon_file, label, ToolClass in tools:
+        for icon_file, label, module, class_name in tools:
             icon   = QIcon(os.path.join(res, icon_file))
             action = QAction(icon, label, self.iface.mainWindow())
-            # instantiate the tool with the real iface, then call its run()
-            action.triggered.connect(partial(self.launch_tool, ToolClass))
+            # import the tool on first use, instantiate it with the real iface, then call its run()
+            action.triggered.connect(partial(self.launch_tool, module, class_name))
             self.iface.addPluginToMenu(self.menu_name, action)
             self.iface.addToolBarIcon(action)
             self.actions.append(action)
+        # toolbox-wide compute precision (menu only)
+        from .tools.precision import compute_precision
+        action = QAction("Compute in float32 (half the memory)", self.iface.mainWindow())
+        action.setCheckable(True)
+        action.setChecked(compute_precision() == 'float32')
+        action.setToolTip("Read and transform pixels as float32; sums and moments stay float64")
+        action.toggled.connect(self.set_precision)
+        self.iface.addPluginToMenu(self.menu_name, action)
+        self.actions.append(action)
+        QgsMessageLog.logMessage(
+            f"Menu set up in {1000 * (time.perf_counter() - start):.1f} ms (tools load on first use)",
+            LOG_TAG, Qgis.Info
+        )
 
     def unload(self):
         for action in self.actions:
             self.iface.removePluginMenu(self.menu_name, action)
             self.iface.removeToolBarIcon(action)
         self.actions.clear()
+        # cached dialogs are parented to the QGIS main window: delete them,
+        # or they outlive a plugin reload
+        for tool in self.tools.values():
+            for dialog in (tool, getattr(tool, 'dlg', None), getattr(tool, 'dialog', None)):
+                if isinstance(dialog, QDialog):
+                    dialog.close()
+                    dialog.deleteLater()
+        self.tools.clear()
 
-    def launch_tool(self, ToolClass, checked=False):
-        tool = ToolClass(self.iface)
+    def set_precision(self, use_float32):
+        from .tools.precision import set_compute_precision
+        set_compute_precision('float32' if use_float32 else 'float64')
+        QgsMessageLog.logMessage(
+            f"Compute precision: {'float32' if use_float32 else 'float64'}", LOG_TAG, Qgis.Info
+        )
+
+    def tool_class(self, module, class_name):
+        # import tools/<module>.py once, logging how long the import took
+        name = f"{__package__}.tools.{module}"
+        if name not in sys.modules:
+            start = time.perf_counter()
+            importlib.import_module(name)
+            QgsMessageLog.logMessage(
+                f"{module} loaded in {1000 * (time.perf_counter() - start):.1f} ms",
+                LOG_TAG, Qgis.Info
+            )
+        return getattr(sys.modules[name], class_name)
+
+    def launch_tool(self, module, class_name, checked=False):
+        # reuse the tool (and its dialog) between launches; run() resets its state
+        tool = self.tools.get(class_name)
+        if tool is None:
+            tool = self.tools[class_name] = self.tool_class(module, class_name)(self.iface)
         tool.run()
@@ -0,0 +1,832 @@
+# -*- coding: utf-8 -*-
+"""
+Numerical helpers for the multicollinearity tool of EcoCondition Toolbox
+"""
+
+import numpy as np
+from scipy.stats import rankdata
+
+# GDAL data types holding whole numbers only (class / count rasters)
+INTEGER_GDAL_TYPES = (
+    'Byte', 'Int8', 'UInt16', 'Int16', 'UInt32', 'Int32', 'UInt64', 'Int64'
+)
+
+# Upper bound on the histogram size used by the counting-sort ranking.
+# Beyond this many distinct integer levels the generic argsort is used.
+COUNTING_RANK_MAX_BINS = 1 << 22
+
+
+def is_integer_valued(values):
+    """True if every value of the (NaN-free) 1-D array is a whole number."""
+    if values.size == 0:
+        return False
+    if np.issubdtype(values.dtype, np.integer):
+        return True
+    return bool(np.array_equal(values, np.trunc(values)))
+
+
+def counting_ranks(values):
+    """
+    Tie-averaged ranks (1-based, as scipy.stats.rankdata) of an integer-valued
+    1-D array, computed in O(n) from a histogram and its cumulative counts.
+    Returns None when the value range is too wide for a histogram.
+    """
+    # Python / int64 arithmetic: differences of narrow integer types wrap
+    vmin = int(values.min())
+    span = int(values.max()) - vmin + 1
+    if span > COUNTING_RANK_MAX_BINS:
+        return None
+
+    codes  = values.astype(np.int64) - vmin
+    counts = np.bincount(codes, minlength=span)
+    upper  = np.cumsum(counts)
+    # a level with c pixels occupies ranks upper-c+1 .. upper → mean rank
+    level_rank = upper - (counts - 1) / 2.0
+    return level_rank[codes]
+
+
+def average_ranks(values, integer_valued=None):
+    """
+    Tie-averaged ranks of a 1-D array. Integer-valued data (class or count
+    rasters, also when stored as floats after alignment) use the counting
+    sort; everything else falls back to scipy's argsort-based rankdata.
+    """
+    if integer_valued is None:
+        integer_valued = is_integer_valued(values)
+    if integer_valued:
+        ranks = counting_ranks(values)
+        if ranks is not None:
+            return ranks
+    return rankdata(values)
+
+
+# Layers per group when the correlation matrix is computed blockwise
+SPARSE_GROUP_SIZE = 64
+
+
+def standardised_ranks(filtered, integer_flags=None, callback=None):
+    """
+    Column ranks centred and scaled to unit norm, so that z[:, a].T @ z[:, b]
+    is the Spearman rho block between layer groups a and b. Constant layers
+    get NaN columns. `callback(i, k)` is called after each layer is ranked.
+    """
+    n, k = filtered.shape
+    if integer_flags is None:
+        integer_flags = [None] * k
+    z = np.empty((n, k))
+    for i in range(k):
+        r = average_ranks(filtered[:, i], integer_flags[i])
+        r = r - r.mean()
+        norm = np.sqrt(np.dot(r, r))
+        z[:, i] = r / norm if norm > 0 else np.nan
+        if callback is not None:
+            callback(i + 1, k)
+    return z
+
+
+def spearman_from_ranks(z):
+    """Dense Spearman rho matrix from standardised ranks."""
+    corr = np.clip(z.T @ z, -1.0, 1.0)
+    return np.atleast_2d(corr)
+
+
+def edges_from_ranks(z, threshold=0.8, group_size=SPARSE_GROUP_SIZE):
+    """
+    Sparse Spearman result: only the layer pairs (i < j) with |rho| at or
+    above `threshold`. The matrix is computed block by block over groups of
+    `group_size` layers, so the dense k x k matrix is never formed.
+    Returns (i, j, rho) arrays sorted by decreasing |rho|.
+    """
+    k = z.shape[1]
+    rows, cols, vals = [], [], []
+    for a0 in range(0, k, group_size):
+        za = z[:, a0:a0 + group_size]
+        for b0 in range(a0, k, group_size):
+            block = np.clip(za.T @ z[:, b0:b0 + group_size], -1.0, 1.0)
+            with np.errstate(invalid='ignore'):
+                ii, jj = np.nonzero(np.abs(block) >= threshold)
+            gi, gj = ii + a0, jj + b0
+            keep = gi < gj
+            rows.append(gi[keep])
+            cols.append(gj[keep])
+            vals.append(block[ii[keep], jj[keep]])
+    i = np.concatenate(rows) if rows else np.empty(0, dtype=int)
+    j = np.concatenate(cols) if cols else np.empty(0, dtype=int)
+    rho = np.concatenate(vals) if vals else np.empty(0)
+    order = np.argsort(-np.abs(rho), kind='stable')
+    return i[order], j[order], rho[order]
+
+
+def spearman_matrix(filtered, integer_flags=None, callback=None):
+    """
+    Spearman ρ matrix of the columns of a (pixels x layers) array without
+    NaNs: Pearson correlation of the column ranks. Always returns a k x k
+    matrix (scipy's spearmanr returns a scalar for two columns).
+    """
+    return spearman_from_ranks(standardised_ranks(filtered, integer_flags, callback))
+
+
+def spearman_edges(filtered, integer_flags=None, threshold=0.8,
+                   group_size=SPARSE_GROUP_SIZE, callback=None):
+    """Sparse (i, j, rho) Spearman edges of a (pixels x layers) array."""
+    z = standardised_ranks(filtered, integer_flags, callback)
+    return edges_from_ranks(z, threshold, group_size)
+
+
+def edges_to_dense(edges, k):
+    """Dense k x k matrix from sparse (i, j, rho) edges; missing pairs are 0."""
+    i, j, rho = edges
+    dense = np.eye(k)
+    dense[i, j] = rho
+    dense[j, i] = rho
+    return dense
+
+
+class StreamingMoments:
+    """
+    Single-pass, mergeable accumulator of the per-layer moments and the
+    cross-layer co-moments of a (pixels x layers) stream of NaN-free rows.
+
+    Blocks are folded in with the pairwise update of Chan et al. / Pébay,
+    so accumulators filled by separate workers can be merged exactly.
+    """
+
+    def __init__(self, k):
+        self.k        = k
+        self.n        = 0
+        self.mean     = np.zeros(k)
+        self.comoment = np.zeros((k, k))   # Σ (x - mean)(x - mean)ᵀ
+        self.m3       = np.zeros(k)        # Σ (x - mean)³ per layer
+        self.m4       = np.zeros(k)        # Σ (x - mean)⁴ per layer
+        self.min      = np.full(k, np.inf)
+        self.max      = np.full(k, -np.inf)
+
+    @classmethod
+    def from_block(cls, block):
+        acc = cls(block.shape[1])
+        if block.shape[0] == 0:
+            return acc
+        acc.n        = block.shape[0]
+        # float64 moments, also for float32 blocks
+        acc.mean     = block.mean(axis=0, dtype=np.float64)
+        dev          = block - acc.mean
+        acc.comoment = dev.T @ dev
+        dev2         = dev * dev
+        acc.m3       = (dev2 * dev).sum(axis=0)
+        acc.m4       = (dev2 * dev2).sum(axis=0)
+        acc.min      = block.min(axis=0)
+        acc.max      = block.max(axis=0)
+        return acc
+
+    def update(self, block):
+        """Fold a (rows x layers) block of valid pixels into the totals."""
+        if block.shape[0]:
+            self.merge(StreamingMoments.from_block(block))
+
+    def merge(self, other):
+        """Combine another accumulator over a disjoint set of pixels."""
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean = other.n, other.mean.copy()
+            self.comoment = other.comoment.copy()
+            self.m3, self.m4 = other.m3.copy(), other.m4.copy()
+            self.min, self.max = other.min.copy(), other.max.copy()
+            return self
+
+        na, nb = float(self.n), float(other.n)
+        n      = na + nb
+        delta  = other.mean - self.mean
+        m2a    = np.diag(self.comoment)
+        m2b    = np.diag(other.comoment)
+
+        m4 = (self.m4 + other.m4
+              + delta**4 * na * nb * (na*na - na*nb + nb*nb) / n**3
+              + 6 * delta**2 * (na*na * m2b + nb*nb * m2a) / n**2
+              + 4 * delta * (na * other.m3 - nb * self.m3) / n)
+        m3 = (self.m3 + other.m3
+              + delta**3 * na * nb * (na - nb) / n**2
+              + 3 * delta * (na * m2b - nb * m2a) / n)
+
+        self.comoment = (self.comoment + other.comoment
+                         + np.outer(delta, delta) * na * nb / n)
+        self.mean = self.mean + delta * nb / n
+        self.m3, self.m4 = m3, m4
+        self.n = self.n + other.n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    # ** derived statistics **
+    def covariance(self):
+        if self.n < 2:
+            return np.full((self.k, self.k), np.nan)
+        return self.comoment / (self.n - 1)
+
+    def std(self):
+        return np.sqrt(np.diag(self.covariance()))
+
+    def pearson(self):
+        cov = self.covariance()
+        sd  = np.sqrt(np.diag(cov))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(sd, sd)
+        np.fill_diagonal(corr, 1.0)
+        return corr
+
+    def skewness(self):
+        m2 = np.diag(self.comoment) / max(self.n, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (self.m3 / max(self.n, 1)) / m2**1.5
+
+    def kurtosis(self):
+        """Excess kurtosis (0 for a normal distribution)."""
+        m2 = np.diag(self.comoment) / max(self.n, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (self.m4 / max(self.n, 1)) / m2**2 - 3.0
+
+    def layer_summary(self, names):
+        """Per-layer moments as {name: {statistic: value}}."""
+        std, skew, kurt = self.std(), self.skewness(), self.kurtosis()
+        return {
+            name: {
+                'n':        int(self.n),
+                'mean':     float(self.mean[i]),
+                'std':      float(std[i]),
+                'min':      float(self.min[i]),
+                'max':      float(self.max[i]),
+                'skewness': float(skew[i]),
+                'kurtosis': float(kurt[i]),
+            }
+            for i, name in enumerate(names)
+        }
+
+
+# ** Local (moving-window) correlation **
+
+# Minimum number of valid pixel pairs for a local correlation value
+MIN_LOCAL_PIXELS = 3
+
+# Histogram resolution used to rank continuous layers for local Spearman maps
+RANK_HISTOGRAM_BINS = 1 << 16
+
+
+def box_sum(arr, half):
+    """
+    Sum of `arr` over the (2*half+1)² window centred on every pixel, windows
+    truncated at the array edges. Uses an integral image, so the cost does
+    not depend on the window size.
+    """
+    nr, nc = arr.shape
+    integral = np.zeros((nr + 1, nc + 1))
+    np.cumsum(arr, axis=0, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+
+    r0 = np.clip(np.arange(nr) - half, 0, nr)
+    r1 = np.clip(np.arange(nr) + half + 1, 0, nr)
+    c0 = np.clip(np.arange(nc) - half, 0, nc)
+    c1 = np.clip(np.arange(nc) + half + 1, 0, nc)
+    top, bottom = integral[r0], integral[r1]
+    return bottom[:, c1] - top[:, c1] - bottom[:, c0] + top[:, c0]
+
+
+def _pearson_from_sums(n, sx, sy, sxx, syy, sxy, min_count):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = n * sxy - sx * sy
+        vx  = n * sxx - sx * sx
+        vy  = n * syy - sy * sy
+        r   = cov / np.sqrt(vx * vy)
+    r[(n < min_count) | ~(vx > 0) | ~(vy > 0)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def local_pearson(x, y, half, min_count=MIN_LOCAL_PIXELS):
+    """
+    Moving-window Pearson r of two equally shaped arrays (NaN = no data),
+    over a (2*half+1)² window centred on each pixel. Pixels where either
+    input is missing get NaN. Inputs should be roughly centred (e.g. minus
+    the layer mean, or ranks scaled to 0–1) to keep the sums well conditioned.
+    """
+    valid = ~(np.isnan(x) | np.isnan(y))
+    xv = np.where(valid, x, 0.0)
+    yv = np.where(valid, y, 0.0)
+    r = _pearson_from_sums(
+        box_sum(valid.astype(float), half),
+        box_sum(xv, half), box_sum(yv, half),
+        box_sum(xv * xv, half), box_sum(yv * yv, half),
+        box_sum(xv * yv, half),
+        min_count,
+    )
+    r[~valid] = np.nan
+    return r
+
+
+def tile_pearson(x, y, tile, min_count=MIN_LOCAL_PIXELS):
+    """
+    Pearson r per non-overlapping tile x tile block. Returns an array of
+    shape (ceil(rows/tile), ceil(cols/tile)).
+    """
+    nr, nc = x.shape
+    tr, tc = -(-nr // tile), -(-nc // tile)
+    pad = ((0, tr * tile - nr), (0, tc * tile - nc))
+    valid = ~(np.isnan(x) | np.isnan(y))
+    xv = np.pad(np.where(valid, x, 0.0), pad)
+    yv = np.pad(np.where(valid, y, 0.0), pad)
+    vv = np.pad(valid.astype(float), pad)
+
+    def tsum(a):
+        return a.reshape(tr, tile, tc, tile).sum(axis=(1, 3))
+
+    return _pearson_from_sums(
+        tsum(vv), tsum(xv), tsum(yv),
+        tsum(xv * xv), tsum(yv * yv), tsum(xv * yv),
+        min_count,
+    )
+
+
+class RankHistogram:
+    """
+    Global value → rank mapping of one layer, accumulated block by block.
+
+    Integer-valued layers keep one bin per level (exact tie-averaged ranks);
+    continuous layers use a fine histogram and interpolate inside each bin.
+    `lookup` returns ranks scaled to 0–1, so local Spearman maps can be made
+    block by block as Pearson r of the globally rank-transformed layers.
+    """
+
+    def __init__(self, vmin, vmax, integer_valued, bins=RANK_HISTOGRAM_BINS):
+        self.vmin    = float(vmin)
+        self.integer = bool(integer_valued) and (vmax - vmin) < COUNTING_RANK_MAX_BINS
+        if self.integer:
+            self.nbins = int(vmax - vmin) + 1
+            self.width = 1.0
+        else:
+            self.nbins = bins
+            self.width = max(float(vmax - vmin), np.finfo(float).tiny) / bins
+        self.counts = np.zeros(self.nbins, dtype=np.int64)
+
+    def _codes(self, values):
+        codes = np.floor((values - self.vmin) / self.width).astype(np.int64)
+        return np.clip(codes, 0, self.nbins - 1)
+
+    def update(self, values):
+        """Add NaN-free values to the histogram."""
+        if values.size:
+            self.counts += np.bincount(self._codes(values), minlength=self.nbins)
+
+    def lookup(self, values):
+        """Scaled ranks (0–1) of `values`; NaN stays NaN."""
+        total = max(int(self.counts.sum()), 1)
+        below = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+        out = np.full(values.shape, np.nan)
+        ok = ~np.isnan(values)
+        codes = self._codes(values[ok])
+        if self.integer:
+            rank = below[codes] + (self.counts[codes] + 1) / 2.0
+        else:
+            frac = (values[ok] - self.vmin) / self.width - codes
+            rank = below[codes] + np.clip(frac, 0.0, 1.0) * self.counts[codes] + 0.5
+        out[ok] = rank / total
+        return out
+
+
+# ** Redundancy pruning (VIF from the inverse correlation matrix) **
+
+# Tiny ridge keeping the inverse finite when layers are perfectly collinear
+VIF_RIDGE = 1e-10
+# VIF values above this are reported as perfect collinearity
+VIF_PERFECT = 1e8
+
+
+def _inverse_corr(corr):
+    # constant layers have undefined r: treat them as uncorrelated
+    k = corr.shape[0]
+    corr = np.nan_to_num(corr, nan=0.0)
+    np.fill_diagonal(corr, 1.0)
+    return np.linalg.inv(corr + VIF_RIDGE * np.eye(k))
+
+
+def _vif(inv):
+    vif = np.diag(inv).copy()
+    vif[vif >= VIF_PERFECT] = np.inf
+    return vif
+
+
+def vif_from_corr(corr):
+    """VIF of every layer: the diagonal of the inverse correlation matrix."""
+    return _vif(_inverse_corr(np.asarray(corr, dtype=float)))
+
+
+def _drop_from_inverse(inv, j):
+    """
+    Inverse correlation matrix with variable j removed, by a rank-one
+    (Schur complement) update of the current inverse: O(k²) per step.
+    """
+    keep = np.arange(inv.shape[0]) != j
+    col  = inv[keep, j]
+    return inv[np.ix_(keep, keep)] - np.outer(col, col) / inv[j, j]
+
+
+def prune_by_vif(corr, names, threshold=10.0, inv=None):
+    """
+    Iteratively drop the layer with the highest VIF until every VIF is
+    below `threshold` (or one layer is left). Returns a dict with the
+    elimination `path` (one entry per step), and the `kept` / `removed`
+    layer names.
+    """
+    names = list(names)
+    if inv is None:
+        inv = _inverse_corr(np.asarray(corr, dtype=float))
+    path, removed = [], []
+    while len(names) > 1:
+        vif = _vif(inv)
+        j = int(np.argmax(vif))
+        if vif[j] < threshold:
+            break
+        path.append({
+            'removed': names[j],
+            'vif':     float(vif[j]),
+            'max_vif_after': None,
+        })
+        removed.append(names.pop(j))
+        inv = _drop_from_inverse(inv, j)
+        path[-1]['max_vif_after'] = float(_vif(inv).max()) if len(names) > 1 else 1.0
+    final_vif = _vif(inv) if len(names) > 1 else np.ones(len(names))
+    return {
+        'path':    path,
+        'kept':    names,
+        'removed': removed,
+        'vif':     dict(zip(names, final_vif.tolist())),
+    }
+
+
+def prune_by_clusters(rho, corr, names, rho_threshold=0.8, vif_threshold=10.0):
+    """
+    Group layers whose |rho| reaches `rho_threshold` (complete-linkage
+    clustering on 1 - |rho|), keep one representative per group (the member
+    most correlated with the rest of its group), then finish with
+    `prune_by_vif` on the representatives.
+    """
+    from scipy.cluster.hierarchy import fcluster, linkage
+    from scipy.spatial.distance import squareform
+
+    names = list(names)
+    k = len(names)
+    absr = np.abs(np.nan_to_num(np.asarray(rho, dtype=float)))
+    if k > 1:
+        dist = np.clip(1.0 - absr, 0.0, None)
+        np.fill_diagonal(dist, 0.0)
+        dist = (dist + dist.T) / 2.0
+        labels = fcluster(
+            linkage(squareform(dist, checks=False), method='complete'),
+            t=1.0 - rho_threshold, criterion='distance'
+        )
+    else:
+        labels = np.ones(k, dtype=int)
+
+    clusters, reps = [], []
+    for lab in np.unique(labels):
+        members = np.flatnonzero(labels == lab)
+        if members.size > 1:
+            centrality = absr[np.ix_(members, members)].sum(axis=1)
+            rep = int(members[np.argmax(centrality)])
+        else:
+            rep = int(members[0])
+        reps.append(rep)
+        clusters.append({
+            'members':        [names[m] for m in members],
+            'representative': names[rep],
+        })
+
+    reps.sort()
+    sub = np.asarray(corr, dtype=float)[np.ix_(reps, reps)]
+    result = prune_by_vif(sub, [names[r] for r in reps], vif_threshold)
+    result['clusters'] = clusters
+    result['removed'] = [n for n in names if n not in result['kept']]
+    return result
+
+
+# ** Bootstrap stability of rho and VIF **
+
+# Rows per chunk when weighted cross products are accumulated
+BOOTSTRAP_CHUNK_ROWS = 1 << 16
+
+
+def spatial_block_ids(yoff, nrows, xsize, block):
+    """Spatial block number of every pixel of a full-width strip."""
+    nbx  = -(-xsize // block)
+    rows = np.arange(yoff, yoff + nrows) // block
+    cols = np.arange(xsize) // block
+    return (rows[:, None] * nbx + cols[None, :]).ravel()
+
+
+def block_statistics(arrays, block_ids):
+    """
+    Per spatial block sufficient statistics of each (pixels x layers) array
+    in `arrays`: pixel counts (B,), sums (B, k) and cross products (B, k, k).
+    A block-bootstrap replicate is then a weighted sum over blocks, with no
+    pixel data involved.
+    """
+    order = np.argsort(block_ids, kind='stable')
+    _, starts, counts = np.unique(block_ids[order], return_index=True, return_counts=True)
+    stats = {'counts': counts.astype(float), 'sums': [], 'cross': []}
+    for arr in arrays:
+        srt = arr[order]
+        stats['sums'].append(np.add.reduceat(srt, starts, axis=0))
+        cross = np.empty((len(starts), arr.shape[1], arr.shape[1]))
+        for b, (s0, c) in enumerate(zip(starts, counts)):
+            part = srt[s0:s0 + c]
+            cross[b] = part.T @ part
+        stats['cross'].append(cross)
+    return stats
+
+
+def _corr_from_weighted_sums(total, sums, cross):
+    mean = sums / total
+    cov  = cross / total - np.outer(mean, mean)
+    sd   = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.outer(sd, sd)
+    np.fill_diagonal(corr, 1.0)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def bootstrap_replicates(source, seeds):
+    """
+    Bootstrap replicates of the Spearman rho matrix (Pearson r of the cached
+    ranks) and of the VIFs (inverse Pearson matrix of the values).
+
+    source['mode'] == 'block': spatial block bootstrap from `block_statistics`
+    (blocks drawn with replacement), memory mapped from source['counts_path'],
+    source['sum_paths'] and source['cross_paths'] (one per array).
+    source['mode'] == 'pixel': Poisson bootstrap of single pixels from the
+    cached rank / value arrays, memory mapped from source['rank_path'] and
+    source['value_path'].
+
+    Module level so it can run in a process pool: `source` only holds file
+    paths, so every job is pickled in a few bytes and the processes share
+    the arrays through the page cache. Returns (rho, vif) arrays of shape
+    (r, k, k) and (r, k).
+    """
+    rho_reps, vif_reps = [], []
+    if source['mode'] == 'block':
+        counts = np.load(source['counts_path'], mmap_mode='r')
+        sums   = [np.load(path, mmap_mode='r') for path in source['sum_paths']]
+        crosses = [np.load(path, mmap_mode='r') for path in source['cross_paths']]
+        nblocks = counts.shape[0]
+        for seed in seeds:
+            rng = np.random.default_rng(seed)
+            w = rng.multinomial(nblocks, np.full(nblocks, 1.0 / nblocks)).astype(float)
+            total = w @ counts
+            mats = [
+                _corr_from_weighted_sums(
+                    total, w @ block_sums, np.tensordot(w, cross, axes=1)
+                )
+                for block_sums, cross in zip(sums, crosses)
+            ]
+            rho_reps.append(mats[0])
+            vif_reps.append(vif_from_corr(mats[1]))
+    else:
+        z = np.load(source['rank_path'], mmap_mode='r')
+        x = np.load(source['value_path'], mmap_mode='r')
+        n, k = z.shape
+        for seed in seeds:
+            rng = np.random.default_rng(seed)
+            total = 0.0
+            acc = [[np.zeros(k), np.zeros((k, k))] for _ in range(2)]
+            for s0 in range(0, n, BOOTSTRAP_CHUNK_ROWS):
+                w = rng.poisson(1.0, min(BOOTSTRAP_CHUNK_ROWS, n - s0)).astype(float)
+                total += w.sum()
+                for a, arr in zip(acc, (z, x)):
+                    part = np.asarray(arr[s0:s0 + w.size])
+                    a[0] += w @ part
+                    a[1] += (part * w[:, None]).T @ part
+            rho_reps.append(_corr_from_weighted_sums(total, *acc[0]))
+            vif_reps.append(vif_from_corr(_corr_from_weighted_sums(total, *acc[1])))
+    return np.array(rho_reps), np.array(vif_reps)
+
+
+def bootstrap_intervals(rho_reps, vif_reps, level=0.95):
+    """Percentile intervals and standard deviations over the replicates."""
+    lo, hi = 50.0 * (1.0 - level), 50.0 * (1.0 + level)
+    with np.errstate(invalid='ignore'):
+        return {
+            'level':   level,
+            'n':       int(rho_reps.shape[0]),
+            'rho_lo':  np.nanpercentile(rho_reps, lo, axis=0),
+            'rho_hi':  np.nanpercentile(rho_reps, hi, axis=0),
+            'rho_sd':  np.nanstd(rho_reps, axis=0),
+            'vif_lo':  np.nanpercentile(vif_reps, lo, axis=0),
+            'vif_hi':  np.nanpercentile(vif_reps, hi, axis=0),
+        }
+
+
+# ** Spatial autocorrelation: variogram range and grid thinning **
+
+# Lags (pixels) of the quick semivariogram
+VARIOGRAM_LAGS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64, 96, 128)
+# Semivariance / sill reached at the practical range
+VARIOGRAM_SILL_FRACTION = 0.95
+
+
+class Semivariogram:
+    """
+    Empirical semivariograms of k layers along rows and columns, pooled over
+    sample windows. Each window is a (rows, cols, k) array, NaN outside the
+    valid area; pairs straddling a NaN are skipped.
+    """
+
+    def __init__(self, k, lags=VARIOGRAM_LAGS):
+        self.lags   = np.asarray(lags)
+        self.sq     = np.zeros((len(lags), k))
+        self.pairs  = np.zeros((len(lags), k))
+        self.n      = np.zeros(k)
+        self.sum    = np.zeros(k)
+        self.sumsq  = np.zeros(k)
+
+    def update(self, window):
+        ok = ~np.isnan(window)
+        self.n     += ok.sum(axis=(0, 1))
+        self.sum   += np.nansum(window, axis=(0, 1))
+        self.sumsq += np.nansum(window * window, axis=(0, 1))
+        for li, h in enumerate(self.lags):
+            for d in (window[:, h:] - window[:, :-h], window[h:] - window[:-h]):
+                if d.size:
+                    self.sq[li]    += np.nansum(d * d, axis=(0, 1))
+                    self.pairs[li] += (~np.isnan(d)).sum(axis=(0, 1))
+
+    def gamma(self):
+        """Semivariance per lag and layer, scaled by the layer variance (sill)."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var   = self.sumsq / self.n - (self.sum / self.n) ** 2
+            gamma = 0.5 * self.sq / self.pairs
+            return gamma / var
+
+    def practical_range(self, fraction=VARIOGRAM_SILL_FRACTION):
+        """
+        Lag (pixels) at which each layer's scaled semivariance first reaches
+        `fraction` of the sill, interpolated between lags; the largest lag
+        when it is never reached, NaN for constant or empty layers.
+        """
+        g = self.gamma()
+        ranges = np.full(g.shape[1], np.nan)
+        for i in range(g.shape[1]):
+            gi = g[:, i]
+            if not np.isfinite(gi).any():
+                continue
+            hit = np.nonzero(gi >= fraction)[0]
+            if not len(hit):
+                ranges[i] = self.lags[-1]
+            elif hit[0] == 0:
+                ranges[i] = self.lags[0]
+            else:
+                a, b = hit[0] - 1, hit[0]
+                t = (fraction - gi[a]) / max(gi[b] - gi[a], 1e-12)
+                ranges[i] = self.lags[a] + t * (self.lags[b] - self.lags[a])
+        return ranges
+
+
+def thinning_step(ranges, expected_valid, min_pixels):
+    """
+    Grid step (pixels) for approximately independent samples: the largest
+    practical range, reduced so that about `min_pixels` remain.
+    """
+    finite = np.asarray(ranges)[np.isfinite(ranges)]
+    if not len(finite):
+        return 1
+    step = int(np.ceil(finite.max()))
+    cap  = int(np.sqrt(max(expected_valid, 1) / max(min_pixels, 1)))
+    return max(1, min(step, max(cap, 1)))
+
+
+def thinning_selector(yoff, nrows, xsize, step):
+    """Flat indices, within a full-width strip, of the pixels on the thinned grid."""
+    rows = np.nonzero((np.arange(yoff, yoff + nrows) % step) == 0)[0]
+    cols = np.arange(0, xsize, step)
+    return (rows[:, None] * xsize + cols[None, :]).ravel()
+
+
+# ** Nonlinear dependence: mutual information from joint histograms **
+
+# Equal-width bins per layer of the joint histograms
+MI_BINS = 32
+
+
+class JointHistograms:
+    """
+    Quantised 2-D joint histograms of every layer pair, accumulated block by
+    block. Bins are equal-width between each layer's `lows` and `highs`
+    (values outside are clipped into the edge bins), so memory is
+    bins² x pairs and independent of the number of pixels.
+    """
+
+    def __init__(self, lows, highs, bins=MI_BINS):
+        self.k     = len(lows)
+        self.bins  = bins
+        self.low   = np.asarray(lows, dtype=float)
+        span       = np.asarray(highs, dtype=float) - self.low
+        self.width = np.where(span > 0, span, 1.0) / bins
+        # counts[i] holds the histograms of (i, j) for j > i: (k-i-1, bins, bins)
+        self.counts = [np.zeros((self.k - i - 1, bins, bins), dtype=np.int64)
+                       for i in range(self.k)]
+
+    def update(self, values):
+        """Add NaN-free (pixels x layers) values."""
+        if not len(values):
+            return
+        b = self.bins
+        codes = np.floor((values - self.low) / self.width).astype(np.int64)
+        np.clip(codes, 0, b - 1, out=codes)
+        for i in range(self.k - 1):
+            m = self.k - i - 1
+            flat = codes[:, i, None] * b + codes[:, i + 1:] + np.arange(m) * (b * b)
+            self.counts[i] += np.bincount(flat.ravel(), minlength=m * b * b).reshape(m, b, b)
+
+    def mutual_information(self):
+        """
+        (k x k) mutual information (nats) and the (k,) marginal entropies;
+        the diagonal holds the entropies.
+        """
+        mi = np.zeros((self.k, self.k))
+        entropy = np.full(self.k, np.nan)
+
+        def h(counts):
+            # entropy from integer counts (exactly 0 for a single bin)
+            counts = counts[counts > 0]
+            p = counts / counts.sum()
+            return -np.sum(p * np.log(p))
+
+        for i in range(self.k - 1):
+            for m, hist in enumerate(self.counts[i]):
+                j = i + 1 + m
+                if not hist.any():
+                    mi[i, j] = mi[j, i] = np.nan
+                    continue
+                hx, hy = h(hist.sum(axis=1)), h(hist.sum(axis=0))
+                entropy[i], entropy[j] = hx, hy
+                mi[i, j] = mi[j, i] = max(hx + hy - h(hist.ravel()), 0.0)
+        np.fill_diagonal(mi, entropy)
+        return mi, entropy
+
+    def nmi(self):
+        """
+        Normalised mutual information I / sqrt(H(X) H(Y)), 0–1; NaN for
+        constant layers.
+        """
+        mi, entropy = self.mutual_information()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = mi / np.sqrt(np.outer(entropy, entropy))
+        out[np.outer(entropy, entropy) <= 0] = np.nan
+        np.fill_diagonal(out, 1.0)
+        return out
+
+    def informational_correlation(self):
+        """
+        Linfoot's informational coefficient sqrt(1 - exp(-2 I)): equals |r|
+        for bivariate normal data, so it reads on the same scale as ρ.
+        """
+        mi, _ = self.mutual_information()
+        out = np.sqrt(1.0 - np.exp(-2.0 * mi))
+        np.fill_diagonal(out, 1.0)
+        return out
+
+
+# ** Eigen-decomposition / PCA of the streamed correlation matrix **
+
+# Share of the variance the reported number of components must explain
+PCA_VARIANCE_TARGET = 0.9
+
+
+def pca_from_corr(corr, variance_target=PCA_VARIANCE_TARGET):
+    """
+    PCA of standardised layers from their (k x k) Pearson matrix.
+
+    Returns eigenvalues (descending), explained / cumulative variance
+    shares, condition indices sqrt(λmax / λi), the condition number
+    sqrt(λmax / λmin), loadings (k x k, one column per component, signed so
+    the largest loading is positive) and the number of components needed
+    to reach `variance_target`.
+    """
+    k = corr.shape[0]
+    corr = np.nan_to_num(np.asarray(corr, dtype=float), nan=0.0)
+    np.fill_diagonal(corr, 1.0)
+    eigval, eigvec = np.linalg.eigh(corr)
+    order  = np.argsort(eigval)[::-1]
+    eigval = np.clip(eigval[order], 0.0, None)
+    eigvec = eigvec[:, order]
+    flip = eigvec[np.abs(eigvec).argmax(axis=0), np.arange(k)] < 0
+    eigvec[:, flip] *= -1
+
+    explained  = eigval / eigval.sum()
+    cumulative = np.cumsum(explained)
+    with np.errstate(divide='ignore'):
+        indices = np.sqrt(eigval[0] / eigval)
+    return {
+        'eigenvalues':       eigval,
+        'explained':         explained,
+        'cumulative':        cumulative,
+        'condition_indices': indices,
+        'condition_number':  float(indices[-1]),
+        'loadings':          eigvec,
+        'n_components':      int(np.searchsorted(cumulative, variance_target - 1e-12) + 1),
+    }
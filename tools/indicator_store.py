@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped columnar store of the indicator values inside a mask, shared
+by the EcoCondition Toolbox analysis tools
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+import numpy as np
+from osgeo import gdal
+
+from .precision import read_dtype
+from .raster_stats_cache import default_cache_path, file_identity
+from .sparse_domain import SparseDomain, mask_fraction
+
+# Folder of the stores, next to the statistics cache
+STORE_DIRNAME = 'ecocondition_store'
+# Stores (one per mask version) kept; the least recently used go first
+STORE_MAX_DOMAINS = 8
+
+_MANIFEST = 'manifest.json'
+_PIXELS   = 'pixels.npy'
+
+
+def default_store_root():
+    return os.path.join(os.path.dirname(default_cache_path()), STORE_DIRNAME)
+
+
+def _digest(*parts):
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+
+
+class IndicatorStore:
+    """
+    The pixels of a mask (a SparseDomain) and the values of every layer
+    read over them, kept on disk as plain .npy files:
+
+    - pixels.npy: the shared pixel index, flat positions row * xsize +
+      column (int64, ascending);
+    - one column file per layer, NaN where the layer is nodata.
+
+    Columns are written on first use and then opened memory-mapped,
+    read-only: re-analysing the same layers reads the page cache instead of
+    decompressing GeoTIFFs. A column is keyed by its layer's file identity
+    (path, size, mtime), so a rewritten layer (aligned, nodata fixed…)
+    gets a new column, and by its stored dtype. Columns hold the exact
+    values whatever the compute precision: float32 for the types it holds
+    exactly (see `read_dtype`), float64 otherwise. The store is best effort: when its folder cannot be
+    written, columns are simply read from the layers.
+    """
+
+    def __init__(self, domain, folder=None, manifest=None):
+        self.domain   = domain
+        self.folder   = folder
+        self.manifest = manifest if manifest is not None else {'columns': {}}
+        self._lock    = threading.Lock()
+
+    @classmethod
+    def open(cls, mask_path, value=1, root=None, check=None, max_fraction=None):
+        """
+        Store of the pixels of `mask_path` equal to `value` (None: every
+        valid pixel), created (indexing the mask) when it does not exist yet.
+        With `max_fraction`, None when the mask covers more than this share
+        of the grid: the mask pixels are only counted, nothing is indexed or
+        written.
+        """
+        if max_fraction is not None and mask_fraction(mask_path, value, check) > max_fraction:
+            return None
+        ident = file_identity(mask_path)
+        if ident is None:
+            return cls(SparseDomain.from_mask(mask_path, value, check))
+        root = root or default_store_root()
+        folder = os.path.join(root, _digest(*ident, value))
+        manifest_path = os.path.join(folder, _MANIFEST)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            pixels = np.load(os.path.join(folder, _PIXELS), mmap_mode='r')
+            domain = SparseDomain.from_pixels(manifest['xsize'], manifest['ysize'], pixels)
+            # most recently used stores are kept when pruning
+            os.utime(manifest_path)
+            return cls(domain, folder, manifest)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        domain = SparseDomain.from_mask(mask_path, value, check)
+        manifest = {'mask': list(ident), 'value': value,
+                    'xsize': domain.xsize, 'ysize': domain.ysize, 'columns': {}}
+        try:
+            cls._prune(root)
+            os.makedirs(folder, exist_ok=True)
+            np.save(os.path.join(folder, _PIXELS), domain.pixels())
+            store = cls(domain, folder, manifest)
+            store._save_manifest()
+            return store
+        except OSError:
+            return cls(domain, None, manifest)
+
+    @staticmethod
+    def _prune(root):
+        try:
+            folders = [os.path.join(root, d) for d in os.listdir(root)]
+        except OSError:
+            return
+        def last_used(folder):
+            try:
+                return os.path.getmtime(os.path.join(folder, _MANIFEST))
+            except OSError:
+                return 0.0
+        folders = sorted((d for d in folders if os.path.isdir(d)), key=last_used, reverse=True)
+        for folder in folders[STORE_MAX_DOMAINS - 1:]:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def _save_manifest(self):
+        tmp = os.path.join(self.folder, f"{_MANIFEST}.{os.getpid()}.{threading.get_ident()}")
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, os.path.join(self.folder, _MANIFEST))
+
+    def column(self, path, check=None):
+        """
+        Values of band 1 of `path` over the domain (NaN = nodata): a
+        read-only memory map of the stored column, written first when
+        missing or out of date. Copy it before modifying it.
+        """
+        ident = file_identity(path)
+        ds = gdal.Open(path)
+        band = ds.GetRasterBand(1)
+        # the narrowest dtype holding the values exactly
+        dtype = read_dtype(band, np.float32)
+        if self.folder is None or ident is None:
+            return self.domain.gather(band, dtype, check=check)
+        real, size, mtime = ident
+        key = f"{real}:{dtype.name}"
+        with self._lock:
+            entry = self.manifest['columns'].get(key)
+        if entry is not None and (entry['size'], entry['mtime_ns']) == (size, mtime):
+            try:
+                return np.load(os.path.join(self.folder, entry['file']), mmap_mode='r')
+            except (OSError, ValueError):
+                pass
+
+        name = _digest(real, dtype.name) + '.npy'
+        target = os.path.join(self.folder, name)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            col = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=(self.domain.size,))
+            self.domain.gather(band, check=check, out=col)
+            col.flush()
+            del col
+            os.replace(tmp, target)
+            with self._lock:
+                self.manifest['columns'][key] = {'size': size, 'mtime_ns': mtime, 'file': name}
+                self._save_manifest()
+            return np.load(target, mmap_mode='r')
+        except BaseException as e:
+            # no partial column is left behind (errors, cancellation)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            if not isinstance(e, OSError):
+                raise
+            return self.domain.gather(band, dtype, check=check)
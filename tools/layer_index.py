@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Shared index of the project's raster layers for the EcoCondition Toolbox tools
+"""
+
+from qgis.PyQt.QtCore import Qt, QObject, pyqtSignal
+from qgis.PyQt.QtWidgets import QTreeWidgetItem
+from qgis.core import QgsProject, QgsRasterLayer, QgsLayerTreeGroup, QgsLayerTreeLayer
+
+# QTreeWidget property holding the index version (and filter) it was filled with
+_FILLED_WITH = 'ecoLayerIndexFill'
+
+# Entry kinds of the flattened layer tree
+GROUP, LAYER = 0, 1
+
+# Significant digits of the origin / pixel size in grid signatures:
+# tolerates floating-point noise, nothing a resampling could introduce
+GRID_SIGNIFICANT_DIGITS = 10
+
+
+def _rounded(value):
+    return float(f"{value:.{GRID_SIGNIFICANT_DIGITS}g}")
+
+
+class LayerIndex(QObject):
+    """
+    The project's layer tree, walked once and kept as a flat list of
+    (depth, kind, name, layer id) entries (raster layers and groups), plus
+    the raster layers of the project in registry order.
+
+    Both are rebuilt lazily after QgsProject / layer-tree signals (layers
+    added, removed, renamed or moved), and `version` increases, so a tool
+    only refills its trees when something actually changed. Tools fill
+    their QTreeWidgets with `fill_tree`, passing an `accept(layer)` filter
+    instead of walking the layer tree themselves.
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, project=None):
+        project = project or QgsProject.instance()
+        super().__init__(project)
+        self.project = project
+        self.version = 0
+        self._entries = None
+        self._raster_ids = None
+        # grid signatures by (layer id, source): a layer's grid only
+        # changes with its data source
+        self._signatures = {}
+        project.layersAdded.connect(self.invalidate)
+        project.layersRemoved.connect(self.invalidate)
+        project.cleared.connect(self.invalidate)
+        root = project.layerTreeRoot()
+        # child node signals are forwarded up to the root
+        root.addedChildren.connect(self.invalidate)
+        root.removedChildren.connect(self.invalidate)
+        root.nameChanged.connect(self.invalidate)
+
+    def invalidate(self, *args):
+        self._entries = None
+        self._raster_ids = None
+        self.version += 1
+        self.changed.emit()
+
+    def entries(self):
+        """Flattened layer tree: (depth, GROUP / LAYER, name, layer id or None)."""
+        if self._entries is None:
+            entries = []
+
+            def walk(group, depth):
+                for child in group.children():
+                    if isinstance(child, QgsLayerTreeGroup):
+                        entries.append((depth, GROUP, child.name(), None))
+                        walk(child, depth + 1)
+                    elif isinstance(child, QgsLayerTreeLayer):
+                        lyr = self.project.mapLayer(child.layerId())
+                        if isinstance(lyr, QgsRasterLayer):
+                            entries.append((depth, LAYER, lyr.name(), lyr.id()))
+
+            walk(self.project.layerTreeRoot(), 0)
+            self._entries = entries
+        return self._entries
+
+    def raster_layers(self):
+        """Raster layers of the project (registry order, as mapLayers())."""
+        if self._raster_ids is None:
+            self._raster_ids = [
+                lid for lid, lyr in self.project.mapLayers().items()
+                if isinstance(lyr, QgsRasterLayer)
+            ]
+        layers = (self.project.mapLayer(lid) for lid in self._raster_ids)
+        return [lyr for lyr in layers if lyr is not None]
+
+    def fill_tree(self, tree, accept=None, id_role=Qt.UserRole, filter_key=None):
+        """
+        Fill `tree` with the indexed groups (underlined) and raster layers
+        for which `accept(layer)` is true, layer ids stored under `id_role`.
+        Skipped when `tree` already shows this index version with the same
+        `filter_key` (pass a new key whenever `accept` changes).
+        """
+        stamp = (self.version, filter_key)
+        if tree.property(_FILLED_WITH) == repr(stamp):
+            return
+        tree.setUpdatesEnabled(False)
+        tree.clear()
+        parents, top = [], []
+        for depth, kind, name, lid in self.entries():
+            del parents[depth:]
+            if kind == LAYER:
+                if accept is not None and not accept(self.project.mapLayer(lid)):
+                    continue
+                item = QTreeWidgetItem([name])
+                item.setData(0, id_role, lid)
+            else:
+                item = QTreeWidgetItem([name])
+                font = item.font(0)
+                font.setUnderline(True)
+                item.setFont(0, font)
+            if parents:
+                parents[-1].addChild(item)
+            else:
+                top.append(item)
+            if kind == GROUP:
+                parents.append(item)
+        tree.addTopLevelItems(top)
+        tree.setUpdatesEnabled(True)
+        tree.setProperty(_FILLED_WITH, repr(stamp))
+
+    def grid_signature(self, layer):
+        """
+        (CRS, columns, rows, x origin, y origin, pixel width, pixel height)
+        of a raster layer, computed once per layer and data source.
+        """
+        key = (layer.id(), layer.source())
+        sig = self._signatures.get(key)
+        if sig is None:
+            ext = layer.extent()
+            crs = layer.crs()
+            sig = (
+                crs.authid() or crs.toWkt(),
+                layer.width(), layer.height(),
+                _rounded(ext.xMinimum()), _rounded(ext.yMaximum()),
+                _rounded(layer.rasterUnitsPerPixelX()), _rounded(layer.rasterUnitsPerPixelY()),
+            )
+            self._signatures[key] = sig
+        return sig
+
+    def grid_clusters(self, layers):
+        """
+        Group `layers` by grid signature in one pass: a list of
+        (signature, [layers]) with the cluster of layers[0] first (the
+        reference grid), then the others by decreasing size.
+        """
+        clusters = {}
+        for lyr in layers:
+            clusters.setdefault(self.grid_signature(lyr), []).append(lyr)
+        ordered = sorted(clusters.items(), key=lambda kv: -len(kv[1]))
+        if layers:
+            ref = self.grid_signature(layers[0])
+            ordered.sort(key=lambda kv: kv[0] != ref)
+        return ordered
+
+
+def describe_grid(signature):
+    """One-line description of a grid signature."""
+    crs, cols, rows, x0, y0, px, py = signature
+    return f"{cols} × {rows} px of {px:g} × {py:g}, origin ({x0:g}, {y0:g}), {crs[:40]}"
+
+
+def misalignment_report(clusters, limit=20):
+    """
+    Text listing every grid of `clusters` (from `grid_clusters`) but the
+    reference one, with (up to `limit` of) its layer names.
+    """
+    lines = [f"Reference grid ({len(clusters[0][1])} layers): {describe_grid(clusters[0][0])}", ""]
+    for n, (sig, members) in enumerate(clusters[1:], start=1):
+        names = [lyr.name() for lyr in members]
+        more = f" … and {len(names) - limit} more" if len(names) > limit else ""
+        lines.append(f"Misaligned group {n} ({len(members)} layers): {describe_grid(sig)}")
+        lines.append("    " + ", ".join(names[:limit]) + more)
+    return "\n".join(lines)
+
+
+_shared_index = None
+
+
+def shared_layer_index():
+    """The LayerIndex shared by every tool and tab."""
+    global _shared_index
+    if _shared_index is None:
+        _shared_index = LayerIndex()
+    return _shared_index
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Compute precision policy of the EcoCondition Toolbox tools
+"""
+
+from qgis.PyQt.QtCore import QSettings
+
+# Toolbox-wide setting (plugin menu): 'float64' (default) or 'float32'
+PRECISION_KEY = 'ecocondition/precision'
+PRECISIONS = ('float64', 'float32')
+DEFAULT_PRECISION = 'float64'
+# GDAL types whose values float32 holds exactly (the others are read as float64)
+FLOAT32_EXACT_TYPES = ('Byte', 'Int8', 'UInt16', 'Int16', 'Float32')
+
+
+def compute_precision():
+    """The current policy: 'float64' or 'float32'."""
+    value = QSettings().value(PRECISION_KEY, DEFAULT_PRECISION)
+    return value if value in PRECISIONS else DEFAULT_PRECISION
+
+
+def set_compute_precision(value):
+    if value not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {value}")
+    QSettings().setValue(PRECISION_KEY, value)
+
+
+def compute_dtype():
+    """
+    dtype pixel values are read, stored and transformed in. With 'float32'
+    (half the memory and bandwidth of float64), only layers whose values
+    float32 holds exactly are read as float32 (see `read_dtype`); sums,
+    moments and statistics are still accumulated in float64, and ranks
+    stay float64 (rank values above 2**24 are not exact in float32). Scores
+    computed in float32 carry float32 rounding (about 1e-7 relative); no
+    tolerance against float64 results is verified by the toolbox. Read the
+    policy in the GUI thread, when a worker is created.
+    """
+    # numpy is imported here: the plugin menu reads the policy at startup
+    import numpy as np
+    return np.dtype(compute_precision())
+
+
+def read_dtype(band, dtype):
+    """
+    dtype to read `band` (a GDAL band) as under the compute `dtype`:
+    float32 only when asked for and exact for the band's type (Byte,
+    Int16, UInt16, Float32…), float64 otherwise (Float64, Int32, UInt32…).
+    """
+    import numpy as np
+    from osgeo import gdal
+    if np.dtype(dtype) == np.float32 and gdal.GetDataTypeName(band.DataType) in FLOAT32_EXACT_TYPES:
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
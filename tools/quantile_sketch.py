@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming quantile sketch for the EcoCondition Toolbox tools
+"""
+
+import numpy as np
+
+# Relative accuracy of the returned quantiles (0.1 %)
+SKETCH_ACCURACY = 1e-3
+# |values| below this fall into the zero bucket
+SKETCH_MIN_MAGNITUDE = 1e-12
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative accuracy (DDSketch-style).
+
+    Values are counted in logarithmic buckets (separately for positive and
+    negative values, plus a zero bucket), so any quantile is returned within
+    SKETCH_ACCURACY of a true sample value, whatever the number of pixels.
+    No value range is needed beforehand: one pass over the data is enough.
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma    = (1.0 + accuracy) / (1.0 - accuracy)
+        self.log_g    = np.log(self.gamma)
+        self.pos      = {}
+        self.neg      = {}
+        self.zeros    = 0
+        self.count    = 0
+        self.min      = np.inf
+        self.max      = -np.inf
+
+    def _keys(self, magnitudes):
+        return np.ceil(np.log(magnitudes) / self.log_g).astype(np.int64)
+
+    @staticmethod
+    def _add(store, keys):
+        if not keys.size:
+            return
+        lo = keys.min()
+        counts = np.bincount(keys - lo)
+        for off in np.nonzero(counts)[0]:
+            key = int(lo + off)
+            store[key] = store.get(key, 0) + int(counts[off])
+
+    def update(self, values):
+        """Add NaN-free values (any shape)."""
+        values = np.ravel(values)
+        if not values.size:
+            return
+        self.count += values.size
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        mag = np.abs(values)
+        small = mag < SKETCH_MIN_MAGNITUDE
+        self.zeros += int(small.sum())
+        self._add(self.pos, self._keys(mag[(values > 0) & ~small]))
+        self._add(self.neg, self._keys(mag[(values < 0) & ~small]))
+
+    def merge(self, other):
+        """Fold another sketch (same accuracy) into this one."""
+        for mine, theirs in ((self.pos, other.pos), (self.neg, other.neg)):
+            for key, c in theirs.items():
+                mine[key] = mine.get(key, 0) + c
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_state(self):
+        """JSON-serialisable state (for the statistics cache)."""
+        return {'accuracy': self.accuracy, 'zeros': self.zeros, 'count': self.count,
+                'min': self.min, 'max': self.max,
+                'pos': {str(k): c for k, c in self.pos.items()},
+                'neg': {str(k): c for k, c in self.neg.items()}}
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls(state['accuracy'])
+        sketch.zeros, sketch.count = state['zeros'], state['count']
+        sketch.min, sketch.max = state['min'], state['max']
+        sketch.pos = {int(k): c for k, c in state['pos'].items()}
+        sketch.neg = {int(k): c for k, c in state['neg'].items()}
+        return sketch
+
+    def _buckets(self):
+        # (representative value, count) in ascending value order
+        rep = lambda key: 2.0 * self.gamma ** key / (self.gamma + 1.0)
+        out = [(-rep(k), self.neg[k]) for k in sorted(self.neg, reverse=True)]
+        if self.zeros:
+            out.append((0.0, self.zeros))
+        out += [(rep(k), self.pos[k]) for k in sorted(self.pos)]
+        return out
+
+    def quantile(self, q):
+        """Value at quantile q (0–1); the exact min / max at q = 0 / 1."""
+        if not self.count:
+            return np.nan
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        target = q * (self.count - 1)
+        seen = 0
+        for value, c in self._buckets():
+            seen += c
+            if seen > target:
+                return float(np.clip(value, self.min, self.max))
+        return self.max
+
+    def cdf_table(self):
+        """
+        (upper bucket bounds, mid-rank CDF) arrays for `cdf`: ascending
+        bounds and the share of values below each bucket plus half of it.
+        """
+        bounds, cum = [], []
+        seen = 0
+        for value, c in self._buckets():
+            # upper edge of the bucket holding `value`
+            if value > 0:
+                bounds.append(value * (self.gamma + 1.0) / 2.0)
+            elif value < 0:
+                bounds.append(value * (self.gamma + 1.0) / (2.0 * self.gamma))
+            else:
+                bounds.append(SKETCH_MIN_MAGNITUDE)
+            cum.append((seen + 0.5 * c) / max(self.count, 1))
+            seen += c
+        return np.asarray(bounds), np.asarray(cum)
+
+    def cdf(self, values, table=None):
+        """
+        Empirical CDF (0–1, mid-rank) of `values` against the sketched
+        distribution; NaN stays NaN. Pass a precomputed `cdf_table()` when
+        calling block by block.
+        """
+        bounds, cum = table if table is not None else self.cdf_table()
+        # float32 values give float32 ranks
+        out = np.full(np.shape(values), np.nan, dtype=np.result_type(np.asarray(values).dtype, np.float32))
+        ok = ~np.isnan(values)
+        if len(bounds):
+            idx = np.searchsorted(bounds, values[ok], side='left')
+            out[ok] = cum[np.clip(idx, 0, len(cum) - 1)]
+        return out
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Block (strip) reading helpers shared by the EcoCondition Toolbox tools
+"""
+
+import numpy as np
+
+# Approximate number of pixels per strip read from one layer
+DEFAULT_BLOCK_PIXELS = 1 << 22
+
+
+def strip_rows(band, block_pixels=DEFAULT_BLOCK_PIXELS):
+    """
+    Number of full-width rows to read per strip: a multiple of the band's
+    natural block height, holding roughly `block_pixels` pixels.
+    """
+    _bx, by = band.GetBlockSize()
+    by = max(1, by)
+    rows = max(1, block_pixels // max(1, band.XSize))
+    rows = max(by, (rows // by) * by)
+    return min(rows, band.YSize)
+
+
+def block_windows(ysize, rows):
+    """Yield (yoff, nrows) for full-width strips covering `ysize` rows."""
+    for yoff in range(0, ysize, rows):
+        yield yoff, min(rows, ysize - yoff)
+
+
+def read_strip(band, yoff, nrows, dtype=float):
+    """
+    Read a full-width strip of `band` as `dtype` (no copy when the band
+    already has it), with the band's nodata value replaced by NaN. Under
+    the float32 policy, pass `precision.read_dtype(band, …)` as `dtype`.
+    """
+    raw = band.ReadAsArray(0, yoff, band.XSize, nrows)
+    arr = raw.astype(dtype, copy=False)
+    nod = band.GetNoDataValue()
+    if nod is not None:
+        # compared in the native type: exact whatever `dtype`
+        arr[raw == nod] = np.nan
+    return arr
+
+
+def read_window(band, xoff, yoff, xsize, ysize, dtype=float):
+    """Read a window of `band` as `dtype`, with nodata replaced by NaN."""
+    raw = band.ReadAsArray(xoff, yoff, xsize, ysize)
+    arr = raw.astype(dtype, copy=False)
+    nod = band.GetNoDataValue()
+    if nod is not None:
+        arr[raw == nod] = np.nan
+    return arr
+
+
+def sample_windows(xsize, ysize, size, count):
+    """
+    Up to `count` (xoff, yoff, w, h) windows of side `size`, spread on a
+    regular grid over the raster.
+    """
+    w, h = min(size, xsize), min(size, ysize)
+    per_side = max(1, int(np.ceil(np.sqrt(count))))
+    xs = np.unique(np.linspace(0, xsize - w, per_side).astype(int))
+    ys = np.unique(np.linspace(0, ysize - h, per_side).astype(int))
+    return [(int(x), int(y), w, h) for y in ys for x in xs][:count]
+
+
+# ** Output rasters: creation options, scaled UInt16 storage, overviews **
+
+# Scaled UInt16 storage of 0–1 values: 0..UINT16_SCALE, nodata above it
+UINT16_SCALE  = 65534
+UINT16_NODATA = 65535
+# Overviews are built down to about this size (pixels, longest side)
+OVERVIEW_MIN_SIZE = 256
+
+
+def gtiff_creation_options(compress='DEFLATE', uint16=False, tile=256, sparse=False):
+    """
+    Tiled GeoTIFF creation options; PREDICTOR matches the storage type.
+    With `sparse`, tiles never written are left out of the file and read
+    back as nodata (outputs of a sparse domain).
+    """
+    options = ['TILED=YES', f'BLOCKXSIZE={tile}', f'BLOCKYSIZE={tile}', 'BIGTIFF=IF_SAFER']
+    if sparse:
+        options.append('SPARSE_OK=TRUE')
+    if compress and compress != 'NONE':
+        options.append(f'COMPRESS={compress}')
+        options.append('PREDICTOR=2' if uint16 else 'PREDICTOR=3')
+    return options
+
+
+def overview_levels(xsize, ysize, min_size=OVERVIEW_MIN_SIZE):
+    """Decimation factors 2, 4, 8, … until the longest side is ~min_size."""
+    levels, f = [], 2
+    while max(xsize, ysize) / f >= min_size:
+        levels.append(f)
+        f *= 2
+    return levels
+
+
+def block_average(arr, factor, nodata):
+    """
+    Mean of the valid pixels of each factor x factor block of `arr`;
+    `nodata` where a block has none. Edges are padded.
+    """
+    rows, cols = arr.shape
+    pr, pc = -rows % factor, -cols % factor
+    a = np.pad(arr.astype(float), ((0, pr), (0, pc)), constant_values=np.nan)
+    a[a == nodata] = np.nan
+    a = a.reshape(a.shape[0] // factor, factor, a.shape[1] // factor, factor)
+    valid = ~np.isnan(a)
+    count = valid.sum(axis=(1, 3))
+    total = np.where(valid, a, 0.0).sum(axis=(1, 3))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = total / count
+    out[count == 0] = nodata
+    return out
+
+
+class StripWriter:
+    """
+    Writes 0–1 strips of a single-band output, either as Float32 or as
+    scaled UInt16 (value * UINT16_SCALE, with band scale metadata so GDAL /
+    QGIS read back 0–1), and optionally fills internal overviews from the
+    same strips, so no second pass over the output is needed.
+
+    Strips passed to `write` must start on a multiple of the largest
+    overview factor (see `row_multiple`).
+    """
+
+    def __init__(self, out_ds, nodata, uint16=False, overviews=False):
+        self.band   = out_ds.GetRasterBand(1)
+        self.uint16 = uint16
+        self.nodata = nodata
+        if uint16:
+            self.band.SetNoDataValue(UINT16_NODATA)
+            self.band.SetScale(1.0 / UINT16_SCALE)
+            self.band.SetOffset(0.0)
+        else:
+            self.band.SetNoDataValue(nodata)
+        self.levels = []
+        if overviews:
+            self.levels = overview_levels(out_ds.RasterXSize, out_ds.RasterYSize)
+            if self.levels:
+                # allocate the overviews; they are filled strip by strip
+                out_ds.BuildOverviews('NONE', self.levels)
+
+    @property
+    def row_multiple(self):
+        return self.levels[-1] if self.levels else 1
+
+    def _encode(self, arr):
+        if not self.uint16:
+            return arr.astype(np.float32)
+        bad = np.isnan(arr) | (arr == self.nodata)
+        out = np.rint(np.clip(arr, 0.0, 1.0) * UINT16_SCALE).astype(np.uint16)
+        out[bad] = UINT16_NODATA
+        return out
+
+    def write(self, arr, yoff):
+        """Write a full-width strip (float, `nodata` outside the valid area)."""
+        self.band.WriteArray(self._encode(arr), 0, yoff)
+        for i, f in enumerate(self.levels):
+            self.band.GetOverview(i).WriteArray(
+                self._encode(block_average(arr, f, self.nodata)), 0, yoff // f
+            )
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Shared raster statistics cache for the EcoCondition Toolbox tools
+"""
+
+import os
+import json
+import sqlite3
+import threading
+
+import numpy as np
+from osgeo import gdal
+
+from .precision import read_dtype
+from .raster_blocks import block_windows, read_strip, strip_rows
+
+# Statistics of the same file are served from the cache as long as its size
+# and modification time are unchanged (one computation per content version)
+CACHE_FILENAME = 'ecocondition_stats.sqlite'
+# Nodata policy of read_strip: the band's nodata value and NaN are missing
+NODATA_BAND = 'band'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stats (
+    path     TEXT    NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    mask     TEXT    NOT NULL,
+    nodata   TEXT    NOT NULL,
+    kind     TEXT    NOT NULL,
+    value    TEXT    NOT NULL,
+    PRIMARY KEY (path, mask, nodata, kind)
+)
+"""
+
+
+def file_identity(path):
+    """
+    (real path, size, mtime_ns) of a raster file, or None for sources that
+    are not plain files (provider URIs, /vsi paths…), which are not cached.
+    """
+    try:
+        real = os.path.realpath(path)
+        st = os.stat(real)
+    except (OSError, TypeError, ValueError):
+        return None
+    return real, st.st_size, st.st_mtime_ns
+
+
+def band_nodata(path):
+    """
+    Nodata value of band 1 of `path` as cache-key text: it can change
+    through a PAM sidecar (.aux.xml) without touching the file itself.
+    """
+    ds = gdal.Open(path)
+    if ds is None:
+        return 'none'
+    return repr(ds.GetRasterBand(1).GetNoDataValue())
+
+
+def default_cache_path():
+    """The cache lives in the QGIS profile folder (or ~/.cache outside QGIS)."""
+    try:
+        from qgis.core import QgsApplication
+        folder = QgsApplication.qgisSettingsDirPath()
+    except ImportError:
+        folder = ''
+    if not folder:
+        folder = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(folder, CACHE_FILENAME)
+
+
+class StatsCache:
+    """
+    Statistics keyed by file identity, mask and nodata policy, persisted in
+    a sidecar SQLite store shared by all tools.
+
+    `mask` is a sequence of (role, path) pairs: the identity of every mask
+    file is part of the key, so editing a mask invalidates the statistics
+    computed with it. The nodata value of the layer and of the masks are
+    part of the key too (a nodata value set through PAM leaves the file's
+    size and mtime unchanged). Values are JSON-serialisable dicts. The cache is
+    best effort: a store that cannot be opened or written only means
+    statistics are recomputed.
+    """
+
+    def __init__(self, path=None):
+        self.path  = path or default_cache_path()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=10)
+        if not self._ready:
+            con.execute(_SCHEMA)
+            con.commit()
+            self._ready = True
+        return con
+
+    @staticmethod
+    def _mask_key(mask):
+        parts = []
+        for role, path in mask or ():
+            ident = file_identity(path)
+            if ident is None:
+                return None
+            parts.append([role, *ident, band_nodata(path)])
+        return json.dumps(parts)
+
+    def _key(self, path, mask, nodata):
+        ident = file_identity(path)
+        mask_key = self._mask_key(mask)
+        if ident is None or mask_key is None:
+            return None
+        if nodata == NODATA_BAND:
+            # the band's current nodata value, not only the policy
+            nodata = f"{NODATA_BAND}:{band_nodata(path)}"
+        return ident, mask_key, str(nodata)
+
+    def get(self, path, kind, mask=(), nodata=NODATA_BAND):
+        """Cached statistics dict, or None when missing or out of date."""
+        key = self._key(path, mask, nodata)
+        if key is None:
+            return None
+        (real, size, mtime), mask_key, nodata = key
+        try:
+            with self._lock:
+                con = self._connect()
+                try:
+                    row = con.execute(
+                        "SELECT size, mtime_ns, value FROM stats "
+                        "WHERE path=? AND mask=? AND nodata=? AND kind=?",
+                        (real, mask_key, nodata, kind)
+                    ).fetchone()
+                finally:
+                    con.close()
+        except (sqlite3.Error, OSError):
+            return None
+        if row is None or (row[0], row[1]) != (size, mtime):
+            return None
+        return json.loads(row[2])
+
+    def put(self, path, kind, value, mask=(), nodata=NODATA_BAND):
+        """Store (or replace) the statistics of the current file version."""
+        key = self._key(path, mask, nodata)
+        if key is None:
+            return
+        (real, size, mtime), mask_key, nodata = key
+        try:
+            with self._lock:
+                con = self._connect()
+                try:
+                    con.execute(
+                        "INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (real, size, mtime, mask_key, nodata, kind, json.dumps(value))
+                    )
+                    con.commit()
+                finally:
+                    con.close()
+        except (sqlite3.Error, OSError):
+            pass
+
+    def get_or_compute(self, path, kind, compute, mask=(), nodata=NODATA_BAND):
+        """Cached statistics, or `compute()` stored for the next caller."""
+        value = self.get(path, kind, mask, nodata)
+        if value is None:
+            value = compute()
+            self.put(path, kind, value, mask, nodata)
+        return value
+
+
+_shared_cache = None
+
+
+def shared_cache():
+    """The process-wide StatsCache used by every tool."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = StatsCache()
+    return _shared_cache
+
+
+class RunningMoments:
+    """
+    Count, mean and sum of squared deviations (M2) of a stream of values,
+    per strip then merged with the pairwise update of Chan et al.: the std
+    stays accurate when the variance is small relative to the mean (no
+    E[x²] - mean² cancellation). float64 whatever the dtype of the values.
+    """
+
+    def __init__(self):
+        self.n    = 0
+        self.mean = 0.0
+        self.m2   = 0.0
+
+    def update(self, v):
+        """Add the (NaN-free, 1-D) values `v`."""
+        if not v.size:
+            return
+        mean = float(v.mean(dtype=np.float64))
+        dev  = np.subtract(v, mean, dtype=np.float64)
+        self.merge(v.size, mean, float(np.einsum('i,i->', dev, dev)))
+
+    def merge(self, n, mean, m2):
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2   += m2 + delta * delta * self.n * n / total
+        self.n     = total
+
+    def std(self):
+        """Population standard deviation (NaN without values)."""
+        return float(np.sqrt(self.m2 / self.n)) if self.n else float('nan')
+
+
+class BandSummary:
+    """
+    Running summary of one band's values (NaN = missing): valid / missing
+    counts, min, max, mean, std and, with `edges`, the number of values in
+    each half-open class [edges[i], edges[i+1]).
+    """
+
+    def __init__(self, edges=None):
+        self.edges    = None if edges is None else np.asarray(edges, dtype=float)
+        self.counts   = None if edges is None else np.zeros(len(edges) - 1, dtype=np.int64)
+        self.valid    = 0
+        self.missing  = 0
+        self.min      = np.inf
+        self.max      = -np.inf
+        self.moments  = RunningMoments()
+
+    def update(self, arr):
+        v = np.ravel(arr)
+        ok = ~np.isnan(v)
+        v = v[ok]
+        self.missing += int(ok.size - v.size)
+        if not v.size:
+            return
+        self.valid    += v.size
+        self.min       = min(self.min, float(v.min()))
+        self.max       = max(self.max, float(v.max()))
+        self.moments.update(v)
+        if self.edges is not None:
+            idx = np.searchsorted(self.edges, v, side='right') - 1
+            idx = idx[(idx >= 0) & (idx < len(self.counts))]
+            self.counts += np.bincount(idx, minlength=len(self.counts))
+
+    def to_dict(self):
+        out = {
+            'valid':   self.valid,
+            'missing': self.missing,
+            'min':     self.min if self.valid else None,
+            'max':     self.max if self.valid else None,
+            'mean':    self.moments.mean if self.valid else None,
+            'std':     self.moments.std() if self.valid else None,
+        }
+        if self.edges is not None:
+            out['edges']  = self.edges.tolist()
+            out['counts'] = self.counts.tolist()
+        return out
+
+
+def summary_kind(edges=None, dtype=float):
+    """
+    Cache kind of a BandSummary (the class edges and, when not float64, the
+    dtype the values were read as are part of the key).
+    """
+    kind = 'summary'
+    if edges is not None:
+        kind += ':' + ','.join(repr(float(e)) for e in edges)
+    if np.dtype(dtype) != np.float64:
+        kind += '@' + np.dtype(dtype).name
+    return kind
+
+
+def raster_summary(path, edges=None, cache=None, callback=None, dtype=float):
+    """
+    BandSummary dict of band 1 of `path`, read strip by strip (as `dtype`
+    where exact, see `read_dtype`), or served from the shared cache when
+    this file version was summarised before.
+    """
+    cache = cache or shared_cache()
+    ds = gdal.Open(path)
+    band = ds.GetRasterBand(1)
+    dtype = read_dtype(band, dtype)
+
+    def compute():
+        summary = BandSummary(edges)
+        for s, (yoff, nrows) in enumerate(block_windows(band.YSize, strip_rows(band))):
+            if callback:
+                callback(s)
+            summary.update(read_strip(band, yoff, nrows, dtype))
+        return summary.to_dict()
+
+    return cache.get_or_compute(path, summary_kind(edges, dtype), compute)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Sparse (masked) domain of the EcoCondition Toolbox tools: the pixels of one
+ecosystem type, processed as compact 1-D vectors
+"""
+
+import numpy as np
+from osgeo import gdal
+
+from .raster_blocks import (
+    DEFAULT_BLOCK_PIXELS, StripWriter, block_windows, gtiff_creation_options,
+    read_strip, read_window, strip_rows
+)
+from .raster_stats_cache import shared_cache
+
+# Tools switch to the sparse domain by themselves when the mask covers at
+# most this share of the grid (above it, reading whole strips is as fast)
+SPARSE_DOMAIN_MAX_FRACTION = 0.5
+
+
+def mask_fraction(path, value=1, check=None):
+    """
+    Share of the grid of `path` that `SparseDomain.from_mask(path, value)`
+    would index, counted strip by strip without indexing anything (cached
+    per mask version), so tools can decide on the sparse mode first.
+    """
+    def compute():
+        ds = gdal.Open(path)
+        band = ds.GetRasterBand(1)
+        count = 0
+        for yoff, nrows in block_windows(band.YSize, strip_rows(band)):
+            if check:
+                check()
+            if value is None:
+                count += int(np.count_nonzero(~np.isnan(read_strip(band, yoff, nrows))))
+            else:
+                count += int(np.count_nonzero(band.ReadAsArray(0, yoff, band.XSize, nrows) == value))
+        return {'count': count, 'pixels': band.XSize * band.YSize}
+
+    kind = 'domain_count' if value is None else f'domain_count:{value!r}'
+    counted = shared_cache().get_or_compute(path, kind, compute)
+    return counted['count'] / max(counted['pixels'], 1)
+
+
+class SparseDomain:
+    """
+    The pixels of a grid inside a mask (e.g. the ecosystem-type extent),
+    indexed once so layers can be processed as compact 1-D vectors holding
+    only those pixels, in row-major order.
+
+    The index is kept per mask strip: the window bounding the domain pixels
+    of the strip and their flat positions inside it. `gather` only reads
+    these windows (strips without domain pixels are never read), and
+    `strips` scatters a compact vector back to full-width strips at write
+    time, so compute and memory scale with the domain area rather than with
+    the extent of the grid.
+    """
+
+    def __init__(self, xsize, ysize, windows):
+        self.xsize = xsize
+        self.ysize = ysize
+        # (x0, y0, w, h, flat positions, offset in the compact vector)
+        self.windows = windows
+        self.size = sum(len(flat) for *_, flat, _start in windows)
+
+    @classmethod
+    def from_mask(cls, path, value=1, check=None):
+        """
+        Domain of the pixels of band 1 of `path` equal to `value` (with
+        `value` None: every pixel that is not nodata / NaN).
+        """
+        ds = gdal.Open(path)
+        band = ds.GetRasterBand(1)
+        xsize = band.XSize
+        windows, start = [], 0
+        for yoff, nrows in block_windows(band.YSize, strip_rows(band)):
+            if check:
+                check()
+            if value is None:
+                inside = ~np.isnan(read_strip(band, yoff, nrows))
+            else:
+                inside = band.ReadAsArray(0, yoff, xsize, nrows) == value
+            rows = np.flatnonzero(inside.any(axis=1))
+            if not rows.size:
+                continue
+            cols = np.flatnonzero(inside.any(axis=0))
+            r0, r1 = int(rows[0]), int(rows[-1]) + 1
+            c0, c1 = int(cols[0]), int(cols[-1]) + 1
+            flat = np.flatnonzero(inside[r0:r1, c0:c1])
+            flat = flat.astype(np.int32 if flat.size and flat[-1] < 2**31 else np.int64)
+            windows.append((c0, yoff + r0, c1 - c0, r1 - r0, flat, start))
+            start += flat.size
+        return cls(xsize, band.YSize, windows)
+
+    @classmethod
+    def from_pixels(cls, xsize, ysize, pixels, rows=None):
+        """
+        Domain of the ascending flat pixel positions `pixels` (row * xsize +
+        column, see `pixels`), indexed in strips of `rows` rows.
+        """
+        rows = rows or max(1, DEFAULT_BLOCK_PIXELS // max(xsize, 1))
+        r, c = np.divmod(np.asarray(pixels, dtype=np.int64), xsize)
+        bounds = np.searchsorted(r, np.arange(0, ysize + rows, rows))
+        windows = []
+        for s0, s1 in zip(bounds[:-1], bounds[1:]):
+            if s1 == s0:
+                continue
+            rr, cc = r[s0:s1], c[s0:s1]
+            r0, r1 = int(rr[0]), int(rr[-1]) + 1
+            c0, c1 = int(cc.min()), int(cc.max()) + 1
+            flat = (rr - r0) * (c1 - c0) + (cc - c0)
+            flat = flat.astype(np.int32 if flat[-1] < 2**31 else np.int64)
+            windows.append((c0, r0, c1 - c0, r1 - r0, flat, int(s0)))
+        return cls(xsize, ysize, windows)
+
+    @property
+    def fraction(self):
+        """Share of the grid inside the domain."""
+        return self.size / max(self.xsize * self.ysize, 1)
+
+    def positions(self):
+        """(rows, columns) of the domain pixels, in compact-vector order."""
+        rows = np.empty(self.size, dtype=np.int64)
+        cols = np.empty(self.size, dtype=np.int64)
+        for x0, y0, w, h, flat, start in self.windows:
+            rows[start:start + flat.size] = y0 + flat // w
+            cols[start:start + flat.size] = x0 + flat % w
+        return rows, cols
+
+    def pixels(self):
+        """Flat positions (row * xsize + column) of the domain pixels."""
+        out = np.empty(self.size, dtype=np.int64)
+        for x0, y0, w, h, flat, start in self.windows:
+            r, c = np.divmod(flat.astype(np.int64), w)
+            out[start:start + flat.size] = (y0 + r) * self.xsize + x0 + c
+        return out
+
+    def gather(self, band, dtype=float, check=None, out=None):
+        """
+        Compact vector of `band` over the domain (nodata as NaN), read
+        window by window (into `out` when given, e.g. a memory map).
+        """
+        if (band.XSize, band.YSize) != (self.xsize, self.ysize):
+            raise ValueError("Layer and mask do not share the same grid: align them first.")
+        if out is None:
+            out = np.empty(self.size, dtype=dtype)
+        for x0, y0, w, h, flat, start in self.windows:
+            if check:
+                check()
+            out[start:start + flat.size] = read_window(band, x0, y0, w, h, dtype).ravel()[flat]
+        return out
+
+    def strips(self, values, rows, fill):
+        """
+        Yield (yoff, strip) for the full-width strips of `rows` rows that
+        hold domain pixels: `values` (a compact vector) at the domain pixels,
+        `fill` elsewhere. Strips without domain pixels are not yielded
+        (write them as nodata, or leave them out of a SPARSE_OK GeoTIFF).
+        """
+        windows = iter(self.windows)
+        pending = []
+        nxt = next(windows, None)
+        for yoff, nrows in block_windows(self.ysize, rows):
+            y1 = yoff + nrows
+            while nxt is not None and nxt[1] < y1:
+                pending.append(nxt)
+                nxt = next(windows, None)
+            # windows ending above this strip are done
+            pending = [win for win in pending if win[1] + win[3] > yoff]
+            if not pending:
+                continue
+            strip = np.full((nrows, self.xsize), fill, dtype=values.dtype)
+            for x0, y0, w, h, flat, start in pending:
+                r = y0 + flat // w
+                keep = (r >= yoff) & (r < y1)
+                strip[r[keep] - yoff, x0 + flat[keep] % w] = values[start:start + flat.size][keep]
+            yield yoff, strip
+
+    def write(self, path, values, template, nodata):
+        """
+        Write the compact vector `values` as a Float32 GeoTIFF on the grid of
+        `template` (a GDAL dataset), `nodata` outside the domain and where
+        `values` is NaN. Tiles without domain pixels are left out of the
+        (SPARSE_OK) file.
+        """
+        drv = gdal.GetDriverByName('GTiff')
+        out_ds = drv.Create(path, self.xsize, self.ysize, 1, gdal.GDT_Float32,
+                            options=gtiff_creation_options(sparse=True))
+        out_ds.SetGeoTransform(template.GetGeoTransform())
+        out_ds.SetProjection(template.GetProjection())
+        writer = StripWriter(out_ds, nodata)
+        values = np.where(np.isnan(values), nodata, values)
+        for yoff, strip in self.strips(values, strip_rows(writer.band), nodata):
+            writer.write(strip, yoff)
+        writer = out_ds = None
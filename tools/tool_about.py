@@ -3,6 +3,8 @@ from qgis.PyQt import uic
 from qgis.PyQt.QtCore import QUrl
 from qgis.PyQt.QtWidgets import QDialog
 
+from .ui_forms import load_dialog
+
 class aboutWindow:
     def __init__(self, iface):
         self.iface = iface
@@ -10,12 +12,19 @@ class aboutWindow:
         self.ui_path = os.path.join(os.path.dirname(__file__), 'tool_about.ui')
 
     def run(self):
+        # the dialog is built once and reused on later launches
+        if getattr(self, 'dlg', None) is None:
+            self._build_dialog()
+        # show the dialog modally
+        self.dlg.exec_()
+
+    def _build_dialog(self):
         # verify UI path exists
         if not os.path.exists(self.ui_path):
             raise FileNotFoundError(f"Cannot find UI file at {self.ui_path}")
 
-        # load the UI into a QDialog parented to the QGIS main window
-        self.dlg = uic.loadUi(self.ui_path, QDialog(self.iface.mainWindow()))
+        # load the UI (cached form class) into a QDialog parented to the QGIS main window
+        self.dlg = load_dialog('tool_about.ui', self.iface.mainWindow())
         self.dlg.setFixedSize(1000, 600) # 1424, 650
 
         # compute path to the HTML file in the resources folder
@@ -33,6 +42,3 @@ class aboutWindow:
 
         # connect Close button
         self.dlg.buttonBox.rejected.connect(self.dlg.reject)
-
-        # show the dialog modally
-        self.dlg.exec_()
@@ -44,7 +44,14 @@ from qgis.core import (
 
 from qgis import processing  # ensure we have access to processing.run()
 
-FORM_CLASS, _ = uic.loadUiType(os.path.join(os.path.dirname(__file__), "tool_align_layers.ui"))
+from .layer_index import shared_layer_index
+from .precision import compute_precision
+from .ui_forms import form_class
+
+FORM_CLASS, _ = form_class("tool_align_layers.ui")
+
+# Masked output type per precision policy: (label, gdal:rastercalculator RTYPE)
+ALIGN_OUTPUT_TYPES = {'float64': ("Float64", 6), 'float32': ("Float32", 5)}
 
 class AlignLayersTool(QDialog, FORM_CLASS):
     def __init__(self, iface):
@@ -69,10 +76,7 @@ class AlignLayersTool(QDialog, FORM_CLASS):
         self.pushButton_run.clicked.connect(self.run_alignment)
         self.pushButton_cancel.clicked.connect(self.reject)  # close dialog
 
-        # Initialize UI
-        self.populate_reference_layers()
-        self.populate_available_layers()
-        self.prepare_table_headers()
+        # the layer lists are filled by run(), on every launch
 
     def select_output_folder(self):
         """Open a folder dialog to select output folder."""
@@ -83,9 +87,9 @@ class AlignLayersTool(QDialog, FORM_CLASS):
     def populate_reference_layers(self):
         """Populate the combo box with all raster layers in the project."""
         self.comboBox_reference_layer.clear()
-        for layer in QgsProject.instance().mapLayers().values():
-            if isinstance(layer, QgsRasterLayer):
-                self.comboBox_reference_layer.addItem(layer.name(), layer.id())
+        self.comboBox_reference_layer.setEnabled(True)
+        for layer in shared_layer_index().raster_layers():
+            self.comboBox_reference_layer.addItem(layer.name(), layer.id())
 
         if self.comboBox_reference_layer.count() == 0:
             self.comboBox_reference_layer.addItem("<No raster layers found>", None)
@@ -164,8 +168,8 @@ class AlignLayersTool(QDialog, FORM_CLASS):
         if idx >= 0:
             ref_id = self.comboBox_reference_layer.itemData(idx)
 
-        for layer in QgsProject.instance().mapLayers().values():
-            if isinstance(layer, QgsRasterLayer) and layer.id() != ref_id:
+        for layer in shared_layer_index().raster_layers():
+            if layer.id() != ref_id:
                 # Compute cell size (guard against zero dims)
                 ext = layer.extent()
                 w = layer.width()
@@ -267,8 +271,8 @@ class AlignLayersTool(QDialog, FORM_CLASS):
             interp_combo.setCurrentText(default_method)
             self.tableWidget_selected.setCellWidget(row, 5, interp_combo)
 
-            # 7. Output Type – non-editable, “Float32”
-            out_type_item = QTableWidgetItem("Float64")
+            # 7. Output Type – non-editable, from the toolbox precision policy
+            out_type_item = QTableWidgetItem(ALIGN_OUTPUT_TYPES[compute_precision()][0])
             out_type_item.setFlags(out_type_item.flags() ^ Qt.ItemIsEditable)
             out_type_item.setTextAlignment(Qt.AlignCenter)
             self.tableWidget_selected.setItem(row, 6, out_type_item)
@@ -443,7 +447,8 @@ class AlignLayersTool(QDialog, FORM_CLASS):
                 progress_dialog.setValue(row + 1)
                 continue
 
-            # 7b) Apply mask via raster calculator (Float64)
+            # 7b) Apply mask via raster calculator (Float64, or Float32 under
+            #     the float32 precision policy)
             final_filepath = os.path.join(output_folder, f"{new_basename}.tif")
             calc_params = {
                 'INPUT_A': temp_warped,
@@ -451,7 +456,7 @@ class AlignLayersTool(QDialog, FORM_CLASS):
                 'INPUT_B': self.ref_layer.source(),
                 'BAND_B': 1,
                 'FORMULA': 'A*B',
-                'RTYPE': 6,  # Float64
+                'RTYPE': ALIGN_OUTPUT_TYPES[compute_precision()][1],
                 'NODATA': None,
                 'OPTIONS': '',
                 'OUTPUT': final_filepath
@@ -483,6 +488,20 @@ class AlignLayersTool(QDialog, FORM_CLASS):
         QMessageBox.information(self, "Done", "All selected rasters have been aligned and masked.")
 
     def run(self):
-        # Show the Align Layers dialog.
+        # Show the Align Layers dialog (reused across launches: reset it first).
+        self.ref_layer = None
+        self.ref_cellsize = None
+        self.ref_cols = None
+        self.ref_rows = None
+        self.ref_crs = None
+        self.lineEdit_output_folder.clear()
+        self.plainTextEdit_ref_info.clear()
+        self.prepare_table_headers()
+        # filling the combo box selects its first layer: refresh the reference
+        # info and the available layers once, afterwards
+        self.comboBox_reference_layer.blockSignals(True)
+        self.populate_reference_layers()
+        self.comboBox_reference_layer.blockSignals(False)
+        self.on_reference_layer_changed(self.comboBox_reference_layer.currentIndex())
         return self.exec_()
 
@@ -54,6 +54,12 @@ from qgis.core           import (
     Qgis
 )
 
+from .layer_index import misalignment_report, shared_layer_index
+from .raster_stats_cache import raster_summary
+from .indicator_store import IndicatorStore
+from .precision import compute_dtype
+from .ui_forms import load_dialog
+
 # ordered list of the six EC‐state names, matching tabs 3→8
 EC_STATES = [
     'Physical',
@@ -72,6 +78,10 @@ TAB_STATE = {
     6: EC_STATES[4],  # 'Functional'
     7: EC_STATES[5],  # 'Landscape'
 }
+# Condition classes of the results tab: [0, 0.2), [0.2, 0.4), … [0.8, 1.0)
+RESULT_CLASS_EDGES = [i / 5 for i in range(6)]
+# Nodata value of the state and condition rasters
+CONDITION_NODATA = -9999
 
 class EcoCondTool:
     def __init__(self, iface):
@@ -84,6 +94,7 @@ class EcoCondTool:
         <div style="text-align:left">
           <h3>Base data for the analysis</h3>
           Please set a destination folder for the resulting raster files.
+          Optionally, choose the mask of the ecosystem type (pixels with value 1): the weighted sums are then computed for its pixels only, which is much faster when the ecosystem type covers a small part of the layers' extent.
         </div>
         """
         htmlTab2 = f"""
@@ -154,6 +165,8 @@ class EcoCondTool:
         # coloured buttons (to implement):
         self.default_btn_style   = ""  
         self.highlight_style     = "background-color: orange;" #FF8A24; # blue: #B0E0E6
+        # built on the first launch, then reused
+        self.dlg = None
 
     def run(self):
         # — reset any per‐run state —
@@ -162,15 +175,21 @@ class EcoCondTool:
         self._result_state_layers = {}
         self._result_final        = None
 
-        # load the UI into a QDialog parented to the QGIS main window
-        self.dlg = uic.loadUi(self.ui_path, QDialog(self.iface.mainWindow()))
-        self.dlg.setFixedSize(1424, 650)
+        # the (large) dialog is built and wired once, then reset on each launch
+        if self.dlg is None:
+            self._build_dialog()
 
-        # FIRST set up all your static content (incl. htmlTabTexts)
-        self.setup_main_tab()
+        # optional ecosystem type mask (sparse domain of the weighted sums)
+        self.dlg.cboDomainMask.clear()
+        self.dlg.cboDomainMask.addItem("None")
+        for lyr in shared_layer_index().raster_layers():
+            self.dlg.cboDomainMask.addItem(lyr.name(), lyr.id())
 
-        # THEN wire tab‐change → ec_tabs, and kick it off once
-        self.dlg.tabWidget.currentChanged.connect(self.setup_ec_tabs)
+        # no output folder from the previous run
+        self.dlg.lineFolder.clear()
+
+        # empty the EC tabs' tables and refresh their layer trees
+        self.reset_ec_tabs()
         self.setup_ec_tabs()
 
         tabw = self.dlg.tabWidget
@@ -178,7 +197,26 @@ class EcoCondTool:
         # only keep tab 0 (Intro) and tab 1 (Main Options) enabled
         for i in range(tabw.count()):
             tabw.setTabEnabled(i, i <= 1)
+        tabw.blockSignals(True)
+        tabw.setCurrentIndex(0)
+        tabw.blockSignals(False)
+
+        # Now that all the “static” tabs are ready, show the dialog:
+        self.dlg.exec_()
+
+    def _build_dialog(self):
+        # load the UI (cached form class) into a QDialog parented to the QGIS main window
+        self.dlg = load_dialog('tool_calc_condition.ui', self.iface.mainWindow())
+        self.dlg.setFixedSize(1424, 650)
+
+        # FIRST set up all your static content (incl. htmlTabTexts)
+        self.setup_main_tab()
+
+        # THEN wire tab‐change → ec_tabs
+        self.dlg.tabWidget.currentChanged.connect(self.setup_ec_tabs)
         self.dlg.btnNext1.clicked.connect(self.validate_main_options)
+        # connected once here (not in setup_weights_tab, which runs on every visit)
+        self.dlg.btnCalculate.clicked.connect(self.calculate_weighted_sums)
         
         # Set all ec-tabs() buttons here:
         # *** Wire up your buttons
@@ -198,8 +236,6 @@ class EcoCondTool:
                     i
                 )
             )
-        # Now that all the “static” tabs are ready, show the dialog:
-        self.dlg.exec_()
 
     # *********************************************************************
     # --------------------------
@@ -265,53 +301,32 @@ class EcoCondTool:
             intro.setHtml(self.htmlTabTexts[idx])
             intro.setStyleSheet("background-color: transparent;")
 
-            # 2) Clear out any old items
-            treeAvail.clear()
-            tableSel.clearContents()
-            tableSel.setRowCount(0)
+            # 2) Fill the available layers from the shared layer index:
+            #    only rebuilt when layers were added / removed / renamed
+            shared_layer_index().fill_tree(treeAvail)
 
-            # 3) Recursive function to add groups & layers
-            def addGroupItems(group, parentItem):
-                for child in group.children():
-                    if isinstance(child, QgsLayerTreeGroup):
-                        grpItem = QTreeWidgetItem([child.name()])
-                        font = grpItem.font(0);  font.setUnderline(True)
-                        grpItem.setFont(0, font)
-                        parentItem.addChild(grpItem)
-                        addGroupItems(child, grpItem)
-                    elif isinstance(child, QgsLayerTreeLayer):
-                        lyr = QgsProject.instance().mapLayer(child.layerId())
-                        if isinstance(lyr, QgsRasterLayer):
-                            item = QTreeWidgetItem([lyr.name()])
-                            item.setData(0, Qt.UserRole, lyr.id())
-                            parentItem.addChild(item)
-
-            # 4) Walk the root of the layer tree
-            root = QgsProject.instance().layerTreeRoot()
-            for top in root.children():
-                if isinstance(top, QgsLayerTreeGroup):
-                    topItem = QTreeWidgetItem([top.name()])
-                    font = topItem.font(0);  font.setUnderline(True)
-                    topItem.setFont(0, font)
-                    treeAvail.addTopLevelItem(topItem)
-                    addGroupItems(top, topItem)
-                elif isinstance(top, QgsLayerTreeLayer):
-                    lyr = QgsProject.instance().mapLayer(top.layerId())
-                    if isinstance(lyr, QgsRasterLayer):
-                        itm = QTreeWidgetItem([lyr.name()])
-                        itm.setData(0, Qt.UserRole, lyr.id())
-                        treeAvail.addTopLevelItem(itm)
-
-            # 5) Allow multi-select
+            # 3) Allow multi-select
             treeAvail.setSelectionMode(QAbstractItemView.ExtendedSelection)
 
-            # 6) Expand all so user sees the full hierarchy
+            # 4) Expand all so user sees the full hierarchy
             treeAvail.expandAll()
 
-            # 7) prepare the QTableWidget for added rows
+    def reset_ec_tabs(self):
+        # Empty the per-state tables of selected layers (new run only; tab
+        # changes keep them, like self.selected_layers)
+        for idx in range(2, 8):
+            tableSel = getattr(self.dlg, f'treeSelected{idx}')
+            tableSel.clearContents()
+            tableSel.setRowCount(0)
+            # prepare the QTableWidget for added rows
             tableSel.setColumnCount(2)
             tableSel.setHorizontalHeaderLabels(['Layer', 'Short Name (15 charac. max.)'])
             tableSel.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+            # drop the step highlights of the previous run
+            for name in (f'btnMulticollinearWarning{idx}', f'btnNext{idx}'):
+                btn = getattr(self.dlg, name)
+                btn.setEnabled(True)
+                btn.setStyleSheet("")
 
     # Helper: add selected items into table
     def ec_add_layer(self, treeAvail, tableSel, idx):
@@ -504,18 +519,14 @@ class EcoCondTool:
             btnNext.setEnabled(False)
             return
     
-        # 2) test against the first
-        bad = []
-        ref = layers[0]
-        for lyr in layers[1:]:
-            if not self.layersAligned(ref, lyr):
-                bad.append(lyr.name())
+        # 2) group all layers by (cached) grid signature, in one pass
+        clusters = shared_layer_index().grid_clusters(layers)
     
-        if bad:
+        if len(clusters) > 1:
             QMessageBox.critical(
                 self.iface.mainWindow(),
                 "Alignment Error",
-                "The following are misaligned:\n\n" + "\n".join(bad)
+                "The selected layers use different grids:\n\n" + misalignment_report(clusters)
             )
             btnNext.setEnabled(False)
             return
@@ -543,14 +554,8 @@ class EcoCondTool:
         
 
     def layersAligned(self, l1, l2):
-        return (
-            l1.width() == l2.width() and
-            l1.height() == l2.height() and
-            l1.rasterUnitsPerPixelX() == l2.rasterUnitsPerPixelX() and
-            l1.rasterUnitsPerPixelY() == l2.rasterUnitsPerPixelY() and
-            l1.extent() == l2.extent() and
-            l1.crs() == l2.crs()
-        )
+        index = shared_layer_index()
+        return index.grid_signature(l1) == index.grid_signature(l2)
 
     def getSelectedLayers(self):
         layers = []
@@ -678,7 +683,6 @@ class EcoCondTool:
 
         # 6) Enable the “Calculate” button
         self.dlg.btnCalculate.setEnabled(True)
-        self.dlg.btnCalculate.clicked.connect(self.calculate_weighted_sums)
 
     # The weights rebalance logic
     def _on_layer_weight_changed(self, val, sb, item, parent_item):
@@ -808,9 +812,6 @@ class EcoCondTool:
                 e = next(e for e in self.selected_layers if e['short'] == short)
                 groups[state].append((e['layer'], w))
 
-        # Helper: the six possible letters
-        letters = ['A','B','C','D','E','F']
-
         # Set a layer group destination for the output files
         project = QgsProject.instance()
         root = project.layerTreeRoot()
@@ -823,57 +824,30 @@ class EcoCondTool:
         if not grp:
             grp = root.addGroup(group_name)
 
-        # 2) each state → its own weighted sum
-        state_paths = {}
+        # 2) each state → its own weighted sum, 3) final Ecosystem Condition
+        #    = weighted sum of the state rasters; with an ecosystem type
+        #    mask, only over its pixels (compact vectors)
+        mask_id = self.dlg.cboDomainMask.currentData()
+        try:
+            if mask_id:
+                state_paths = self.domain_weighted_sums(
+                    project.mapLayer(mask_id).source(), groups, weights, out_folder, final_path
+                )
+            else:
+                state_paths = self.calculator_weighted_sums(groups, weights, out_folder, final_path)
+        except ValueError as e:
+            QMessageBox.critical(self.iface.mainWindow(), "Calculation Error", str(e))
+            return
+
         for idx, state in enumerate(EC_STATES, start=1):
-            layers = groups.get(state, [])
-            if not layers:
+            if state not in state_paths:
                 continue
-
-            # build the formula like "0.3*A + 0.7*B"
-            expr = " + ".join(f"{w}*{letters[j]}"
-                              for j, (_lyr, w) in enumerate(layers))
-
-            params = {
-                "FORMULA": expr,
-                "NO_DATA": -9999,
-                "RTYPE": 5,
-                "OUTPUT": os.path.join(out_folder, f"{idx:02d}_{state}.tif")
-            }
-            # now fill the INPUT_A.. slots properly
-            for j, (lyr, _) in enumerate(layers):
-                letter = letters[j]
-                params[f"INPUT_{letter}"] = lyr.source()
-                params[f"BAND_{letter}"]  = 1
-
-            res = processing.run("gdal:rastercalculator", params)
-            state_paths[state] = res["OUTPUT"] # record the path for later steps 
-            
             # Add to the defined layer group
-            state_lyr = QgsRasterLayer(res["OUTPUT"], f"{idx:02d}_{state}")
+            state_lyr = QgsRasterLayer(state_paths[state], f"{idx:02d}_{state}")
             
             QgsProject.instance().addMapLayer(state_lyr, addToLegend=False)
             grp.addLayer(state_lyr)
 
-        # 3) final Ecosystem Condition = weighted sum of those six rasters
-        ordered = [s for s in EC_STATES if s in state_paths]
-        expr2 = " + ".join(f"{weights[s]}*{letters[i]}"
-                           for i, s in enumerate(ordered))
-
-        params2 = {
-            "FORMULA": expr2,
-            "NO_DATA": -9999,
-            "RTYPE": 5,
-            "OUTPUT": final_path
-        }
-        for i, s in enumerate(ordered):
-            letter = letters[i]
-            params2[f"INPUT_{letter}"] = state_paths[s]
-            params2[f"BAND_{letter}"]  = 1
-
-        # single, correct call
-        processing.run("gdal:rastercalculator", params2)
-
         # 4) add to QGIS as a styled layer
         final_lyr = QgsRasterLayer(final_path, "EcoCondition")
         final_path = final_lyr.source()
@@ -887,14 +861,12 @@ class EcoCondTool:
         renderer = QgsSingleBandGrayRenderer(provider, 1)
         
         # 6) compute real min/max
-        # read stats on band #1, All flags, over the full extent at our chosen resolution
-        stats = provider.bandStatistics(
-            1,
-            QgsRasterBandStats.All
-        )
+        # one strip-wise scan of band #1, kept in the shared statistics cache
+        # (with the class counts the results tab needs)
+        stats = raster_summary(final_path, RESULT_CLASS_EDGES, dtype=compute_dtype())
 
-        min_val = stats.minimumValue
-        max_val = stats.maximumValue
+        min_val = stats['min'] if stats['min'] is not None else 0.0
+        max_val = stats['max'] if stats['max'] is not None else 1.0
 
         # 7) build a contrast enhancer with those ends
         ce = QgsContrastEnhancement(provider.dataType(1))
@@ -964,6 +936,92 @@ class EcoCondTool:
         tabw.setTabEnabled(last_idx, True)
         tabw.setCurrentIndex(last_idx)
 
+    def calculator_weighted_sums(self, groups, weights, out_folder, final_path):
+        """State rasters and the final raster with gdal:rastercalculator (whole grid)."""
+        # Helper: the six possible letters
+        letters = ['A','B','C','D','E','F']
+
+        state_paths = {}
+        for idx, state in enumerate(EC_STATES, start=1):
+            layers = groups.get(state, [])
+            if not layers:
+                continue
+
+            # build the formula like "0.3*A + 0.7*B"
+            expr = " + ".join(f"{w}*{letters[j]}"
+                              for j, (_lyr, w) in enumerate(layers))
+
+            params = {
+                "FORMULA": expr,
+                "NO_DATA": CONDITION_NODATA,
+                "RTYPE": 5,
+                "OUTPUT": os.path.join(out_folder, f"{idx:02d}_{state}.tif")
+            }
+            # now fill the INPUT_A.. slots properly
+            for j, (lyr, _) in enumerate(layers):
+                letter = letters[j]
+                params[f"INPUT_{letter}"] = lyr.source()
+                params[f"BAND_{letter}"]  = 1
+
+            res = processing.run("gdal:rastercalculator", params)
+            state_paths[state] = res["OUTPUT"] # record the path for later steps 
+
+        ordered = [s for s in EC_STATES if s in state_paths]
+        expr2 = " + ".join(f"{weights[s]}*{letters[i]}"
+                           for i, s in enumerate(ordered))
+
+        params2 = {
+            "FORMULA": expr2,
+            "NO_DATA": CONDITION_NODATA,
+            "RTYPE": 5,
+            "OUTPUT": final_path
+        }
+        for i, s in enumerate(ordered):
+            letter = letters[i]
+            params2[f"INPUT_{letter}"] = state_paths[s]
+            params2[f"BAND_{letter}"]  = 1
+
+        # single, correct call
+        processing.run("gdal:rastercalculator", params2)
+        return state_paths
+
+    def domain_weighted_sums(self, mask_path, groups, weights, out_folder, final_path):
+        """
+        State rasters and the final raster over the ecosystem type only: the
+        pixels with value 1 in `mask_path` are indexed once, every layer is
+        read there as a compact column of the indicator store, and the sums
+        are scattered back to the grid when written (nodata elsewhere, and
+        where an input is nodata).
+        """
+        store = IndicatorStore.open(mask_path)
+        domain = store.domain
+        dtype = compute_dtype()
+        if not domain.size:
+            raise ValueError("The ecosystem type mask has no pixels with value 1.")
+        template = None
+        state_values, state_paths = {}, {}
+        for idx, state in enumerate(EC_STATES, start=1):
+            layers = groups.get(state, [])
+            if not layers:
+                continue
+            if template is None:
+                template = gdal.Open(layers[0][0].source())
+            columns = [(store.column(lyr.source()), w) for lyr, w in layers]
+            # float32 sums only when every column is exact in float32
+            acc = np.zeros(domain.size, dtype=np.result_type(dtype, *(c.dtype for c, _ in columns)))
+            for col, w in columns:
+                # NaN (nodata) propagates, as in the raster calculator
+                acc += w * col
+            path = os.path.join(out_folder, f"{idx:02d}_{state}.tif")
+            domain.write(path, acc, template, CONDITION_NODATA)
+            state_values[state], state_paths[state] = acc, path
+
+        final = np.zeros(domain.size, dtype=np.result_type(dtype, *state_values.values()))
+        for state, acc in state_values.items():
+            final += weights[state] * acc
+        domain.write(final_path, final, template, CONDITION_NODATA)
+        return state_paths
+
     # --------------------------
     # **** TAB 9
     # --------------------------
@@ -1041,23 +1099,19 @@ class EcoCondTool:
         lm_widget.setFixedWidth(width)      # exactly the gradient’s width
 
         # - 5) Build area‐by‐class table -
-        # *** - 1. read the raster into a numpy array via GDAL
-        ds  = gdal.Open(final_path)
-        arr = ds.GetRasterBand(1).ReadAsArray()
+        # *** - 1. class counts from the statistics cache (no second scan
+        #          of the raster after the min/max of calculate_weighted_sums)
+        stats = raster_summary(final_path, RESULT_CLASS_EDGES, dtype=compute_dtype())
     
         # *** - 2. compute pixel area in km²
         pix_w = abs(final_lyr.rasterUnitsPerPixelX())
         pix_h = abs(final_lyr.rasterUnitsPerPixelY())
         km2_per_pixel = (pix_w * pix_h) / 1e6
 
-        # *** - 3. define the five 0.2-wide bins and tally areas
-        bins    = [i*0.2 for i in range(6)]  # [0.0, 0.2, …, 1.0]
+        # *** - 3. the five 0.2-wide bins and their areas
+        bins    = RESULT_CLASS_EDGES     # [0.0, 0.2, …, 1.0]
         classes = [(bins[i], bins[i+1]) for i in range(5)]
-        areas   = []
-        for lo, hi in classes:
-            mask  = (arr >= lo) & (arr < hi)
-            count = np.count_nonzero(mask)
-            areas.append(count * km2_per_pixel)
+        areas   = [count * km2_per_pixel for count in stats['counts']]
 
         # *** - 4. build the table widget
         tbl = QTableWidget(len(classes), 2, legend_widget)
@@ -1,10 +1,24 @@
 import os
 from qgis.PyQt import uic
-from qgis.PyQt.QtWidgets import QFileDialog, QMessageBox, QTreeWidgetItem, QComboBox, QDialog
-from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtWidgets import (
+    QFileDialog, QMessageBox, QTreeWidgetItem, QComboBox, QDialog, QDialogButtonBox, QLineEdit
+)
+from qgis.PyQt.QtCore import Qt, QObject, QThread, pyqtSignal
 from qgis.core import QgsProject, QgsRasterLayer
 from osgeo import gdal
 import numpy as np
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .layer_index import shared_layer_index
+from .quantile_sketch import QuantileSketch
+from .raster_blocks import StripWriter, block_windows, gtiff_creation_options, strip_rows
+from .raster_stats_cache import RunningMoments, shared_cache
+from .indicator_store import IndicatorStore
+from .precision import compute_dtype, read_dtype
+from .transfer_functions import TRANSFER_KINDS, TransferFunction
+from .ui_forms import load_dialog
+from .worker_pool import default_workers
 
 # List of ecosystem states for the combobox
 EC_STATES = [
@@ -12,31 +26,567 @@ EC_STATES = [
     'Structural', 'Functional', 'Landscape'
 ]
 
+# Normalisation methods, in the order of the comboMethod items
+METHOD_MINMAX, METHOD_PERCENTILE, METHOD_QUANTILE = 0, 1, 2
+METHOD_NAMES = ('minmax', 'percentile', 'quantile')
+
+# Output formats, in the order of the comboOutput items
+OUTPUT_GTIFF, OUTPUT_VRT = 0, 1
+# Maximum number of breakpoints of a quantile-mode VRT lookup table
+VRT_LUT_POINTS = 256
+
+# Output statistics: fine histogram for percentiles (0.001 resolution),
+# compact histogram written to the summary CSV, reported percentiles
+OUTPUT_HIST_BINS  = 1000
+SUMMARY_HIST_BINS = 10
+SUMMARY_PERCENTILES = (5, 25, 50, 75, 95)
+SUMMARY_COLUMNS = (
+    ['valid_count', 'mean', 'std']
+    + [f'p{p}' for p in SUMMARY_PERCENTILES]
+    + ['clamped_low', 'clamped_high', 'histogram']
+)
+
 #ui_path = os.path.join(os.path.dirname(__file__), 'tool_normalise_invert.ui')
 
+
+class NormalizeCancelled(Exception):
+    """Raised inside NormalizeWorker when the user cancels the run."""
+
+
+class SharedMasks:
+    """
+    The min-mask and the max-mask (clipped by the min-mask), read once and
+    kept bit-packed (1 bit per pixel each) so all layer threads can share
+    them read-only.
+    """
+
+    def __init__(self, min_path, max_path, check=None):
+        min_ds = gdal.Open(min_path)
+        max_ds = gdal.Open(max_path)
+        min_band = min_ds.GetRasterBand(1)
+        max_band = max_ds.GetRasterBand(1)
+        self.xsize = min_band.XSize
+        min_parts, max_parts = [], []
+        for yoff, nrows in block_windows(min_band.YSize, strip_rows(min_band)):
+            if check:
+                check()
+            in_min = min_band.ReadAsArray(0, yoff, self.xsize, nrows) == 1
+            in_max = (max_band.ReadAsArray(0, yoff, self.xsize, nrows) == 1) & in_min
+            min_parts.append(np.packbits(in_min, axis=1))
+            max_parts.append(np.packbits(in_max, axis=1))
+        self._min = np.concatenate(min_parts)
+        self._max = np.concatenate(max_parts)
+        self._min.flags.writeable = False
+        self._max.flags.writeable = False
+
+    def _strip(self, packed, yoff, nrows):
+        return np.unpackbits(packed[yoff:yoff + nrows], axis=1, count=self.xsize).astype(bool)
+
+    def min_strip(self, yoff, nrows):
+        return self._strip(self._min, yoff, nrows)
+
+    def max_strip(self, yoff, nrows):
+        return self._strip(self._max, yoff, nrows)
+
+
+class OutputStatistics:
+    """
+    Running statistics of one layer's normalised output, updated strip by
+    strip while it is written: valid count, mean, std, a fine histogram of
+    the 0–1 values (for percentiles) and the number of input pixels capped
+    at each bound.
+    """
+
+    def __init__(self, bins=OUTPUT_HIST_BINS):
+        self.bins     = bins
+        self.hist     = np.zeros(bins, dtype=np.int64)
+        self.count    = 0
+        self.moments  = RunningMoments()
+        self.below    = 0
+        self.above    = 0
+
+    def count_clamped(self, raw, valid, mmin, mmax):
+        """Count valid input pixels outside [mmin, mmax] (before capping)."""
+        self.below += int(np.count_nonzero((raw < mmin) & valid))
+        self.above += int(np.count_nonzero((raw > mmax) & valid))
+
+    def update(self, out, valid):
+        """Add the valid 0–1 output values of a strip."""
+        v = out[valid]
+        if not v.size:
+            return
+        self.count    += v.size
+        self.moments.update(v)
+        idx = np.minimum((v * self.bins).astype(np.int64), self.bins - 1)
+        self.hist += np.bincount(idx, minlength=self.bins)
+
+    def percentile(self, p):
+        """Percentile p (0–100), interpolated inside the histogram bin."""
+        target = p / 100.0 * self.count
+        cum = np.cumsum(self.hist)
+        i = min(int(np.searchsorted(cum, target)), self.bins - 1)
+        before = cum[i - 1] if i else 0
+        frac = (target - before) / self.hist[i] if self.hist[i] else 0.0
+        return float((i + frac) / self.bins)
+
+    def summary(self):
+        """Values for SUMMARY_COLUMNS (all NaN / empty without valid pixels)."""
+        if not self.count:
+            out = dict.fromkeys(SUMMARY_COLUMNS, np.nan)
+            out.update(valid_count=0, histogram='')
+            return out
+        compact = self.hist.reshape(SUMMARY_HIST_BINS, -1).sum(axis=1)
+        out = {'valid_count': self.count, 'mean': self.moments.mean, 'std': self.moments.std()}
+        for p in SUMMARY_PERCENTILES:
+            out[f'p{p}'] = self.percentile(p)
+        out['clamped_low']  = self.below / self.count
+        out['clamped_high'] = self.above / self.count
+        out['histogram'] = ' '.join(str(int(c)) for c in compact)
+        return out
+
+
+class NormalizeWorker(QObject):
+    # Signals to communicate
+    finished  = pyqtSignal(list)     # will emit the list of per-layer results
+    error     = pyqtSignal(str)      # emit error message
+    progress  = pyqtSignal(int, str) # percent done, description
+    cancelled = pyqtSignal()         # emitted instead of finished on cancel
+
+    def __init__(self, tasks, settings, workers=None):
+        """
+        tasks: list of {'name', 'source', 'ec_state', 'invert', 'transfer'};
+        settings: min_path, max_path, out_folder, prefix, suffix, clip,
+        sparse, method, p_low, p_high, output, compress, uint16, overviews,
+        dtype (compute precision of the strips).
+        """
+        super().__init__()
+        self.tasks    = tasks
+        self.settings = settings
+        self.workers  = workers or default_workers()
+        # sparse mode (clipped GeoTIFF output): the indicator store of the
+        # min-mask pixels, its SparseDomain and the max-mask over them,
+        # set up by run()
+        self.store    = None
+        self.domain   = None
+        self.in_max   = None
+        self._cancel_requested = False
+        # share of each layer's two passes already done
+        self._layer_done = [0.0] * len(tasks)
+
+    def cancel(self):
+        # Called from the GUI thread; checked between strips
+        self._cancel_requested = True
+
+    def _check_cancel(self):
+        if self._cancel_requested:
+            raise NormalizeCancelled()
+
+    def _report(self, index, fraction, text):
+        self._layer_done[index] = fraction
+        done = sum(self._layer_done) / max(len(self.tasks), 1)
+        self.progress.emit(int(5 + 95 * done), text)
+
+    def run(self):
+        try:
+            st = self.settings
+            masks = None
+            if st.get('sparse') and st['clip']:
+                # only the min-mask pixels are read, normalised and written
+                self.progress.emit(0, "Indexing the ecosystem type area")
+                self.store  = IndicatorStore.open(st['min_path'], 1, check=self._check_cancel)
+                self.domain = self.store.domain
+                self.in_max = self.store.column(st['max_path'], self._check_cancel) == 1
+            else:
+                self.progress.emit(0, "Reading masks")
+                masks = SharedMasks(st['min_path'], st['max_path'], self._check_cancel)
+            # GDAL reads / writes release the GIL: normalise layers concurrently
+            results = [None] * len(self.tasks)
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {
+                    pool.submit(self.normalise_layer, i, task, masks): i
+                    for i, task in enumerate(self.tasks)
+                }
+                try:
+                    for fut in as_completed(futures):
+                        results[futures[fut]] = fut.result()
+                except BaseException:
+                    self._cancel_requested = True
+                    for fut in futures:
+                        fut.cancel()
+                    raise
+            self.finished.emit(results)
+        except NormalizeCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def normalise_layer(self, index, task, masks):
+        st = self.settings
+        name = task['name']
+        ds = gdal.Open(task['source'])
+        src_band = ds.GetRasterBand(1)
+        nod = src_band.GetNoDataValue()
+        out_nod = nod if nod is not None else -9999
+        rows = strip_rows(src_band)
+        n_strips = -(-src_band.YSize // rows)
+        method = st['method']
+        # float32 only where it holds the layer's values exactly
+        dtype = read_dtype(src_band, st['dtype'])
+
+        # VRT output: only the statistics pass reads pixels
+        as_vrt = st['output'] == OUTPUT_VRT
+        pass1_share = 1.0 if as_vrt else 0.5
+
+        # pass 1: masked min / max (or percentiles from streaming
+        # quantile sketches of both mask regions), strip by strip,
+        # skipped when the statistics cache knows this layer / mask version
+        def pass1(s):
+            self._check_cancel()
+            self._report(index, pass1_share * s / n_strips, f"{name}: statistics")
+
+        sketches = method != METHOD_MINMAX
+        values = None
+        if self.domain is not None:
+            # sparse mode: the layer over the min-mask as one compact vector
+            # (a copy of its stored column, normalised in place), for both passes
+            self._report(index, 0.0, f"{name}: reading the ecosystem type area")
+            values = np.array(self.store.column(task['source'], self._check_cancel), dtype=dtype)
+            compute = lambda: self.domain_statistics(values, self.in_max, sketches)
+        else:
+            compute = lambda: self.masked_statistics(src_band, masks, rows, sketches, pass1, dtype)
+        stats = self.cached_statistics(task['source'], compute, sketches, dtype)
+        if sketches:
+            mmin = stats['min_sketch'].quantile(st['p_low'] / 100.0)
+            mmax = stats['max_sketch'].quantile(st['p_high'] / 100.0)
+        else:
+            mmin, mmax = stats['min'], stats['max']
+        # the bounds come from two mask regions: they may cross or coincide
+        if not mmax > mmin:
+            if sketches:
+                raise ValueError(
+                    f"{name}: the {st['p_low']:g}th percentile of the min-mask area ({mmin:g}) "
+                    f"is not below the {st['p_high']:g}th percentile of the max-mask area "
+                    f"({mmax:g}): cannot normalise this layer."
+                )
+            raise ValueError(
+                f"{name}: the minimum of the min-mask area ({mmin:g}) is not below the "
+                f"maximum of the max-mask area ({mmax:g}): cannot normalise this layer."
+            )
+        # quantile mode: rank against the distribution in the min-mask area
+        rank_sketch = stats['min_sketch'] if method == METHOD_QUANTILE else None
+
+        if as_vrt:
+            out_fn = f"{st['prefix']}{name}{st['suffix']}.vrt"
+            out_path = os.path.join(st['out_folder'], out_fn)
+            lut = self.lut_points(mmin, mmax, task['invert'], rank_sketch, task['transfer'])
+            self.write_lut_vrt(out_path, ds, task['source'], nod, lut)
+            self._report(index, 1.0, f"{name}: done")
+            # no pixels are rewritten: no output statistics
+            return {'name': name, 'ec_state': task['ec_state'], 'invert': task['invert'],
+                    'transfer': task['transfer'].describe(), 'stats': None,
+                    'min': mmin, 'max': mmax, 'path': out_path, 'file': out_fn}
+
+        # pass 2: cap, transfer function / invert, clip and write each strip
+        out_fn = f"{st['prefix']}{name}{st['suffix']}.tif"
+        out_path = os.path.join(st['out_folder'], out_fn)
+        drv = gdal.GetDriverByName('GTiff')
+        out_ds = drv.Create(
+            out_path, ds.RasterXSize, ds.RasterYSize, 1,
+            gdal.GDT_UInt16 if st['uint16'] else gdal.GDT_Float32,
+            options=gtiff_creation_options(st['compress'], st['uint16'], sparse=values is not None)
+        )
+        out_ds.SetGeoTransform(ds.GetGeoTransform())
+        out_ds.SetProjection(ds.GetProjection())
+        writer = StripWriter(out_ds, out_nod, st['uint16'], st['overviews'])
+
+        # overviews are filled from the same strips: align strips on the
+        # largest decimation factor
+        step = writer.row_multiple
+        rows = max(step, rows - rows % step)
+        n_strips = -(-src_band.YSize // rows)
+
+        def pass2(s):
+            self._check_cancel()
+            self._report(index, 0.5 + 0.5 * s / n_strips, f"{name}: writing")
+
+        # QA statistics of the output, accumulated while it is written
+        out_stats = OutputStatistics()
+        try:
+            if values is not None:
+                self.write_normalised_sparse(
+                    self.domain, values, writer, mmin, mmax, task['invert'], out_nod,
+                    rows, rank_sketch, pass2, task['transfer'], out_stats
+                )
+            else:
+                self.write_normalised(
+                    src_band, writer, masks if st['clip'] else None,
+                    mmin, mmax, task['invert'], out_nod, rows, rank_sketch, pass2,
+                    task['transfer'], out_stats, dtype
+                )
+        except BaseException:
+            # do not leave half-written outputs behind (errors, cancellation)
+            writer = out_ds = None
+            try:
+                drv.Delete(out_path)
+            except Exception:
+                pass
+            raise
+        writer = out_ds = None
+        self._report(index, 1.0, f"{name}: done")
+
+        return {'name': name, 'ec_state': task['ec_state'], 'invert': task['invert'],
+                'transfer': task['transfer'].describe(), 'stats': out_stats.summary(),
+                'min': mmin, 'max': mmax, 'path': out_path, 'file': out_fn}
+
+    def cached_statistics(self, source, compute, sketches, dtype=float):
+        """
+        Masked statistics (`compute()`: `masked_statistics` or
+        `domain_statistics`), served from (and stored in) the shared
+        statistics cache, keyed by the layer, both mask files and the
+        dtype the layer is read as (float32 statistics are not reused under
+        float64).
+        """
+        cache = shared_cache()
+        mask = (('min', self.settings['min_path']), ('max', self.settings['max_path']))
+        # sketch entries also answer min / max requests
+        kinds = ('masked_sketches',) if sketches else ('masked_minmax', 'masked_sketches')
+        if np.dtype(dtype) != np.float64:
+            kinds = tuple(f"{kind}:{np.dtype(dtype).name}" for kind in kinds)
+        for kind in kinds:
+            hit = cache.get(source, kind, mask)
+            if hit is not None:
+                return {
+                    'min': hit['min'], 'max': hit['max'],
+                    'min_sketch': QuantileSketch.from_state(hit['min_sketch']) if sketches else None,
+                    'max_sketch': QuantileSketch.from_state(hit['max_sketch']) if sketches else None,
+                }
+        stats = compute()
+        value = {'min': stats['min'], 'max': stats['max']}
+        if sketches:
+            value['min_sketch'] = stats['min_sketch'].to_state()
+            value['max_sketch'] = stats['max_sketch'].to_state()
+        cache.put(source, kinds[0], value, mask)
+        return stats
+
+    @staticmethod
+    def lut_points(mmin, mmax, invert, rank_sketch=None, transfer=None):
+        """
+        (input, output) breakpoints of the normalisation as a piecewise-linear
+        lookup table: GDAL clamps inputs outside the first / last breakpoint,
+        so a 2-point table is exactly the cap + scale (+ invert) transform.
+        Quantile mode samples the sketched CDF between the bounds; other
+        transfer functions add their breakpoints (smooth ones are sampled).
+        """
+        if not mmax > mmin:
+            raise ValueError("Lower and upper bounds are equal: cannot normalise.")
+        transfer = transfer or TransferFunction()
+        if rank_sketch is None:
+            inner = transfer.breakpoints(mmin, mmax)
+            inner = inner[(inner > mmin) & (inner < mmax)]
+            xs = np.unique(np.concatenate(([mmin], inner, [mmax])).astype(float))
+            ys = transfer.apply(xs.copy(), mmin, mmax)
+        else:
+            bounds, cum = rank_sketch.cdf_table()
+            inner = (bounds > mmin) & (bounds < mmax)
+            xs = np.concatenate(([mmin], bounds[inner], [mmax]))
+            lo, hi = rank_sketch.cdf(np.array([mmin, mmax]))
+            ys = transfer.apply(rank_sketch.cdf(xs), lo, hi)
+        if len(xs) > VRT_LUT_POINTS:
+            keep = np.unique(np.linspace(0, len(xs) - 1, VRT_LUT_POINTS).astype(int))
+            xs, ys = xs[keep], ys[keep]
+        if invert:
+            ys = 1.0 - ys
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    @staticmethod
+    def write_lut_vrt(out_path, ds, source_path, nodata, lut):
+        """
+        Float32 VRT reading `source_path` through a <LUT>: a few kilobytes
+        instead of a rewritten raster. Source nodata stays nodata.
+        """
+        root = ET.Element('VRTDataset', rasterXSize=str(ds.RasterXSize),
+                          rasterYSize=str(ds.RasterYSize))
+        ET.SubElement(root, 'SRS').text = ds.GetProjection()
+        ET.SubElement(root, 'GeoTransform').text = ', '.join(repr(v) for v in ds.GetGeoTransform())
+        band = ET.SubElement(root, 'VRTRasterBand', dataType='Float32', band='1')
+        out_nod = nodata if nodata is not None else -9999
+        ET.SubElement(band, 'NoDataValue').text = repr(float(out_nod))
+        src = ET.SubElement(band, 'ComplexSource')
+        ET.SubElement(src, 'SourceFilename', relativeToVRT='0').text = source_path
+        ET.SubElement(src, 'SourceBand').text = '1'
+        size = {'xOff': '0', 'yOff': '0',
+                'xSize': str(ds.RasterXSize), 'ySize': str(ds.RasterYSize)}
+        ET.SubElement(src, 'SrcRect', size)
+        ET.SubElement(src, 'DstRect', size)
+        if nodata is not None:
+            ET.SubElement(src, 'NODATA').text = repr(float(nodata))
+        ET.SubElement(src, 'LUT').text = ','.join(f"{x!r}:{y!r}" for x, y in lut)
+        if hasattr(ET, 'indent'):
+            # pretty-printed where available (Python 3.9+)
+            ET.indent(root)
+        ET.ElementTree(root).write(out_path, encoding='UTF-8', xml_declaration=False)
+
+    @staticmethod
+    def masked_statistics(src_band, masks, rows, sketches=False, callback=None, dtype=float):
+        """
+        Minimum inside the min-mask and maximum inside the max-mask (clipped
+        by the min-mask), over the valid pixels of `src_band`, read strip by
+        strip (as `dtype`) so only one strip of the layer is in memory. With
+        `sketches`, also quantile sketches of both regions ('min_sketch',
+        'max_sketch').
+        """
+        nod = src_band.GetNoDataValue()
+        mmin, mmax = np.inf, -np.inf
+        min_sketch = QuantileSketch() if sketches else None
+        max_sketch = QuantileSketch() if sketches else None
+        for s, (yoff, nrows) in enumerate(block_windows(src_band.YSize, rows)):
+            if callback:
+                callback(s)
+            raw = src_band.ReadAsArray(0, yoff, src_band.XSize, nrows)
+            arr = raw.astype(dtype, copy=False)
+            valid = ~np.isnan(arr)
+            if nod is not None:
+                valid &= raw != nod
+            in_min = masks.min_strip(yoff, nrows) & valid
+            in_max = masks.max_strip(yoff, nrows) & valid
+            if in_min.any():
+                mmin = min(mmin, float(arr[in_min].min()))
+            if in_max.any():
+                mmax = max(mmax, float(arr[in_max].max()))
+            if sketches:
+                min_sketch.update(arr[in_min])
+                max_sketch.update(arr[in_max])
+        if not (np.isfinite(mmin) and np.isfinite(mmax)):
+            raise ValueError("No valid pixels inside the min / max masks.")
+        return {'min': mmin, 'max': mmax,
+                'min_sketch': min_sketch, 'max_sketch': max_sketch}
+
+    @staticmethod
+    def domain_statistics(values, in_max, sketches=False):
+        """
+        `masked_statistics` of a layer gathered over the min-mask domain
+        (`values`, NaN = nodata), `in_max` flagging its max-mask pixels.
+        """
+        valid = ~np.isnan(values)
+        in_min = values[valid]
+        in_max = values[valid & in_max]
+        if not (in_min.size and in_max.size):
+            raise ValueError("No valid pixels inside the min / max masks.")
+        min_sketch = max_sketch = None
+        if sketches:
+            min_sketch, max_sketch = QuantileSketch(), QuantileSketch()
+            min_sketch.update(in_min)
+            max_sketch.update(in_max)
+        return {'min': float(in_min.min()), 'max': float(in_max.max()),
+                'min_sketch': min_sketch, 'max_sketch': max_sketch}
+
+    @staticmethod
+    def score_levels(mmin, mmax, rank_sketch=None):
+        """(CDF table or None, lo, hi): the levels the transfer function maps to 0–1."""
+        if rank_sketch is None:
+            return None, mmin, mmax
+        table = rank_sketch.cdf_table()
+        lo, hi = rank_sketch.cdf(np.array([mmin, mmax]), table)
+        return table, lo, hi
+
+    @staticmethod
+    def normalise_values(arr, valid, mmin, mmax, invert, nodata, transfer, levels,
+                         rank_sketch=None, stats=None):
+        """
+        Cap, rank (with `rank_sketch`), transfer and invert a float strip or
+        compact vector, mostly in place, `nodata` where not `valid`.
+        """
+        table, lo, hi = levels
+        if stats is not None:
+            stats.count_clamped(arr, valid, mmin, mmax)
+        np.clip(arr, mmin, mmax, out=arr)
+        if table is not None:
+            arr = rank_sketch.cdf(arr, table)
+        arr = transfer.apply(arr, lo, hi)
+        if invert:
+            np.subtract(1, arr, out=arr)
+        if stats is not None:
+            stats.update(arr, valid)
+        arr[~valid] = nodata
+        return arr
+
+    @staticmethod
+    def write_normalised_sparse(domain, values, writer, mmin, mmax, invert, nodata, rows,
+                                rank_sketch=None, callback=None, transfer=None, stats=None):
+        """
+        `write_normalised` of a layer gathered over the min-mask `domain`:
+        the compact vector `values` is normalised at once (in place), then
+        scattered to the strips holding domain pixels; the other strips are
+        not written (SPARSE_OK output, read back as nodata).
+        """
+        transfer = transfer or TransferFunction()
+        valid = ~np.isnan(values)
+        levels = NormalizeWorker.score_levels(mmin, mmax, rank_sketch)
+        values = NormalizeWorker.normalise_values(
+            values, valid, mmin, mmax, invert, nodata, transfer, levels, rank_sketch, stats
+        )
+        for yoff, strip in domain.strips(values, rows, nodata):
+            if callback:
+                callback(yoff // rows)
+            writer.write(strip, yoff)
+
+    @staticmethod
+    def write_normalised(src_band, writer, clip_masks, mmin, mmax, invert, nodata, rows,
+                         rank_sketch=None, callback=None, transfer=None, stats=None, dtype=float):
+        """
+        Cap to [mmin, mmax], map to 0–1 with `transfer` (a TransferFunction,
+        default linear between the bounds), optionally invert, set source
+        nodata and pixels outside the min-mask of `clip_masks` to `nodata`
+        and pass each strip to `writer` (a StripWriter). With `rank_sketch`, capped values are first replaced by their
+        empirical CDF, so the scaling runs between F(mmin) and F(mmax).
+        All steps run in place on the strip read (as `dtype`), whatever the
+        function; `stats` (an OutputStatistics) is updated from the same strips.
+        """
+        transfer = transfer or TransferFunction()
+        src_nod = src_band.GetNoDataValue()
+        levels = NormalizeWorker.score_levels(mmin, mmax, rank_sketch)
+        for s, (yoff, nrows) in enumerate(block_windows(src_band.YSize, rows)):
+            if callback:
+                callback(s)
+            raw = src_band.ReadAsArray(0, yoff, src_band.XSize, nrows)
+            arr = raw.astype(dtype, copy=False)
+            valid = ~np.isnan(arr)
+            if src_nod is not None:
+                valid &= raw != src_nod
+            if clip_masks is not None:
+                valid &= clip_masks.min_strip(yoff, nrows)
+            arr = NormalizeWorker.normalise_values(
+                arr, valid, mmin, mmax, invert, nodata, transfer, levels, rank_sketch, stats
+            )
+            writer.write(arr, yoff)
+
+
 class NormalizeTool:
     def __init__(self, iface):
         self.iface = iface
         self.ui_path = os.path.join(os.path.dirname(__file__), 'tool_normalise_invert.ui')
+        self.dialog = None
+        self.worker = None
 
     def run(self):
-        # load the UI into a QDialog parented to the QGIS main window
-        # self.dlg ...
-        self.dialog = uic.loadUi(self.ui_path, QDialog(self.iface.mainWindow()))
-        self.dialog.setFixedSize(1424, 650)
+        # a running normalisation keeps its dialog: just bring it back
+        if self.worker is not None:
+            self.dialog.show()
+            self.dialog.raise_()
+            return
+        # the dialog is built and wired once, then reset on each launch
+        if self.dialog is None:
+            self._build_dialog()
 
         # Grab all raster layers
-        self.layers = [
-            lyr for lyr in QgsProject.instance().mapLayers().values()
-            if isinstance(lyr, QgsRasterLayer)
-        ]
+        self.layers = shared_layer_index().raster_layers()
 
         # Populate tree: one row per layer
         tree = self.dialog.treeLayers
         tree.clear()
         for lyr in self.layers:
-            # Create a 4‐column item
-            item = QTreeWidgetItem(['', lyr.name(), '', ''])
+            # Create a 6‐column item
+            item = QTreeWidgetItem(['', lyr.name(), '', '', '', ''])
             # Make column 0 (“Use?”) checkable
             item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
             item.setCheckState(0, Qt.Unchecked)
@@ -48,24 +598,72 @@ class NormalizeTool:
             combo = QComboBox()
             combo.addItems(EC_STATES)
             tree.setItemWidget(item, 2, combo)
+            # Transfer function combobox (column 4) and its parameters (column 5)
+            combo = QComboBox()
+            combo.addItems(TRANSFER_KINDS)
+            tree.setItemWidget(item, 4, combo)
+            params = QLineEdit()
+            params.setPlaceholderText('e.g. critical=0, reference=40')
+            tree.setItemWidget(item, 5, params)
 
         # set fixed widths (in pixels) per column:
         tree.setColumnWidth(0,  50)   # “Use?” checkbox
-        tree.setColumnWidth(1, 310)   # Layer name
+        tree.setColumnWidth(1, 230)   # Layer name
         tree.setColumnWidth(2, 120)   # EC State combobox
         tree.setColumnWidth(3,  60)   # “Invert?” checkbox
+        tree.setColumnWidth(4,  90)   # Transfer function combobox
+        tree.setColumnWidth(5, 150)   # Transfer parameters
 
         # Populate masks comboboxes
+        self.dialog.comboMinMask.clear()
+        self.dialog.comboMaxMask.clear()
         for lyr in self.layers:
             self.dialog.comboMinMask.addItem(lyr.name())
             self.dialog.comboMaxMask.addItem(lyr.name())
 
+        # the output folder of the previous run is not reused
+        self.dialog.lineFolder.clear()
+        self.dialog.progressBar.setVisible(False)
+        self.dialog.buttonBox.button(QDialogButtonBox.Ok).setEnabled(True)
+        self.dialog.show()
+
+    def _build_dialog(self):
+        # load the UI (cached form class) into a QDialog parented to the QGIS main window
+        self.dialog = load_dialog('tool_normalise_invert.ui', self.iface.mainWindow())
+        self.dialog.setFixedSize(1424, 650)
+
+        # Percentile bounds only apply to the percentile / quantile methods
+        self.dialog.comboMethod.currentIndexChanged.connect(self.updateMethodWidgets)
+        self.updateMethodWidgets(self.dialog.comboMethod.currentIndex())
+        # VRT output cannot clip to the min-mask
+        self.dialog.comboOutput.currentIndexChanged.connect(self.updateOutputWidgets)
+        # the sparse domain is the clipped (min-mask) area
+        self.dialog.checkClip.toggled.connect(self.updateClipWidgets)
+        self.updateClipWidgets(self.dialog.checkClip.isChecked())
+
         # Connect browse button
         self.dialog.btnBrowse.clicked.connect(self.browseFolder)
-        # Connect OK/Cancel
+        # Connect OK/Cancel (Cancel stops a running normalisation first)
         self.dialog.buttonBox.accepted.connect(self.process)
-        self.dialog.buttonBox.rejected.connect(self.dialog.close)
-        self.dialog.show()
+        self.dialog.buttonBox.rejected.connect(self.cancelOrClose)
+
+    def updateMethodWidgets(self, index):
+        use_pct = index != METHOD_MINMAX
+        self.dialog.spinLowPct.setEnabled(use_pct)
+        self.dialog.spinHighPct.setEnabled(use_pct)
+
+    def updateOutputWidgets(self, index):
+        as_vrt = index == OUTPUT_VRT
+        if as_vrt:
+            self.dialog.checkClip.setChecked(False)
+        self.dialog.checkClip.setEnabled(not as_vrt)
+        for widget in (self.dialog.comboCompress, self.dialog.checkOverviews, self.dialog.checkUInt16):
+            widget.setEnabled(not as_vrt)
+
+    def updateClipWidgets(self, checked):
+        if not checked:
+            self.dialog.checkSparse.setChecked(False)
+        self.dialog.checkSparse.setEnabled(checked)
 
     def browseFolder(self):
         folder = QFileDialog.getExistingDirectory(self.dialog, 'Select Output Folder')
@@ -75,7 +673,7 @@ class NormalizeTool:
     def process(self):
         tree = self.dialog.treeLayers
 
-        # Build lists with ec_state and invert flag
+        # Build lists with ec_state, invert flag and transfer function
         tasks = []
         for i in range(tree.topLevelItemCount()):
             item = tree.topLevelItem(i)
@@ -85,85 +683,130 @@ class NormalizeTool:
             lyr = next(l for l in self.layers if l.name() == name)
             ec_state = tree.itemWidget(item, 2).currentText()
             invert = (item.checkState(3) == Qt.Checked)
-            tasks.append({'layer': lyr, 'ec_state': ec_state, 'invert': invert})
+            try:
+                transfer = TransferFunction.from_text(
+                    tree.itemWidget(item, 4).currentText(), tree.itemWidget(item, 5).text()
+                )
+            except ValueError as e:
+                QMessageBox.warning(self.dialog, 'Normalization', f"{name}: {e}")
+                return
+            tasks.append({'name': name, 'source': lyr.source(),
+                          'ec_state': ec_state, 'invert': invert, 'transfer': transfer})
 
         # Now read masks, output settings, etc.
         min_mask_layer = self.layers[self.dialog.comboMinMask.currentIndex()]
         max_mask_layer = self.layers[self.dialog.comboMaxMask.currentIndex()]
         out_folder = self.dialog.lineFolder.text()
-        prefix = self.dialog.linePrefix.text() or ''
-        suffix = self.dialog.lineSuffix.text() or ''
-        clip = self.dialog.checkClip.isChecked()
-        add_proj = self.dialog.checkAdd.isChecked()
         csv_name = self.dialog.lineCSV.text() or 'normalization_summary.csv'
-        csv_path = os.path.join(out_folder, csv_name)
+        self.csv_path = os.path.join(out_folder, csv_name)
+        self.add_proj = self.dialog.checkAdd.isChecked()
+        method = self.dialog.comboMethod.currentIndex()
+        if method == METHOD_MINMAX:
+            p_low, p_high = 0.0, 100.0
+        else:
+            p_low, p_high = self.dialog.spinLowPct.value(), self.dialog.spinHighPct.value()
+        self.method_info = (method, p_low, p_high)
+        settings = {
+            'min_path':   min_mask_layer.source(),
+            'max_path':   max_mask_layer.source(),
+            'out_folder': out_folder,
+            'prefix':     self.dialog.linePrefix.text() or '',
+            'suffix':     self.dialog.lineSuffix.text() or '',
+            'clip':       self.dialog.checkClip.isChecked(),
+            'sparse':     self.dialog.checkSparse.isChecked(),
+            'method':     method,
+            'p_low':      p_low,
+            'p_high':     p_high,
+            'output':     self.dialog.comboOutput.currentIndex(),
+            'compress':   self.dialog.comboCompress.currentText(),
+            'uint16':     self.dialog.checkUInt16.isChecked(),
+            'overviews':  self.dialog.checkOverviews.isChecked(),
+            'dtype':      compute_dtype(),
+        }
+        if settings['output'] == OUTPUT_VRT and settings['clip']:
+            QMessageBox.warning(
+                self.dialog, 'Normalization',
+                'Clipping to the min-mask needs rewritten rasters: choose GeoTIFF output '
+                'or untick the clip option.'
+            )
+            return
+
+        # Show progress, keep Cancel available to stop the run
+        self.dialog.progressBar.setVisible(True)
+        self.dialog.progressBar.setValue(0)
+        self.dialog.progressBar.setFormat("Starting…")
+        self.dialog.buttonBox.button(QDialogButtonBox.Ok).setEnabled(False)
+
+        # Run in the background: layers are normalised by a pool of threads
+        self.thread = QThread()
+        self.worker = NormalizeWorker(tasks, settings)
+        self.worker.moveToThread(self.thread)
+
+        self.thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.onProgress)
+        self.worker.finished.connect(self.onFinished)
+        self.worker.error.connect(self.onError)
+        self.worker.cancelled.connect(self.onCancelled)
+        self.worker.finished.connect(self.thread.quit)
+        self.worker.error.connect(self.thread.quit)
+        self.worker.cancelled.connect(self.thread.quit)
+        self.worker.finished.connect(self.worker.deleteLater)
+        self.worker.cancelled.connect(self.worker.deleteLater)
+        self.thread.finished.connect(self.thread.deleteLater)
+
+        self.thread.start()
+
+    def cancelOrClose(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.dialog.progressBar.setFormat("Cancelling…")
+        else:
+            self.dialog.close()
 
-        # Load mask arrays
-        min_ds = gdal.Open(min_mask_layer.source())
-        max_ds = gdal.Open(max_mask_layer.source())
-        min_arr = min_ds.GetRasterBand(1).ReadAsArray() == 1
-        max_arr = max_ds.GetRasterBand(1).ReadAsArray() == 1
-        # Clip the max‐mask by the min‐mask
-        max_arr = max_arr & min_arr
+    def onProgress(self, percent, text):
+        self.dialog.progressBar.setValue(percent)
+        self.dialog.progressBar.setFormat(f"{text} – %p%")
+
+    def _finish_run(self):
+        self.worker = None
+        self.dialog.progressBar.setVisible(False)
+        self.dialog.buttonBox.button(QDialogButtonBox.Ok).setEnabled(True)
+
+    def onFinished(self, results):
+        self._finish_run()
+        method, p_low, p_high = self.method_info
 
         summary = []
-        for task in tasks:
-            lyr = task['layer']
-            invert = task['invert']
-            ec_state = task['ec_state']
-            name = lyr.name()
-            self.iface.messageBar().pushMessage(
-                f"Processing {name} ({ec_state}, invert={invert})",
-                level=0, duration=5
-            )
-            ds = gdal.Open(lyr.source())
-            arr = ds.GetRasterBand(1).ReadAsArray().astype(float)
-            nod = ds.GetRasterBand(1).GetNoDataValue()
-            valid = (arr != nod) if nod is not None else ~np.isnan(arr)
-
-            # compute and cap
-            mmin = float(np.min(arr[min_arr & valid]))
-            mmax = float(np.max(arr[max_arr & valid]))
-            arr[arr < mmin] = mmin
-            arr[arr > mmax] = mmax
-
-            # normalize / invert
-            norm = (arr - mmin) / (mmax - mmin)
-            if invert:
-                norm = 1 - norm
-
-            # clip
-            if clip:
-                norm[~min_arr] = nod if nod is not None else -9999
-
-            # save raster
-            out_fn = f"{prefix}{name}{suffix}.tif"
-            out_path = os.path.join(out_folder, out_fn)
-            drv = gdal.GetDriverByName('GTiff')
-            out_ds = drv.Create(
-                out_path, ds.RasterXSize, ds.RasterYSize, 1, gdal.GDT_Float32
-            )
-            out_ds.SetGeoTransform(ds.GetGeoTransform())
-            out_ds.SetProjection(ds.GetProjection())
-            band = out_ds.GetRasterBand(1)
-            band.WriteArray(norm.astype(np.float32))
-            band.SetNoDataValue(nod if nod is not None else -9999)
-            out_ds = None
-
-            if add_proj:
-                rl = QgsRasterLayer(out_path, out_fn)
+        for res in results:
+            stats = res['stats'] or {}
+            if self.add_proj:
+                rl = QgsRasterLayer(res['path'], res['file'])
                 QgsProject.instance().addMapLayer(rl)
-
-            summary.append(f"{name},{ec_state},{mmin},{mmax},{invert}")
+            summary.append(
+                f"{res['name']},{res['ec_state']},{res['min']},{res['max']},{res['invert']},"
+                f"{METHOD_NAMES[method]},{p_low},{p_high},\"{res['transfer']}\","
+                + ','.join(str(stats.get(col, '')) for col in SUMMARY_COLUMNS)
+            )
 
         # write CSV
-        with open(csv_path, 'w') as f:
-            f.write('layer,ec_state,min,max,inverted\n')
+        with open(self.csv_path, 'w') as f:
+            f.write('layer,ec_state,min,max,inverted,method,p_low,p_high,transfer,'
+                    + ','.join(SUMMARY_COLUMNS) + '\n')
             f.write('\n'.join(summary))
 
         QMessageBox.information(
             self.iface.mainWindow(),
             'Done',
-            f'Normalization complete.\nSummary saved to {csv_path}'
+            f'Normalization complete.\nSummary saved to {self.csv_path}'
         )
         self.dialog.close()
+
+    def onError(self, message):
+        self._finish_run()
+        QMessageBox.critical(self.dialog, 'Normalization error', message)
+
+    def onCancelled(self):
+        self._finish_run()
+        self.iface.messageBar().pushMessage(
+            "Normalization cancelled; unfinished outputs were removed.", level=1, duration=5
+        )
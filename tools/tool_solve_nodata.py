@@ -32,6 +32,9 @@ from qgis.core import (
 )
 import processing
 
+from .layer_index import shared_layer_index
+from .ui_forms import load_dialog
+
 class SolveNoDataTool:
     def __init__(self, iface, plugin_dir=None):
         import os
@@ -51,7 +54,7 @@ class SolveNoDataTool:
         if not self.dialog:
             # 1) load the UI
             ui_path = os.path.join(self.plugin_dir, "tools", "tool_solve_nodata.ui")
-            self.dialog = uic.loadUi(ui_path, QDialog())
+            self.dialog = load_dialog("tool_solve_nodata.ui")
 
             # 2) Grab all your widgets by their objectName
             self.treeAvail   = self.dialog.findChild(QTreeWidget,    "treeAvailable")
@@ -75,8 +78,8 @@ class SolveNoDataTool:
             self.buttonBox.accepted.connect(self.apply)
             self.buttonBox.rejected.connect(self.dialog.reject)
 
-            # 4) Populate tree & prep table
-            self.populateLayers()
+        # 4) Populate tree & prep table (the dialog is reused across launches)
+        self.populateLayers()
 
         # finally show
         self.dialog.show()
@@ -84,53 +87,21 @@ class SolveNoDataTool:
 
     def populateLayers(self):
         # Fill the left-hand QTreeWidget and reset the right-hand QTableWidget.
-        ## the tree of available rasters
-        self.treeAvail.clear()
         ## the selected-rasters table
         self.tableSel.clearContents()
         self.tableSel.setRowCount(0)
 
-        # 2) Recursive function to add groups & layers
-        def recurse(group_item, parent_widget_item):
-            for child in group_item.children():
-                if isinstance(child, QgsLayerTreeGroup):
-                    w = QTreeWidgetItem([child.name()])
-                    font = w.font(0)
-                    font.setUnderline(True)
-                    w.setFont(0, font)
-                    parent_widget_item.addChild(w)
-                    recurse(child, w)
-                elif isinstance(child, QgsLayerTreeLayer):
-                    lyr = QgsProject.instance().mapLayer(child.layerId())
-                    if isinstance(lyr, QgsRasterLayer):
-                        w = QTreeWidgetItem([lyr.name()])
-                        w.setData(0, Qt.UserRole, lyr.id())
-                        parent_widget_item.addChild(w)
-
-        # 3) Walk the root of the layer tree
-        root = QgsProject.instance().layerTreeRoot()
-        for top in root.children():
-            if isinstance(top, QgsLayerTreeGroup):
-                topItem = QTreeWidgetItem([top.name()])
-                font = topItem.font(0); font.setUnderline(True)
-                topItem.setFont(0, font)
-                self.treeAvail.addTopLevelItem(topItem)
-                recurse(top, topItem)
-            elif isinstance(top, QgsLayerTreeLayer):
-                lyr = QgsProject.instance().mapLayer(top.layerId())
-                if isinstance(lyr, QgsRasterLayer):
-                    itm = QTreeWidgetItem([lyr.name()])
-                    itm.setData(0, Qt.UserRole, lyr.id())
-                    self.treeAvail.addTopLevelItem(itm)
-
-
-        # 4) Allow multi-select
+        # 2) the tree of available rasters: groups & raster layers from the
+        #    shared layer index (only rebuilt when the project changed)
+        shared_layer_index().fill_tree(self.treeAvail)
+
+        # 3) Allow multi-select
         self.treeAvail.setSelectionMode(QAbstractItemView.ExtendedSelection)
 
-        # 5) Expand all so user sees the full hierarchy
+        # 4) Expand all so user sees the full hierarchy
         self.treeAvail.expandAll()
 
-        # 6) prepare the QTableWidget for added rows
+        # 5) prepare the QTableWidget for added rows
         self.tableSel.setColumnCount(2)
         self.tableSel.setHorizontalHeaderLabels(['Layer', 'Short Name (15 charac. max.)'])
         self.tableSel.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
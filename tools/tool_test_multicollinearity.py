@@ -6,129 +6,712 @@ from osgeo import gdal
 from qgis.PyQt import uic
 from qgis.core import QgsProject, QgsRasterLayer, QgsLayerTreeGroup, QgsLayerTreeLayer
 from qgis.PyQt.QtGui import QColor
-from qgis.PyQt.QtWidgets import QDialog, QApplication, QMessageBox, QProgressDialog, QTreeWidgetItem, QFileDialog
-from qgis.PyQt.QtCore import QObject, QThread, pyqtSignal
-from scipy.stats import spearmanr
+from qgis.PyQt.QtWidgets import QDialog, QApplication, QMessageBox, QProgressDialog, QTreeWidgetItem, QFileDialog, QListWidgetItem, QHeaderView
+from qgis.PyQt.QtCore import Qt, QObject, QThread, pyqtSignal, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+
+from .correlation_stats import (
+    INTEGER_GDAL_TYPES,
+    PCA_VARIANCE_TARGET,
+    JointHistograms,
+    RankHistogram,
+    Semivariogram,
+    StreamingMoments,
+    block_statistics,
+    bootstrap_intervals,
+    bootstrap_replicates,
+    edges_from_ranks,
+    edges_to_dense,
+    is_integer_valued,
+    local_pearson,
+    pca_from_corr,
+    prune_by_clusters,
+    prune_by_vif,
+    spatial_block_ids,
+    spearman_from_ranks,
+    standardised_ranks,
+    thinning_selector,
+    thinning_step,
+    tile_pearson,
+    vif_from_corr,
+)
+from .raster_blocks import block_windows, read_strip, read_window, sample_windows, strip_rows
+from .raster_stats_cache import BandSummary, shared_cache, summary_kind
+from .layer_index import misalignment_report, shared_layer_index
+from .indicator_store import IndicatorStore
+from .precision import compute_dtype, read_dtype
+from .sparse_domain import SPARSE_DOMAIN_MAX_FRACTION
+from .ui_forms import form_class
+from .worker_pool import default_workers, process_pool
 
 gdal.UseExceptions()  # enable GDAL Python exceptions and suppress FutureWarning
 
 import csv
 import time
+import importlib.util
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# statsmodels is slow to import: only check it is installed here, and
+# import it (after the NumPy patches old versions need) on first VIF use
+HAVE_STATSMODELS = importlib.util.find_spec('statsmodels') is not None
+_vif_function = None
+
+
+def _patch_numpy_for_statsmodels():
+    # Monkey-patch missing attrs so old statsmodels will import
+    if not hasattr(np, 'long'):
+        np.long = int
+    if not hasattr(np, 'longlong'):
+        np.longlong = int
+
+    if not hasattr(np, 'MachAr'):
+        class MachAr:
+            """
+            Minimal stand-in for numpy.MachAr used by old statsmodels.
+            """
+            def __init__(self):
+                fi = np.finfo(float)
+                self.eps             = fi.eps
+                self.tiny            = fi.tiny
+                self.smallest_normal = fi.tiny
+                self.huge            = fi.max
+
+            def __repr__(self):
+                return f"<patched MachAr eps={self.eps}>"
+
+        np.MachAr = MachAr
+
+
+def variance_inflation_factor(exog, exog_idx):
+    """statsmodels' VIF, imported on first call."""
+    global _vif_function
+    if _vif_function is None:
+        if not HAVE_STATSMODELS:
+            raise ImportError("statsmodels not available")
+        _patch_numpy_for_statsmodels()
+        from statsmodels.stats.outliers_influence import variance_inflation_factor as vif
+        _vif_function = vif
+    return _vif_function(exog, exog_idx)
+
+# nodata value of the local correlation rasters
+LOCAL_NODATA = -9999
+
+# per-layer statistics shown in the Pearson tab and its CSV export
+MOMENT_COLUMNS = ('n', 'mean', 'std', 'min', 'max', 'skewness', 'kurtosis')
+
+# sparse (edge table) mode: PCA components whose loadings are shown (the
+# CSV export holds them all)
+SPARSE_PCA_COMPONENTS = 10
+
+# quick variogram for spatial thinning: sample windows and their side (pixels)
+VARIOGRAM_WINDOWS     = 16
+VARIOGRAM_WINDOW_SIZE = 256
+# thinning never keeps fewer (expected) pixels than this
+MIN_THINNED_PIXELS    = 5000
+
+FORM_CLASS, _ = form_class('tool_test_multicollinearity.ui')
+
+class EdgeTableModel(QAbstractTableModel):
+    # Read-only table of the sparse Spearman result: one row per layer pair.
+    # Qt.UserRole holds the raw values so the proxy sorts numerically.
+    HEADERS = ("Layer A", "Layer B", "ρ", "|ρ|", "NMI")
+
+    def __init__(self, names, edges, nmi=None, parent=None):
+        super().__init__(parent)
+        self.names = names
+        self.i, self.j, self.rho = edges
+        # optional (k x k) normalised mutual information, shown as a 5th column
+        self.nmi = nmi
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rho)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS) if self.nmi is not None else len(self.HEADERS) - 1
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        r, c = index.row(), index.column()
+        rho = float(self.rho[r])
+        values = (self.names[self.i[r]], self.names[self.j[r]], rho, abs(rho))
+        if self.nmi is not None:
+            values += (float(self.nmi[self.i[r], self.j[r]]),)
+        if role == Qt.UserRole:
+            return values[c]
+        if role == Qt.DisplayRole:
+            return values[c] if c < 2 else f"{values[c]:.3f}"
+        if role == Qt.BackgroundRole and c in (2, 3) and abs(rho) >= 0.8:
+            return QColor("#FF9197")
+        return None
+
+
+class CorrelationCancelled(Exception):
+    """Raised inside CorrelationWorker when the user stops the calculation."""
 
-# Monkey-patch missing attrs so old statsmodels will import
-if not hasattr(np, 'long'):
-    np.long = int
-if not hasattr(np, 'longlong'):
-    np.longlong = int
-
-if not hasattr(np, 'MachAr'):
-    class MachAr:
-        """
-        Minimal stand-in for numpy.MachAr used by old statsmodels.
-        """
-        def __init__(self):
-            fi = np.finfo(float)
-            self.eps             = fi.eps
-            self.tiny            = fi.tiny
-            self.smallest_normal = fi.tiny
-            self.huge            = fi.max
-
-        def __repr__(self):
-            return f"<patched MachAr eps={self.eps}>"
-
-    np.MachAr = MachAr
-
-# Now pull in statsmodels safely
-try:
-    from statsmodels.stats.outliers_influence import variance_inflation_factor
-    HAVE_STATSMODELS = True
-except ImportError:
-    HAVE_STATSMODELS = False
-    # define a dummy so code doesn’t break at import time
-    def variance_inflation_factor(*args, **kwargs):
-        raise ImportError("statsmodels not available")
-
-FORM_CLASS, _ = uic.loadUiType(os.path.join(os.path.dirname(__file__), 'tool_test_multicollinearity.ui'))
 
 class CorrelationWorker(QObject):
     # Signals to communicate
-    finished = pyqtSignal(dict)     # will emit a dict of results
-    error    = pyqtSignal(str)      # emit error message
+    finished  = pyqtSignal(dict)     # will emit a dict of results
+    error     = pyqtSignal(str)      # emit error message
+    progress  = pyqtSignal(int, str) # percent done, stage description
+    cancelled = pyqtSignal()         # emitted instead of finished on cancel
 
-    def __init__(self, layer_ids, mask_id, enable_vif=True):
+    def __init__(self, layer_ids, mask_id, enable_vif=True, sparse_threshold=None,
+                 bootstrap=None, thin=False, mutual_info=False):
         super().__init__()
         self.layer_ids = layer_ids
         self.mask_id = mask_id
         self.enable_vif = enable_vif
+        # when set, only pairs with |rho| >= sparse_threshold are kept
+        self.sparse_threshold = sparse_threshold
+        # optional {'replicates', 'block', 'workers'} for the stability analysis
+        self.bootstrap = bootstrap
+        # thin the grid to ~independent pixels using a quick variogram
+        self.thin = thin
+        # accumulate joint histograms for normalised mutual information
+        self.mutual_info = mutual_info
+        # dtype of the pixel stack (toolbox precision policy, read here in
+        # the GUI thread); moments and ranks are float64 either way
+        self.dtype = compute_dtype()
+        self._cancel_requested = False
+
+        # share of the progress bar per stage: loading, ranking, VIF, bootstrap
+        if bootstrap:
+            self.STAGE_LOAD, self.STAGE_RANK = (0, 45), (45, 65)
+            self.STAGE_VIF,  self.STAGE_BOOT = (65, 75), (75, 100)
+        else:
+            self.STAGE_LOAD, self.STAGE_RANK = (0, 60), (60, 85)
+            self.STAGE_VIF,  self.STAGE_BOOT = (85, 100), (100, 100)
+
+    def cancel(self):
+        # Called from the GUI thread; checked between strips, layers and stages
+        self._cancel_requested = True
+
+    def _check_cancel(self):
+        if self._cancel_requested:
+            raise CorrelationCancelled()
+
+    def _report(self, stage, done, total, text):
+        lo, hi = stage
+        self.progress.emit(int(lo + (hi - lo) * done / max(total, 1)), text)
+
+    def _estimate_range(self, bands, mask_band):
+        # Semivariograms pooled over a few windows spread over the raster;
+        # also gives the valid fraction used to cap the thinning step.
+        xsize, ysize = bands[0].XSize, bands[0].YSize
+        windows = sample_windows(xsize, ysize, VARIOGRAM_WINDOW_SIZE, VARIOGRAM_WINDOWS)
+        sv = Semivariogram(len(bands))
+        valid, total = 0, 0
+        for w, (xoff, yoff, wx, wy) in enumerate(windows):
+            self._check_cancel()
+            self._report(self.STAGE_LOAD, 0, 1,
+                         f"Estimating spatial range (window {w+1}/{len(windows)})")
+            stack = np.dstack([read_window(b, xoff, yoff, wx, wy) for b in bands])
+            if mask_band is not None:
+                stack[np.isnan(read_window(mask_band, xoff, yoff, wx, wy))] = np.nan
+            sv.update(stack)
+            valid += int((~np.isnan(stack).any(axis=2)).sum())
+            total += wx * wy
+        ranges = sv.practical_range()
+        expected = xsize * ysize * valid / max(total, 1)
+        return ranges, thinning_step(ranges, expected, MIN_THINNED_PIXELS)
 
     def run(self):
         try:
-            # ** 1. Resolve layer IDs into actual file paths and load **
-            arrays, names = [], []
-            
-            for lid in self.layer_ids:
-                # lid is a QGIS layer ID, so fetch that layer
-                lyr = QgsProject.instance().mapLayer(lid)
-                path = lyr.source() if hasattr(lyr, 'source') else lid
-                ds   = gdal.Open(path)
-                band = ds.GetRasterBand(1)
-                arr  = band.ReadAsArray().astype(float)
-                nod  = band.GetNoDataValue()
-                if nod is not None: arr[arr == nod] = np.nan
-                arrays.append(arr.flatten())
-                names.append(os.path.splitext(os.path.basename(path))[0])
-
-            stacked = np.stack(arrays, axis=1)
-            # ** 2. Mask **
-            if self.mask_id:
-                # mask_id may also be a layer ID
-                mask_lyr = QgsProject.instance().mapLayer(self.mask_id)
-                mpath     = mask_lyr.source() if hasattr(mask_lyr, 'source') else self.mask_id
-                dsm       = gdal.Open(mpath)
-                m = dsm.GetRasterBand(1).ReadAsArray().astype(float)
-                nod = dsm.GetRasterBand(1).GetNoDataValue()
-                if nod is not None: m[m == nod] = np.nan
-                mask_flat = m.flatten()
-                valid = (~np.isnan(stacked).any(1)) & (~np.isnan(mask_flat))
+            self._run()
+        except CorrelationCancelled:
+            # all large buffers are locals of _run() and are released here
+            self.cancelled.emit()
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def _run(self):
+        # ** 1. Resolve layer IDs into actual file paths and open **
+        datasets, bands, names, int_flags, paths, dtypes = [], [], [], [], [], []
+        
+        for lid in self.layer_ids:
+            # lid is a QGIS layer ID, so fetch that layer
+            lyr = QgsProject.instance().mapLayer(lid)
+            path = lyr.source() if hasattr(lyr, 'source') else lid
+            ds   = gdal.Open(path)
+            band = ds.GetRasterBand(1)
+            # integer bands are ranked by counting sort; float bands
+            # (e.g. aligned Float64 class rasters) are checked later
+            is_int = gdal.GetDataTypeName(band.DataType) in INTEGER_GDAL_TYPES
+            int_flags.append(True if is_int else None)
+            dtypes.append(read_dtype(band, self.dtype))
+            datasets.append(ds)
+            bands.append(band)
+            paths.append(path)
+            names.append(os.path.splitext(os.path.basename(path))[0])
+
+        # the stack is float32 only when every layer is exact in float32
+        self.dtype = np.result_type(*dtypes)
+
+        # ** 2. Mask **
+        mask_band = None
+        domain    = None
+        if self.mask_id:
+            # mask_id may also be a layer ID
+            mask_lyr = QgsProject.instance().mapLayer(self.mask_id)
+            mpath     = mask_lyr.source() if hasattr(mask_lyr, 'source') else self.mask_id
+            dsm       = gdal.Open(mpath)
+            mask_band = dsm.GetRasterBand(1)
+            # a mask covering a small part of the grid (e.g. one ecosystem
+            # type): read the layers' stored columns over its pixels only
+            # (a larger mask is only counted: it is read strip by strip)
+            self._report(self.STAGE_LOAD, 0, 1, "Checking the mask area")
+            store = IndicatorStore.open(mpath, None, check=self._check_cancel,
+                                        max_fraction=SPARSE_DOMAIN_MAX_FRACTION)
+            if store is not None:
+                domain = store.domain
+
+        # ** 3. Spatial thinning (optional) **
+        # neighbouring pixels are not independent: keep one pixel every
+        # `step` rows / columns, step ≈ the largest practical variogram range
+        ranges, step = None, 1
+        if self.thin:
+            ranges, step = self._estimate_range(bands, mask_band)
+
+        # ** 4. Stream the stack strip by strip **
+        # keep only the valid rows for ranking, and feed the same rows
+        # to the Pearson / covariance / moments accumulator (no extra I/O)
+        k         = len(bands)
+        xsize     = bands[0].XSize
+        ysize     = bands[0].YSize
+        rows      = strip_rows(bands[0])
+        valid_pix = 0
+        n_strips  = -(-ysize // rows)
+        moments   = StreamingMoments(k)
+        nan_count = np.zeros(k, dtype=np.int64)
+        chunks    = []
+        # spatial block of every kept pixel, for the block bootstrap
+        boot_block = self.bootstrap['block'] if self.bootstrap else 0
+        id_chunks  = []
+        # full-grid summaries of each layer for the shared statistics
+        # cache, accumulated only for layers it does not know yet
+        # (not in sparse mode, which never reads the whole grid)
+        cache     = shared_cache()
+        cached    = [cache.get(path, summary_kind(dtype=d)) for path, d in zip(paths, dtypes)]
+        summaries = [BandSummary() if c is None and domain is None else None for c in cached]
+        # joint histograms binned between each band's min/max (exact when
+        # cached, otherwise GDAL's approximation)
+        joint = None
+        if self.mutual_info:
+            limits = [(c['min'], c['max']) if c is not None and c['valid'] else band.ComputeRasterMinMax(True)
+                      for c, band in zip(cached, bands)]
+            joint  = JointHistograms([lo for lo, _ in limits], [hi for _, hi in limits])
+
+        def keep(block, valid, ids=None):
+            # the valid rows feed the accumulators and are kept for ranking
+            good = block[valid]
+            moments.update(good)
+            if joint is not None:
+                joint.update(good)
+            chunks.append(good)
+            if ids is not None:
+                id_chunks.append(ids[valid])
+
+        if domain is not None:
+            # sparse domain: one compact column per layer (memory-mapped
+            # from the indicator store), pixels in the same (row-major)
+            # order as the strips
+            block = np.empty((domain.size, k), dtype=self.dtype)
+            for i, path in enumerate(paths):
+                self._check_cancel()
+                self._report(self.STAGE_LOAD, i, k, f"Loading layer {i+1}/{k} (mask area)")
+                block[:, i] = store.column(path, self._check_cancel)
+            missing = np.isnan(block)
+            nan_count += missing.sum(axis=0)
+            valid = ~missing.any(1)
+            valid_pix += int(valid.sum())
+            prow, pcol = domain.positions()
+            ids = None
+            if boot_block:
+                ids = (prow // boot_block) * -(-xsize // boot_block) + pcol // boot_block
+            if step > 1:
+                sel = (prow % step == 0) & (pcol % step == 0)
+                block, valid = block[sel], valid[sel]
+                ids = None if ids is None else ids[sel]
+            keep(block, valid, ids)
+            del block, missing, valid, prow, pcol, ids
+        else:
+            for s, (yoff, nrows) in enumerate(block_windows(ysize, rows)):
+                block = np.empty((nrows * xsize, k), dtype=self.dtype)
+                for i, band in enumerate(bands):
+                    self._check_cancel()
+                    self._report(self.STAGE_LOAD, s * k + i, n_strips * k,
+                                 f"Loading layer {i+1}/{k} (strip {s+1}/{n_strips})")
+                    block[:, i] = read_strip(band, yoff, nrows, self.dtype).ravel()
+                    if summaries[i] is not None:
+                        summaries[i].update(block[:, i])
+                missing = np.isnan(block)
+                nan_count += missing.sum(axis=0)
+                valid = ~missing.any(1)
+                if mask_band is not None:
+                    valid &= ~np.isnan(read_strip(mask_band, yoff, nrows, self.dtype).ravel())
+                valid_pix += int(valid.sum())
+                sel = thinning_selector(yoff, nrows, xsize, step) if step > 1 else slice(None)
+                block, valid = block[sel], valid[sel]
+                ids = spatial_block_ids(yoff, nrows, xsize, boot_block)[sel] if boot_block else None
+                keep(block, valid, ids)
+                del block, missing, valid
+        self._check_cancel()
+        for path, summary, d in zip(paths, summaries, dtypes):
+            if summary is not None:
+                cache.put(path, summary_kind(dtype=d), summary.to_dict())
+        filtered = np.concatenate(chunks) if chunks else np.empty((0, k), dtype=self.dtype)
+        chunks = None
+
+        if filtered.shape[0] < 2:
+            raise ValueError("Too few valid pixels to compute correlation.")
+
+        # ** 5. Spearman **
+        # compute the full correlation matrix across columns
+        # (tie-averaged ranks, O(n) counting sort for integer layers),
+        # or, in sparse mode, only the strong pairs, block by block
+        def ranked(i, total):
+            self._check_cancel()
+            self._report(self.STAGE_RANK, i, total, f"Ranking layer {i}/{total}")
+
+        z = standardised_ranks(filtered, int_flags, callback=ranked)
+        if self.sparse_threshold is not None:
+            corr  = None
+            edges = edges_from_ranks(z, self.sparse_threshold)
+        else:
+            corr  = spearman_from_ranks(z)
+            edges = None
+
+        # ** 6. VIF (optional) **
+        if self.enable_vif:
+            # compute VIF only if statsmodels is available (regressions
+            # in float64, also under the float32 policy)
+            exog = filtered.astype(np.float64, copy=False)
+            vifs = []
+            for i in range(k):
+                self._check_cancel()
+                self._report(self.STAGE_VIF, i, k, f"VIF {i+1}/{k}")
+                try:
+                    vifs.append(variance_inflation_factor(exog, i))
+                except Exception:
+                    vifs.append(None)
+            exog = None
+        else:
+            vifs = [None] * k
+        self._check_cancel()
+
+        # ** 7. Bootstrap stability (optional) **
+        boot = None
+        if self.bootstrap:
+            ids  = np.concatenate(id_chunks) if id_chunks else None
+            boot = self._run_bootstrap(z, filtered, moments, ids)
+        self.progress.emit(100, "Done")
+
+        # ** 8. Emit results **
+        nan_summary = {
+            name: int(count) for name, count in zip(names, nan_count)
+        }
+        self.finished.emit({
+            "corr":        corr,
+            "edges":       edges,
+            "sparse_threshold": self.sparse_threshold,
+            "pearson":     moments.pearson(),
+            "cov":         moments.covariance(),
+            "moments":     moments.layer_summary(names),
+            "names":       names,
+            "vif":         vifs,
+            "total_pix":   xsize * ysize,
+            "domain_pix":  None if domain is None else domain.size,
+            "valid_pix":   valid_pix,
+            "sample_pix":  filtered.shape[0],
+            "thin_step":   step,
+            "ranges":      None if ranges is None else ranges.tolist(),
+            "nmi":         None if joint is None else joint.nmi(),
+            "info_corr":   None if joint is None else joint.informational_correlation(),
+            "nan_summary": nan_summary,
+            "bootstrap":   boot
+        })
+
+    def _run_bootstrap(self, z, filtered, moments, block_ids):
+        # Replicates reuse the cached ranks (z) and standardised values: the
+        # block bootstrap only needs per-block sums / cross products, the pixel
+        # bootstrap both arrays. Either way they are saved once to a temporary
+        # folder and memory-mapped by the jobs, which only receive the paths.
+        reps    = self.bootstrap['replicates']
+        workers = self.bootstrap['workers']
+        sd = moments.std()
+        sd[~(sd > 0)] = 1.0
+        zc = np.nan_to_num(z)
+        xs = (filtered - moments.mean) / sd
+
+        tmp_dir = tempfile.mkdtemp(prefix='ecocond_boot_')
+        try:
+            self._report(self.STAGE_BOOT, 0, reps, "Bootstrap: preparing cached ranks")
+            if block_ids is not None:
+                stats  = block_statistics([zc, xs], block_ids)
+                source = {'mode': 'block',
+                          'counts_path': os.path.join(tmp_dir, 'counts.npy'),
+                          'sum_paths':   [os.path.join(tmp_dir, f'sums{a}.npy') for a in range(2)],
+                          'cross_paths': [os.path.join(tmp_dir, f'cross{a}.npy') for a in range(2)]}
+                np.save(source['counts_path'], stats['counts'])
+                for a in range(2):
+                    np.save(source['sum_paths'][a], stats['sums'][a])
+                    np.save(source['cross_paths'][a], stats['cross'][a])
+                stats = None
             else:
-                valid = ~np.isnan(stacked).any(1)
-            filtered = stacked[valid]
-
-            if filtered.shape[0] < 2:
-                raise ValueError("Too few valid pixels to compute correlation.")
-
-            # ** 3. Spearman **
-            # compute the full correlation matrix across columns
-            corr, _ = spearmanr(filtered, axis=0)
-
-            # ** 4. VIF (optional) **
-            df = pd.DataFrame(filtered, columns=names)
-            if self.enable_vif:
-                # compute VIF only if statsmodels is available
-                vifs = []
-                for i in range(df.shape[1]):
-                    try:
-                        vifs.append(variance_inflation_factor(df.values, i))
-                    except Exception:
-                        vifs.append(None)
+                source  = {'mode': 'pixel',
+                           'rank_path':  os.path.join(tmp_dir, 'ranks.npy'),
+                           'value_path': os.path.join(tmp_dir, 'values.npy')}
+                np.save(source['rank_path'], zc)
+                np.save(source['value_path'], xs)
+            zc = xs = None
+            self._check_cancel()
+
+            seeds  = np.random.SeedSequence().generate_state(reps).tolist()
+            n_jobs = max(1, min(reps, workers * 4))
+            jobs   = [seeds[i::n_jobs] for i in range(n_jobs)]
+            try:
+                rho_reps, vif_reps = self._map_replicates(source, jobs, workers, True)
+            except BrokenProcessPool:
+                # spawning processes failed inside QGIS: fall back to threads
+                rho_reps, vif_reps = self._map_replicates(source, jobs, workers, False)
+            return bootstrap_intervals(rho_reps, vif_reps)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _map_replicates(self, source, jobs, workers, use_processes):
+        if use_processes:
+            executor, _ = process_pool(workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+        reps = sum(len(j) for j in jobs)
+        rho_parts, vif_parts, done = [], [], 0
+        try:
+            futures = [executor.submit(bootstrap_replicates, source, job) for job in jobs]
+            for fut in as_completed(futures):
+                if self._cancel_requested:
+                    for f in futures:
+                        f.cancel()
+                    raise CorrelationCancelled()
+                rho, vif = fut.result()
+                rho_parts.append(rho)
+                vif_parts.append(vif)
+                done += rho.shape[0]
+                self._report(self.STAGE_BOOT, done, reps, f"Bootstrap replicate {done}/{reps}")
+        finally:
+            executor.shutdown(wait=True)
+        return np.concatenate(rho_parts), np.concatenate(vif_parts)
+
+class LocalCorrelationWorker(QObject):
+    # Signals to communicate
+    finished = pyqtSignal(list)     # will emit the list of output rasters
+    error    = pyqtSignal(str)      # emit error message
+
+    def __init__(self, pairs, mask_path, out_folder, method='Spearman',
+                 window=11, per_tile=False):
+        """
+        pairs: list of (name_a, path_a, mean_a, name_b, path_b, mean_b);
+        the means centre the values for Pearson maps.
+        """
+        super().__init__()
+        self.pairs      = pairs
+        self.mask_path  = mask_path
+        self.out_folder = out_folder
+        self.method     = method
+        self.window     = window
+        self.per_tile   = per_tile
+
+    def run(self):
+        try:
+            outputs = []
+            for pair in self.pairs:
+                outputs.append(self.map_pair(*pair))
+            self.finished.emit(outputs)
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def _pair_strips(self, ba, bb, mask_band, rows, halo=0):
+        # Yield (yoff, nrows, offset, x, y): strips of both layers read with
+        # `halo` extra rows above/below; pixels missing in either layer (or
+        # outside the mask) are NaN in both. Rows offset..offset+nrows of the
+        # strip are the ones that belong to the output window.
+        ysize = ba.YSize
+        for yoff, nrows in block_windows(ysize, rows):
+            top    = max(0, yoff - halo)
+            bottom = min(ysize, yoff + nrows + halo)
+            x = read_strip(ba, top, bottom - top)
+            y = read_strip(bb, top, bottom - top)
+            invalid = np.isnan(x) | np.isnan(y)
+            if mask_band is not None:
+                invalid |= np.isnan(read_strip(mask_band, top, bottom - top))
+            x[invalid] = np.nan
+            y[invalid] = np.nan
+            yield yoff, nrows, yoff - top, x, y
+
+    def _rank_histograms(self, ba, bb, mask_band, rows):
+        # Two quick passes: value range / integer check, then histograms
+        lo, hi = np.full(2, np.inf), np.full(2, -np.inf)
+        whole = [True, True]
+        for _yoff, _n, _off, x, y in self._pair_strips(ba, bb, mask_band, rows):
+            for i, v in enumerate((x, y)):
+                v = v[~np.isnan(v)]
+                if v.size:
+                    lo[i], hi[i] = min(lo[i], v.min()), max(hi[i], v.max())
+                    whole[i] = whole[i] and is_integer_valued(v)
+        if not np.all(np.isfinite(lo)):
+            raise ValueError("Too few valid pixels to compute correlation.")
+
+        hists = [RankHistogram(lo[i], hi[i], whole[i]) for i in range(2)]
+        for _yoff, _n, _off, x, y in self._pair_strips(ba, bb, mask_band, rows):
+            hists[0].update(x[~np.isnan(x)])
+            hists[1].update(y[~np.isnan(y)])
+        return hists
+
+    def map_pair(self, name_a, path_a, mean_a, name_b, path_b, mean_b):
+        ds_a = gdal.Open(path_a)
+        ds_b = gdal.Open(path_b)
+        ba, bb = ds_a.GetRasterBand(1), ds_b.GetRasterBand(1)
+        mask_band = None
+        if self.mask_path:
+            ds_m = gdal.Open(self.mask_path)
+            mask_band = ds_m.GetRasterBand(1)
+        xsize, ysize = ba.XSize, ba.YSize
+
+        # window = tile size (per tile) or odd moving-window size (per pixel)
+        size = self.window if self.per_tile else (self.window // 2) * 2 + 1
+        half = size // 2
+        rows = strip_rows(ba)
+        if self.per_tile:
+            rows = max(size, (rows // size) * size)
+        else:
+            rows = max(rows, size)
+
+        if self.method == 'Spearman':
+            hist_a, hist_b = self._rank_histograms(ba, bb, mask_band, rows)
+            transform_a, transform_b = hist_a.lookup, hist_b.lookup
+        else:
+            transform_a = lambda v: v - mean_a
+            transform_b = lambda v: v - mean_b
+
+        # ** output raster (coarser grid in per-tile mode) **
+        gt = list(ds_a.GetGeoTransform())
+        if self.per_tile:
+            out_x, out_y = -(-xsize // size), -(-ysize // size)
+            gt[1] *= size; gt[2] *= size; gt[4] *= size; gt[5] *= size
+            mode = f"t{size}"
+        else:
+            out_x, out_y = xsize, ysize
+            mode = f"w{size}"
+        out_fn   = f"localcorr_{self.method.lower()}_{mode}_{name_a}__{name_b}.tif"
+        out_path = os.path.join(self.out_folder, out_fn)
+        drv = gdal.GetDriverByName('GTiff')
+        out_ds = drv.Create(
+            out_path, out_x, out_y, 1, gdal.GDT_Float32,
+            options=['TILED=YES', 'COMPRESS=DEFLATE']
+        )
+        out_ds.SetGeoTransform(gt)
+        out_ds.SetProjection(ds_a.GetProjection())
+        out_band = out_ds.GetRasterBand(1)
+        out_band.SetNoDataValue(LOCAL_NODATA)
+
+        # ** halo-aware strips: each output row sees its full window **
+        halo = 0 if self.per_tile else half
+        for yoff, nrows, off, x, y in self._pair_strips(ba, bb, mask_band, rows, halo):
+            x, y = transform_a(x), transform_b(y)
+            if self.per_tile:
+                r = tile_pearson(x, y, size)
+                out_yoff = yoff // size
             else:
-                vifs = [None] * df.shape[1]
-
-            # ** 5. Emit results **
-            nan_summary = {
-                name: int(np.isnan(arr).sum()) for name, arr in zip(names, arrays)
-            }
-            self.finished.emit({
-                "corr":        corr,
-                "names":       names,
-                "vif":         vifs,
-                "total_pix":   stacked.shape[0],
-                "valid_pix":   filtered.shape[0],
-                "nan_summary": nan_summary
-            })
+                r = local_pearson(x, y, half)[off:off + nrows]
+                out_yoff = yoff
+            r[np.isnan(r)] = LOCAL_NODATA
+            out_band.WriteArray(r.astype(np.float32), 0, out_yoff)
+
+        out_ds = None
+        return out_path
+
+
+class ComponentRasterWorker(QObject):
+    # Signals to communicate
+    finished = pyqtSignal(list)     # will emit the list of output rasters
+    error    = pyqtSignal(str)      # emit error message
+
+    def __init__(self, paths, mask_path, out_folder, means, stds, loadings):
+        """
+        Principal-component score rasters, written strip by strip:
+        score_m = sum_i loadings[i, m] * (x_i - mean_i) / std_i.
+        One output per column of `loadings`.
+        """
+        super().__init__()
+        self.paths      = paths
+        self.mask_path  = mask_path
+        self.out_folder = out_folder
+        self.means      = np.asarray(means, dtype=float)
+        self.stds       = np.where(np.asarray(stds, dtype=float) > 0, stds, 1.0)
+        self.loadings   = np.asarray(loadings, dtype=float)
+
+    def run(self):
+        try:
+            self.finished.emit(self.write_components())
         except Exception as e:
             self.error.emit(str(e))
 
+    def write_components(self):
+        datasets = [gdal.Open(p) for p in self.paths]
+        bands    = [ds.GetRasterBand(1) for ds in datasets]
+        mask_band = None
+        if self.mask_path:
+            ds_m = gdal.Open(self.mask_path)
+            mask_band = ds_m.GetRasterBand(1)
+        xsize, ysize = bands[0].XSize, bands[0].YSize
+
+        # ** one Float32 raster per component **
+        drv = gdal.GetDriverByName('GTiff')
+        outputs, out_paths = [], []
+        for m in range(self.loadings.shape[1]):
+            out_path = os.path.join(self.out_folder, f"pca_pc{m+1}.tif")
+            out_ds = drv.Create(
+                out_path, xsize, ysize, 1, gdal.GDT_Float32,
+                options=['TILED=YES', 'COMPRESS=DEFLATE']
+            )
+            out_ds.SetGeoTransform(datasets[0].GetGeoTransform())
+            out_ds.SetProjection(datasets[0].GetProjection())
+            out_ds.GetRasterBand(1).SetNoDataValue(LOCAL_NODATA)
+            outputs.append(out_ds)
+            out_paths.append(out_path)
+
+        # ** standardise, project and write strip by strip **
+        for yoff, nrows in block_windows(ysize, strip_rows(bands[0])):
+            block = np.empty((nrows * xsize, len(bands)))
+            for i, band in enumerate(bands):
+                block[:, i] = read_strip(band, yoff, nrows).ravel()
+            invalid = np.isnan(block).any(axis=1)
+            if mask_band is not None:
+                invalid |= np.isnan(read_strip(mask_band, yoff, nrows).ravel())
+            block -= self.means
+            block /= self.stds
+            block[invalid] = 0.0
+            scores = block @ self.loadings
+            scores[invalid] = LOCAL_NODATA
+            for m, out_ds in enumerate(outputs):
+                out_ds.GetRasterBand(1).WriteArray(
+                    scores[:, m].reshape(nrows, xsize).astype(np.float32), 0, yoff
+                )
+
+        outputs = None
+        return out_paths
+
+
 class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticollinearityTool
     def __init__(self, iface):
         # parent the dialog to the QGIS main window
@@ -154,6 +737,7 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
         self.btnVerifyAlignment.clicked.connect(self.verifyAlignment)
         self.btnRun.clicked.connect(self.runCorrelation)
         self.btnCancel.clicked.connect(self.reject)
+        self.btnStop.clicked.connect(self.stopCorrelation)
 
         # export buttons
         self.btnExportCSV.clicked.connect(self.exportCSV)
@@ -161,6 +745,25 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
         self.btnCopyClipboard.clicked.connect(self.copyMatrixToClipboard)
         self.btnExportVifCSV.clicked.connect(self.exportVIFCSV)
         self.btnExportVifHTML.clicked.connect(self.exportVIFHTML)
+        self.btnExportPearsonCSV.clicked.connect(self.exportPearsonCSV)
+        self.btnExportEdges.clicked.connect(self.exportEdgeList)
+
+        # redundancy pruning
+        self.btnPruneUpdate.clicked.connect(self.updatePruning)
+        self.btnPruneExportCSV.clicked.connect(self.exportPruningCSV)
+
+        # local correlation maps
+        self.btnLocalBrowse.clicked.connect(self.browseLocalFolder)
+        self.btnLocalRun.clicked.connect(self.runLocalMaps)
+
+        # PCA / eigen diagnostics
+        self.btnPcaBrowse.clicked.connect(self.browsePcaFolder)
+        self.btnPcaRun.clicked.connect(self.runComponentRasters)
+        self.btnPcaExportCSV.clicked.connect(self.exportPcaCSV)
+
+        # bootstrap stability
+        self.spinBootWorkers.setValue(default_workers())
+        self.btnExportBootCSV.clicked.connect(self.exportBootstrapCSV)
 
         # ** define highlight color and cache default **
         self.highlight_style           = "background-color: orange;" # #FF8A24;"
@@ -174,7 +777,7 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
         self.btnRun.setEnabled(False)
 
         self.btnRun.setEnabled(False)
-        self.loadAvailableLayers()
+        # the available layers are loaded by run(), on every launch
 
         # ** Initial highlight **
         self._reset_step_one()
@@ -193,41 +796,18 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
         # ** TEST for list of layers area **
         print(self.treeAvailableLayers)
         
-        self.treeAvailableLayers.clear()
-        root = QgsProject.instance().layerTreeRoot()
+        # groups & raster layers (except the mask) from the shared layer index
+        index = shared_layer_index()
         mask_id = self.cboMaskLayer.currentData()
-
-        def addGroupItems(group, parentItem):
-            for child in group.children():
-                if isinstance(child, QgsLayerTreeGroup):
-                    groupItem = QTreeWidgetItem([child.name()])
-                    font = groupItem.font(0)
-                    font.setUnderline(True)
-                    groupItem.setFont(0, font)
-                    parentItem.addChild(groupItem)
-                    addGroupItems(child, groupItem)
-                elif isinstance(child, QgsLayerTreeLayer):
-                    layer = QgsProject.instance().mapLayer(child.layerId())
-                    if isinstance(layer, QgsRasterLayer) and layer.id() != mask_id:
-                        item = QTreeWidgetItem([layer.name()])
-                        item.setData(0, 1, layer.id())
-                        parentItem.addChild(item)
-
-        for top in root.children():
-            if isinstance(top, QgsLayerTreeGroup):
-                topItem = QTreeWidgetItem([top.name()])
-                font = topItem.font(0)
-                font.setUnderline(True)
-                topItem.setFont(0, font)
-                self.treeAvailableLayers.addTopLevelItem(topItem)
-                addGroupItems(top, topItem)
+        index.fill_tree(self.treeAvailableLayers,
+                        accept=lambda layer: layer.id() != mask_id,
+                        id_role=1, filter_key=mask_id)
 
         self.cboMaskLayer.clear()
         self.cboMaskLayer.addItem("None")  # default option
 
-        for lyr in QgsProject.instance().mapLayers().values():
-            if isinstance(lyr, QgsRasterLayer):
-                self.cboMaskLayer.addItem(lyr.name(), lyr.id())
+        for lyr in index.raster_layers():
+            self.cboMaskLayer.addItem(lyr.name(), lyr.id())
         self.btnRun.setEnabled(False)
 
     # ** Add selected layers (check if repeated) **
@@ -305,20 +885,19 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
             self.btnRun.setEnabled(False)
             return
     
-        # Check alignment against first layer
-        ref_layer = layers[0]
-        for lyr in layers[1:]:
-            if not self.layersAligned(ref_layer, lyr):
-                QMessageBox.warning(
-                    self,
-                    "Alignment Error",
-                    f"Layer '{lyr.name()}' is not aligned with '{ref_layer.name()}'.\n\n"
-                    "Use the 'Align Layers' tool."
-                )
-                # on failure, re-highlight Verify
-                self.btnVerifyAlignment.setStyleSheet(self.highlight_style)
-                self.btnRun.setEnabled(False)
-                return
+        # Group all layers by (cached) grid signature, in one pass
+        clusters = shared_layer_index().grid_clusters(layers)
+        if len(clusters) > 1:
+            QMessageBox.warning(
+                self,
+                "Alignment Error",
+                "The selected layers use different grids:\n\n" + misalignment_report(clusters)
+                + "\n\nUse the 'Align Layers' tool."
+            )
+            # on failure, re-highlight Verify
+            self.btnVerifyAlignment.setStyleSheet(self.highlight_style)
+            self.btnRun.setEnabled(False)
+            return
     
         # All aligned!
         QMessageBox.information(
@@ -333,14 +912,8 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
         self.btnRun.setStyleSheet(self.highlight_style)
 
     def layersAligned(self, l1, l2):
-        return (
-            l1.width() == l2.width() and
-            l1.height() == l2.height() and
-            l1.rasterUnitsPerPixelX() == l2.rasterUnitsPerPixelX() and
-            l1.rasterUnitsPerPixelY() == l2.rasterUnitsPerPixelY() and
-            l1.extent() == l2.extent() and
-            l1.crs() == l2.crs()
-        )
+        index = shared_layer_index()
+        return index.grid_signature(l1) == index.grid_signature(l2)
 
     def getSelectedLayers(self):
         layers = []
@@ -360,27 +933,49 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
             QMessageBox.warning(self, "Not enough layers", "Select at least 2 aligned raster layers.")
             return
 
-        # Show busy indicator
+        # Show staged progress (loading → ranking → VIF)
         self.progressBar.setVisible(True)
-        self.progressBar.setMaximum(0)
+        self.progressBar.setMaximum(100)
+        self.progressBar.setValue(0)
+        self.progressBar.setTextVisible(True)
+        self.progressBar.setFormat("Starting…")
+        self.btnRun.setEnabled(False)
+        self.btnStop.setEnabled(True)
 
         # Prepare worker
         layer_uris = [lyr.dataProvider().dataSourceUri() for lyr in layers]
         mask_id    = self.cboMaskLayer.currentData() or None
+        # keep the inputs for follow-up outputs (local correlation maps)
+        self._layer_paths = layer_uris
+        mask_lyr          = QgsProject.instance().mapLayer(mask_id) if mask_id else None
+        self._mask_path   = mask_lyr.source() if mask_lyr else None
         self.thread = QThread()
         # pass a flag to tell the worker whether to compute VIF
         enable_vif = self.chkEnableVIF.isChecked() and HAVE_STATSMODELS
-        self.worker = CorrelationWorker(layer_uris, mask_id, enable_vif)
+        sparse_threshold = self.spinSparseRho.value() if self.chkSparse.isChecked() else None
+        bootstrap = None
+        if self.chkBootstrap.isChecked():
+            bootstrap = {'replicates': self.spinBootReplicates.value(),
+                         'block':      self.spinBootBlock.value(),
+                         'workers':    self.spinBootWorkers.value()}
+        self.worker = CorrelationWorker(layer_uris, mask_id, enable_vif, sparse_threshold,
+                                        bootstrap, self.chkThin.isChecked(),
+                                        self.chkMutualInfo.isChecked())
         self.worker.moveToThread(self.thread)
 
         # 3) Connect thread/worker signals
         self.thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.onCorrelationProgress)
         self.worker.finished.connect(self.onResultsReady)
         self.worker.error.connect(self.onResultsError)
+        self.worker.cancelled.connect(self.onCorrelationCancelled)
         self.worker.finished.connect(self.thread.quit)
         self.worker.error.connect(self.thread.quit)
+        self.worker.cancelled.connect(self.thread.quit)
         self.worker.finished.connect(self.worker.deleteLater)
+        self.worker.cancelled.connect(self.worker.deleteLater)
         self.thread.finished.connect(self.thread.deleteLater)
+        self._correlation_running = True
 
         # Start
         self.thread.start()
@@ -390,16 +985,22 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
     def onResultsReady(self, data):
 
         # hide spinner + reset run button
+        self._correlation_running = False
+        self.btnStop.setEnabled(False)
         self.progressBar.setVisible(False)
         self.btnRun.setStyleSheet(self.default_btn_run_style)
         self.btnRun.setEnabled(False)
 
         # 1) Unpack everything from the worker
-        corr      = data["corr"]        # numpy matrix
+        corr      = data["corr"]        # numpy matrix (None in sparse mode)
+        edges     = data["edges"]       # (i, j, rho) arrays in sparse mode
         raw_names = data["names"]       # list of filenames, e.g. ['landuse1989.tif', ...]
         vifs      = data["vif"]         # list of floats
         total_pix = data["total_pix"]
         valid_pix = data["valid_pix"]
+        pearson   = data["pearson"]     # Pearson r matrix (streamed)
+        cov       = data["cov"]         # covariance matrix (streamed)
+        moments   = data["moments"]     # per-layer mean/std/min/max/...
 
         # 2) Strip off extensions ('.tif', '.img', etc.)
         names = [os.path.splitext(n)[0] for n in raw_names]
@@ -407,7 +1008,22 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
         # 3) Store for exports
         self._layer_names = names
         self._corr_matrix = corr
+        self._edges       = edges
+        # every reported pair as (i, j, rho); in sparse mode only the strong ones
+        if edges is None:
+            pair_list = [
+                (i, j, corr[i,j])
+                for i in range(len(names)) for j in range(i+1, len(names))
+            ]
+            self._rho_dense = corr
+        else:
+            pair_list = list(zip(*(e.tolist() for e in edges)))
+            self._rho_dense = edges_to_dense(edges, len(names))
         self.vif_data = pd.DataFrame({"layer": names, "VIF": vifs})
+        self._pearson_matrix = pearson
+        self._cov_matrix     = cov
+        self._moments        = moments
+        self._nmi            = data.get("nmi")
 
         # Retrieve NaN‐summary from the worker
         nan_summary = data.get("nan_summary", {})
@@ -419,12 +1035,30 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
             f"<p><i>Based on {valid_pix:,} valid pixels "
             f"out of {total_pix:,} total pixels.</i></p>"
         )
+        if data.get("domain_pix") is not None:
+            # sparse domain: only the mask area was read
+            summary_html += (
+                f"<p><i>Only the {data['domain_pix']:,} pixels inside the mask were read "
+                "(missing data counts refer to that area).</i></p>"
+            )
+        if data.get("ranges") is not None:
+            # thinned to ~independent pixels: this is the effective sample size
+            summary_html += (
+                f"<p><i>Spatially thinned to one pixel every {data['thin_step']} "
+                f"rows/columns: statistics use {data['sample_pix']:,} approximately "
+                f"independent pixels (effective sample size).</i></p>"
+                "<h3>Estimated correlation range (variogram)</h3><ul>"
+            )
+            for name, rng in zip(names, data["ranges"]):
+                display = "N/A (constant layer)" if rng is None or np.isnan(rng) else f"{rng:.1f} pixels"
+                summary_html += f"<li>{name}: {display}</li>"
+            summary_html += "</ul>"
 
         # Strong correlations (|ρ| ≥ 0.8)
         strong = [
-            f"{names[i]} ↔ {names[j]}: ρ = {corr[i,j]:.3f}"
-            for i in range(len(names)) for j in range(i+1, len(names))
-            if abs(corr[i,j]) >= 0.8
+            f"{names[i]} ↔ {names[j]}: ρ = {rho:.3f}"
+            for i, j, rho in pair_list
+            if abs(rho) >= 0.8
         ]
         summary_html += "<h3>Strong Spearman ρ (|ρ| ≥ 0.8)</h3>"
         if strong:
@@ -445,6 +1079,21 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
           summary_html += f"<li>{name}: VIF = {display}{warn}</li>"
         summary_html += "</ul>"
 
+        # Nonlinear redundancy: strong dependence that ρ does not capture
+        info_corr = data.get("info_corr")
+        if info_corr is not None:
+            nonlinear = [
+                f"{names[i]} ↔ {names[j]}: informational r = {info_corr[i, j]:.3f}, "
+                f"NMI = {self._nmi[i, j]:.3f}, ρ = {self._rho_dense[i, j]:.3f}"
+                for i in range(len(names)) for j in range(i+1, len(names))
+                if info_corr[i, j] >= 0.8 and abs(self._rho_dense[i, j]) < 0.8
+            ]
+            summary_html += "<h3>Non-monotonic dependence (mutual information)</h3>"
+            if nonlinear:
+                summary_html += "<ul>" + "".join(f"<li>{s}</li>" for s in nonlinear) + "</ul>"
+            else:
+                summary_html += "<p>No strong dependence beyond the Spearman ρ.</p>"
+
         summary_html += "<h3>Missing data per layer</h3><ul>"
         for layer, count in nan_summary.items():
             summary_html += f"<li>{layer}: {count} missing pixels</li>"
@@ -458,8 +1107,387 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
         # ————————————————————————————————
         # …inside onResultsReady…
 
+        if edges is None:
+            matrix_html = self._matrix_html("Correlation Matrix", corr, names)
+            if self._nmi is not None:
+                # nonlinear dependence, next to ρ
+                matrix_html += self._matrix_html(
+                    "Normalised Mutual Information", self._nmi, names, strong=None
+                )
+            self.htmlMatrix.setHtml(matrix_html)
+            self.tableEdges.setVisible(False)
+            self.htmlMatrix.setVisible(True)
+        else:
+            # sparse: sortable table of the strong pairs instead of k x k HTML
+            self.htmlMatrix.clear()
+            self.htmlMatrix.setVisible(False)
+            self.edge_model = EdgeTableModel(names, edges, data.get("nmi"), self)
+            self.edge_proxy = QSortFilterProxyModel(self)
+            self.edge_proxy.setSourceModel(self.edge_model)
+            self.edge_proxy.setSortRole(Qt.UserRole)
+            self.tableEdges.setModel(self.edge_proxy)
+            self.tableEdges.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+            self.tableEdges.sortByColumn(3, Qt.DescendingOrder)
+            self.tableEdges.setVisible(True)
+            summary_html += (
+                f"<p><i>Sparse mode: {len(pair_list):,} pairs with "
+                f"|ρ| ≥ {data['sparse_threshold']:.2f} (see the matrix tab).</i></p>"
+            )
+            self.htmlSummary.setHtml(summary_html)
+
+        # ————————————————————————————————
+        # 3. BUILD VIF RESULTS TABLE
+        # ————————————————————————————————
+        vif_html = (
+            "<h3>VIF Results</h3>"
+            "<table style='border-collapse:collapse; width:100%; font-family:sans-serif;'>"
+            "<tr>"
+            "<th style='border-top:1px solid black; border-bottom:1px solid black;"
+            " padding:6px;'>Layer</th>"
+            "<th style='border-top:1px solid black; border-bottom:1px solid black;"
+            " padding:6px;'>VIF</th>"
+            "</tr>"
+        )
+        for name, vif in zip(names, vifs):
+            if vif is None:
+                display = "N/A"
+            elif np.isinf(vif):
+                display = "Perfect collinearity"
+            else:
+                display = f"{vif:.2f}"
+            cell_style = "padding:6px; border-top:1px dotted #555; border-bottom:1px dotted #555;"
+            if vif is not None and not np.isinf(vif) and vif >= 10:
+                cell_style += " background-color:#FFDDDD; font-weight:bold;"
+            vif_html += (
+                f"<tr>"
+                f"<td style='{cell_style} text-align:left;'>{name}</td>"
+                f"<td style='{cell_style} text-align:center;'>{display}</td>"
+                "</tr>"
+            )
+        vif_html += "</table>"
+
+        # 5) VIF full‐table HTML (optional)
+        self.htmlVIF.setHtml(vif_html)
+
+        # ————————————————————————————————
+        # 4. BUILD PEARSON / COVARIANCE / LAYER STATISTICS
+        # ————————————————————————————————
+        # (accumulated in the same read as the Spearman ranks)
+        if edges is None:
+            pearson_html = self._matrix_html("Pearson Correlation Matrix", pearson, names)
+            pearson_html += self._matrix_html("Covariance Matrix", cov, names, strong=None, fmt=".4g")
+        else:
+            # sparse: only the pairs above the threshold, not k x k tables
+            pearson_html = self._pearson_edges_html(pearson, names, data['sparse_threshold'])
+        pearson_html += self._moments_html(moments)
+        self.htmlPearson.setHtml(pearson_html)
+
+        # ————————————————————————————————
+        # 5. LOCAL CORRELATION MAPS: candidate pairs
+        # ————————————————————————————————
+        self.populateLocalPairs(names, pair_list)
+
+        # ————————————————————————————————
+        # 6. AUTOMATIC REDUNDANCY PRUNING
+        # ————————————————————————————————
+        self.btnPruneUpdate.setEnabled(True)
+        self.updatePruning()
+
+        # ————————————————————————————————
+        # 7. EIGEN-DECOMPOSITION / PCA
+        # ————————————————————————————————
+        # from the streamed Pearson matrix, i.e. the covariance of the
+        # standardised layers (no second read)
+        self._pca = pca_from_corr(pearson)
+        max_components = SPARSE_PCA_COMPONENTS if edges is not None else None
+        self.htmlPCA.setHtml(self._pca_html(self._pca, names, max_components))
+        self.spinPcaComponents.setMaximum(len(names))
+        self.spinPcaComponents.setValue(self._pca['n_components'])
+        self.btnPcaRun.setEnabled(True)
+        self.btnPcaExportCSV.setEnabled(True)
+
+        # ————————————————————————————————
+        # 8. BOOTSTRAP STABILITY
+        # ————————————————————————————————
+        self._bootstrap = data.get("bootstrap")
+        self.btnExportBootCSV.setEnabled(self._bootstrap is not None)
+        if self._bootstrap is not None:
+            self.htmlBootstrap.setHtml(self._bootstrap_html(self._bootstrap, names, pair_list))
+        else:
+            self.htmlBootstrap.setHtml(
+                "<p><i>Tick “Run bootstrap with the next calculation” and run the "
+                "correlation again to estimate confidence intervals.</i></p>"
+            )
+
+    def _pca_html(self, pca, names, max_components=None):
+        # `max_components` limits the loadings table (sparse mode)
+        header_style = "border-top:1px solid black; border-bottom:1px solid black; padding:6px;"
+        cell_style   = "padding:6px; border-top:1px dotted #555; border-bottom:1px dotted #555;"
+        kappa = pca['condition_number']
+        if kappa >= 30:
+            verdict = "strong collinearity"
+        elif kappa >= 10:
+            verdict = "moderate collinearity"
+        else:
+            verdict = "weak collinearity"
+        kappa_text = "∞" if np.isinf(kappa) else f"{kappa:.1f}"
+
+        html = (
+            f"<p><b>Condition number:</b> {kappa_text} ({verdict}; &lt; 10 weak, "
+            "≥ 30 strong).<br>"
+            f"<b>Dimensionality:</b> {pca['n_components']} of {len(names)} components "
+            f"explain {PCA_VARIANCE_TARGET:.0%} of the variance.</p>"
+            "<h3>Eigenvalues</h3>"
+            "<table style='border-collapse:collapse; width:100%; font-family:sans-serif;'>"
+            f"<tr><th style='{header_style}'>Component</th><th style='{header_style}'>Eigenvalue</th>"
+            f"<th style='{header_style}'>Variance</th><th style='{header_style}'>Cumulative</th>"
+            f"<th style='{header_style}'>Condition index</th></tr>"
+        )
+        for m, (ev, ex, cu, ci) in enumerate(zip(pca['eigenvalues'], pca['explained'],
+                                                 pca['cumulative'], pca['condition_indices'])):
+            style = cell_style
+            if ci >= 30:
+                style += " background-color:#FFDDDD;"
+            ci_text = "∞" if np.isinf(ci) else f"{ci:.1f}"
+            html += (
+                f"<tr><td style='{style} text-align:center;'>PC{m+1}</td>"
+                f"<td style='{style} text-align:center;'>{ev:.4f}</td>"
+                f"<td style='{style} text-align:center;'>{ex:.1%}</td>"
+                f"<td style='{style} text-align:center;'>{cu:.1%}</td>"
+                f"<td style='{style} text-align:center;'>{ci_text}</td></tr>"
+            )
+        html += "</table>"
+
+        n = pca['n_components']
+        title = "Loadings (retained components)"
+        if max_components is not None and n > max_components:
+            n = max_components
+            title = f"Loadings (first {n} components; all of them in the PCA CSV export)"
+        html += self._matrix_html(
+            title, pca['loadings'][:, :n], names, strong=0.5,
+            columns=[f"PC{m+1}" for m in range(n)]
+        )
+        return html
+
+    def _pearson_edges_html(self, pearson, names, threshold):
+        # Sparse mode: the layer pairs with |r| >= threshold as a list; the
+        # full Pearson and covariance matrices are left to the CSV export
+        i, j = np.triu_indices(len(names), 1)
+        r = pearson[i, j]
+        strong = np.flatnonzero(np.abs(r) >= threshold)
+        strong = strong[np.argsort(-np.abs(r[strong]), kind='stable')]
+        html = (
+            f"<h3>Pearson r (|r| ≥ {threshold:.2f})</h3>"
+            f"<p><i>Sparse mode: the {len(names)} x {len(names)} Pearson and covariance "
+            "matrices are not shown; use “Export CSV (Pearson/cov.)” to get them.</i></p>"
+        )
+        if strong.size:
+            html += "<ul>" + "".join(
+                f"<li>{names[i[m]]} ↔ {names[j[m]]}: r = {r[m]:.3f}</li>" for m in strong
+            ) + "</ul>"
+        else:
+            html += "<p>No layer pair above the threshold.</p>"
+        return html
+
+    def browsePcaFolder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Output Folder")
+        if folder:
+            self.linePcaFolder.setText(folder)
+
+    def exportPcaCSV(self):
+        pca = getattr(self, "_pca", None)
+        if pca is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export PCA CSV", "", "CSV files (*.csv)")
+        if path:
+            k = len(self._layer_names)
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["component", "eigenvalue", "explained", "cumulative", "condition_index"])
+                for m in range(k):
+                    writer.writerow([f"PC{m+1}", f"{pca['eigenvalues'][m]:.6f}",
+                                     f"{pca['explained'][m]:.6f}", f"{pca['cumulative'][m]:.6f}",
+                                     f"{pca['condition_indices'][m]:.4f}"])
+                writer.writerow([])
+                writer.writerow(["loading"] + [f"PC{m+1}" for m in range(k)])
+                for name, row in zip(self._layer_names, pca['loadings']):
+                    writer.writerow([name] + [f"{v:.6f}" for v in row])
+
+    def runComponentRasters(self):
+        out_folder = self.linePcaFolder.text().strip()
+        if not out_folder or not os.path.isdir(out_folder):
+            QMessageBox.warning(self, "Principal components", "Please select a valid output folder.")
+            return
+        n = self.spinPcaComponents.value()
+        means = [self._moments[name]['mean'] for name in self._layer_names]
+        stds  = [self._moments[name]['std'] for name in self._layer_names]
+
+        # Show busy indicator
+        self.progressBar.setVisible(True)
+        self.progressBar.setMaximum(0)
+        self.progressBar.setTextVisible(False)
+        self.btnPcaRun.setEnabled(False)
+
+        self.pca_thread = QThread()
+        self.pca_worker = ComponentRasterWorker(
+            self._layer_paths, self._mask_path, out_folder,
+            means, stds, self._pca['loadings'][:, :n]
+        )
+        self.pca_worker.moveToThread(self.pca_thread)
+
+        self.pca_thread.started.connect(self.pca_worker.run)
+        self.pca_worker.finished.connect(self.onComponentRastersReady)
+        self.pca_worker.error.connect(self.onComponentRastersError)
+        self.pca_worker.finished.connect(self.pca_thread.quit)
+        self.pca_worker.error.connect(self.pca_thread.quit)
+        self.pca_worker.finished.connect(self.pca_worker.deleteLater)
+        self.pca_thread.finished.connect(self.pca_thread.deleteLater)
+
+        self.pca_thread.start()
+
+    def onComponentRastersReady(self, paths):
+        self.progressBar.setVisible(False)
+        self.btnPcaRun.setEnabled(True)
+
+        if self.chkPcaAddProject.isChecked():
+            root  = QgsProject.instance().layerTreeRoot()
+            group = root.findGroup("Principal components")
+            if not group:
+                group = root.addGroup("Principal components")
+            for path in paths:
+                rl = QgsRasterLayer(path, os.path.splitext(os.path.basename(path))[0])
+                if rl.isValid():
+                    QgsProject.instance().addMapLayer(rl, False)
+                    group.addLayer(rl)
+
+        QMessageBox.information(
+            self,
+            "Principal components",
+            f"{len(paths)} component raster(s) written to:\n"
+            f"{os.path.dirname(paths[0]) if paths else ''}"
+        )
+
+    def onComponentRastersError(self, message):
+        self.progressBar.setVisible(False)
+        self.btnPcaRun.setEnabled(True)
+        QMessageBox.critical(self, "Principal components error", message)
+
+    def _bootstrap_html(self, boot, names, pair_list, rho_threshold=0.8, vif_threshold=10):
+        header_style = "border-top:1px solid black; border-bottom:1px solid black; padding:6px;"
+        cell_style   = "padding:6px; border-top:1px dotted #555; border-bottom:1px dotted #555;"
+        unstable     = " background-color:#FFF2CC;"
+        level = int(round(boot['level'] * 100))
+
+        html = (
+            f"<p><i>{boot['n']} bootstrap replicates; {level}% percentile intervals. "
+            f"Highlighted rows straddle |ρ| = {rho_threshold:g} or VIF = {vif_threshold:g}, "
+            "i.e. the redundancy decision is not stable.</i></p>"
+            "<h3>Pairwise Spearman ρ</h3>"
+            "<table style='border-collapse:collapse; width:100%; font-family:sans-serif;'>"
+            f"<tr><th style='{header_style}'>Layer A</th><th style='{header_style}'>Layer B</th>"
+            f"<th style='{header_style}'>ρ</th><th style='{header_style}'>{level}% interval</th>"
+            f"<th style='{header_style}'>SD</th></tr>"
+        )
+        for i, j, rho in pair_list:
+            lo, hi = boot['rho_lo'][i, j], boot['rho_hi'][i, j]
+            style = cell_style
+            if min(abs(lo), abs(hi)) < rho_threshold <= max(abs(lo), abs(hi)) or lo < 0 < hi:
+                style += unstable
+            html += (
+                f"<tr><td style='{style} text-align:left;'>{names[i]}</td>"
+                f"<td style='{style} text-align:left;'>{names[j]}</td>"
+                f"<td style='{style} text-align:center;'>{rho:.3f}</td>"
+                f"<td style='{style} text-align:center;'>[{lo:.3f}, {hi:.3f}]</td>"
+                f"<td style='{style} text-align:center;'>{boot['rho_sd'][i, j]:.3f}</td></tr>"
+            )
+        html += "</table>"
+
+        # VIF from the Pearson matrix (centred, as in the pruning tab), the
+        # same basis as the replicates; the VIF tab comes from statsmodels
+        # regressions without a constant (uncentred) and is shown apart
+        point = vif_from_corr(self._pearson_matrix)
+        regression = self.vif_data["VIF"].tolist()
+        html += (
+            "<h3>VIF</h3>"
+            "<p><i>The interval is around the centred VIF (inverse Pearson matrix, as in "
+            "the pruning tab). The VIF tab regresses each layer on the others without a "
+            "constant (uncentred VIF), so its values differ; they are repeated here for "
+            "reference, without interval.</i></p>"
+            "<table style='border-collapse:collapse; width:100%; font-family:sans-serif;'>"
+            f"<tr><th style='{header_style}'>Layer</th><th style='{header_style}'>VIF (centred)</th>"
+            f"<th style='{header_style}'>{level}% interval</th>"
+            f"<th style='{header_style}'>VIF tab (uncentred)</th></tr>"
+        )
+        for i, name in enumerate(names):
+            lo, hi = boot['vif_lo'][i], boot['vif_hi'][i]
+            style = cell_style
+            if lo < vif_threshold <= hi:
+                style += unstable
+            reg = regression[i]
+            if reg is None or pd.isna(reg):
+                reg_text = "N/A"
+            elif np.isinf(reg):
+                reg_text = "Perfect collinearity"
+            else:
+                reg_text = f"{reg:.2f}"
+            html += (
+                f"<tr><td style='{style} text-align:left;'>{name}</td>"
+                f"<td style='{style} text-align:center;'>{point[i]:.2f}</td>"
+                f"<td style='{style} text-align:center;'>[{lo:.2f}, {hi:.2f}]</td>"
+                f"<td style='{style} text-align:center;'>{reg_text}</td></tr>"
+            )
+        html += "</table>"
+        return html
+
+    def exportBootstrapCSV(self):
+        boot = getattr(self, "_bootstrap", None)
+        if boot is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export bootstrap intervals CSV", "", "CSV files (*.csv)")
+        if path:
+            names = self._layer_names
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                for title, key in (("rho_lower", 'rho_lo'), ("rho_upper", 'rho_hi'), ("rho_sd", 'rho_sd')):
+                    writer.writerow([title] + names)
+                    for name, row in zip(names, boot[key]):
+                        writer.writerow([name] + [f"{v:.4f}" for v in row])
+                    writer.writerow([])
+                # intervals of the centred VIF (see the bootstrap tab)
+                point = vif_from_corr(self._pearson_matrix)
+                writer.writerow(["layer", "vif_centred", "vif_lower", "vif_upper"])
+                for name, vif, lo, hi in zip(names, point, boot['vif_lo'], boot['vif_hi']):
+                    writer.writerow([name, f"{vif:.4f}", f"{lo:.4f}", f"{hi:.4f}"])
+
+    def _moments_html(self, moments):
+        # Per-layer summary statistics as an HTML table
+        header_style = "border-top:1px solid black; border-bottom:1px solid black; padding:6px;"
+        cell_style   = "padding:6px; border-top:1px dotted #555; border-bottom:1px dotted #555;"
+        html = (
+            "<h3>Layer statistics (valid pixels)</h3>"
+            "<table style='border-collapse:collapse; width:100%; font-family:sans-serif;'>"
+            "<tr>"
+        )
+        html += f"<th style='{header_style}'>Layer</th>"
+        for col in MOMENT_COLUMNS:
+            html += f"<th style='{header_style}'>{col}</th>"
+        html += "</tr>"
+        for name, stats in moments.items():
+            html += f"<tr><td style='{cell_style} text-align:left;'>{name}</td>"
+            for col in MOMENT_COLUMNS:
+                html += f"<td style='{cell_style} text-align:center;'>{stats[col]:.4g}</td>"
+            html += "</tr>"
+        html += "</table>"
+        return html
+
+    def _matrix_html(self, title, matrix, names, strong=0.8, fmt=".3f", columns=None):
+        # Build the HTML table for a k x k matrix; cells with |value| ≥ strong
+        # are highlighted (strong=None disables it, e.g. for covariances).
+        # `columns` labels a non-square (layers x columns) matrix.
+        square  = columns is None
+        columns = names if square else columns
         # 1) START building the matrix HTML
-        matrix_html = "<h3>Correlation Matrix</h3>"
+        matrix_html = f"<h3>{title}</h3>"
         matrix_html += (
             "<table style='"
             "border-collapse:collapse; width:100%; font-family:sans-serif;"
@@ -475,7 +1503,7 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
             "></th>"
         )
         #   now one <th> per cleaned name
-        for col_name in names:
+        for col_name in columns:
             matrix_html += (
                 f"<th style="
                 "'border-top:1px solid black; "
@@ -494,58 +1522,23 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
                 f"border-bottom:1px dotted #555; padding:6px; "
                 f"text-align:left; font-weight:bold;'>{row_name}</th>"
             )
-            for j, _ in enumerate(names):
-                val = corr[i,j]
+            for j, _ in enumerate(columns):
+                val = matrix[i,j]
                 style = (
                     "text-align:center; padding:6px;"
                     " border-top:1px dotted #555; border-bottom:1px dotted #555;"
                 )
                 # diagonal
-                if i == j:
+                if square and i == j:
                     style += " background-color:#CCC;"
                 # strong
-                elif abs(val) >= 0.8:
+                elif strong is not None and abs(val) >= strong:
                     style += " background-color:#FF9197; font-weight:bold;"
-                matrix_html += f"<td style='{style}'>{val:.3f}</td>"
+                matrix_html += f"<td style='{style}'>{val:{fmt}}</td>"
             matrix_html += "</tr>"
 
         matrix_html += "</table>"
-        self.htmlMatrix.setHtml(matrix_html)
-
-        # ————————————————————————————————
-        # 3. BUILD VIF RESULTS TABLE
-        # ————————————————————————————————
-        vif_html = (
-            "<h3>VIF Results</h3>"
-            "<table style='border-collapse:collapse; width:100%; font-family:sans-serif;'>"
-            "<tr>"
-            "<th style='border-top:1px solid black; border-bottom:1px solid black;"
-            " padding:6px;'>Layer</th>"
-            "<th style='border-top:1px solid black; border-bottom:1px solid black;"
-            " padding:6px;'>VIF</th>"
-            "</tr>"
-        )
-        for name, vif in zip(names, vifs):
-            if np.isinf(vif):
-                display = "Perfect collinearity"
-            else:
-                display = f"{vif:.2f}"
-            cell_style = "padding:6px; border-top:1px dotted #555; border-bottom:1px dotted #555;"
-            if not np.isinf(vif) and vif >= 10:
-                cell_style += " background-color:#FFDDDD; font-weight:bold;"
-            vif_html += (
-                f"<tr>"
-                f"<td style='{cell_style} text-align:left;'>{name}</td>"
-                f"<td style='{cell_style} text-align:center;'>{display}</td>"
-                "</tr>"
-            )
-        vif_html += "</table>"
-
-        # 4) Correlation matrix HTML 
-        self.htmlMatrix.setHtml(matrix_html)
-
-        # 5) VIF full‐table HTML (optional)
-        self.htmlVIF.setHtml(vif_html)
+        return matrix_html
 
     def showEvent(self, event):
         # ** Called whenever the dialog is shown 
@@ -563,11 +1556,230 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
             self.htmlVIF.clear()
         except AttributeError:
             pass
+        self.htmlPearson.clear()
+        self.tableEdges.setModel(None)
+        self.tableEdges.setVisible(False)
+        self.htmlMatrix.setVisible(True)
+        self.listLocalPairs.clear()
+        self.btnLocalRun.setEnabled(False)
+        self.htmlPruning.clear()
+        self.btnPruneUpdate.setEnabled(False)
+        self._pruning = None
+        self.htmlBootstrap.clear()
+        self.btnExportBootCSV.setEnabled(False)
+        self._bootstrap = None
+        self.htmlPCA.clear()
+        self.btnPcaRun.setEnabled(False)
+        self.btnPcaExportCSV.setEnabled(False)
+        self._pca = None
 
         # 3) Reset the step‐by‐step button highlighting
         self._reset_step_one()
 
+    ## *********************************************************************
+    ## Automatic redundancy pruning (VIF elimination path)
+    def updatePruning(self):
+        if getattr(self, "_pearson_matrix", None) is None:
+            return
+        vif_threshold = self.spinPruneVif.value()
+        rho_threshold = self.spinPruneRho.value()
+
+        # VIF from the inverse Pearson matrix, updated by rank-one downdates
+        # at every elimination step; clusters use the Spearman |ρ| shown above
+        t0 = time.perf_counter()
+        if self.cboPruneStrategy.currentIndex() == 1:
+            result = prune_by_clusters(
+                self._rho_dense, self._pearson_matrix, self._layer_names,
+                rho_threshold, vif_threshold
+            )
+        else:
+            result = prune_by_vif(self._pearson_matrix, self._layer_names, vif_threshold)
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        self._pruning = result
+
+        header_style = "border-top:1px solid black; border-bottom:1px solid black; padding:6px;"
+        cell_style   = "padding:6px; border-top:1px dotted #555; border-bottom:1px dotted #555;"
+
+        def fmt_vif(v):
+            return "Perfect collinearity" if np.isinf(v) else f"{v:.2f}"
+
+        html = (
+            f"<p><i>{len(result['kept'])} of {len(self._layer_names)} layers kept "
+            f"(every VIF &lt; {vif_threshold:g}); computed in {elapsed_ms:.1f} ms.</i></p>"
+        )
+        if result.get('clusters'):
+            html += f"<h3>Groups with |ρ| ≥ {rho_threshold:.2f}</h3><ul>"
+            for cl in result['clusters']:
+                if len(cl['members']) > 1:
+                    others = ", ".join(m for m in cl['members'] if m != cl['representative'])
+                    html += f"<li><b>{cl['representative']}</b> represents: {others}</li>"
+            html += "</ul>"
+
+        html += (
+            "<h3>Elimination path</h3>"
+            "<table style='border-collapse:collapse; width:100%; font-family:sans-serif;'>"
+            f"<tr><th style='{header_style}'>Step</th>"
+            f"<th style='{header_style}'>Removed layer</th>"
+            f"<th style='{header_style}'>VIF when removed</th>"
+            f"<th style='{header_style}'>Max VIF afterwards</th></tr>"
+        )
+        for step, entry in enumerate(result['path'], start=1):
+            html += (
+                f"<tr><td style='{cell_style} text-align:center;'>{step}</td>"
+                f"<td style='{cell_style} text-align:left;'>{entry['removed']}</td>"
+                f"<td style='{cell_style} text-align:center;'>{fmt_vif(entry['vif'])}</td>"
+                f"<td style='{cell_style} text-align:center;'>{fmt_vif(entry['max_vif_after'])}</td></tr>"
+            )
+        html += "</table>"
+        if not result['path']:
+            html += "<p>No layer had to be removed by VIF.</p>"
+
+        html += "<h3>Retained layers</h3><ul>"
+        for name in result['kept']:
+            html += f"<li>{name}: VIF = {fmt_vif(result['vif'][name])}</li>"
+        html += "</ul>"
+        self.htmlPruning.setHtml(html)
+
+    def exportPruningCSV(self):
+        if not getattr(self, "_pruning", None):
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export pruning path CSV", "", "CSV files (*.csv)")
+        if path:
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["step", "removed_layer", "vif_when_removed", "max_vif_after"])
+                for step, entry in enumerate(self._pruning['path'], start=1):
+                    writer.writerow([step, entry['removed'],
+                                     f"{entry['vif']:.4f}", f"{entry['max_vif_after']:.4f}"])
+                writer.writerow([])
+                writer.writerow(["kept_layer", "vif"])
+                for name in self._pruning['kept']:
+                    writer.writerow([name, f"{self._pruning['vif'][name]:.4f}"])
+
+    ## *********************************************************************
+    ## Local (moving-window) correlation maps for chosen layer pairs
+    def populateLocalPairs(self, names, pair_list):
+        # one checkable row per pair, strongest |ρ| first
+        self.listLocalPairs.clear()
+        pairs = sorted(pair_list, key=lambda p: -abs(p[2]))
+        for i, j, rho in pairs:
+            item = QListWidgetItem(f"{names[i]} ↔ {names[j]}  (ρ = {rho:.3f})")
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if abs(rho) >= 0.8 else Qt.Unchecked)
+            item.setData(Qt.UserRole, (i, j))
+            self.listLocalPairs.addItem(item)
+        self.btnLocalRun.setEnabled(bool(pairs))
+
+    def browseLocalFolder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Output Folder")
+        if folder:
+            self.lineLocalFolder.setText(folder)
+
+    def runLocalMaps(self):
+        out_folder = self.lineLocalFolder.text().strip()
+        if not out_folder or not os.path.isdir(out_folder):
+            QMessageBox.warning(self, "Local correlation maps", "Please select a valid output folder.")
+            return
+
+        pairs = []
+        for r in range(self.listLocalPairs.count()):
+            item = self.listLocalPairs.item(r)
+            if item.checkState() != Qt.Checked:
+                continue
+            i, j = item.data(Qt.UserRole)
+            a, b = self._layer_names[i], self._layer_names[j]
+            pairs.append((
+                a, self._layer_paths[i], self._moments[a]['mean'],
+                b, self._layer_paths[j], self._moments[b]['mean'],
+            ))
+        if not pairs:
+            QMessageBox.warning(self, "Local correlation maps", "Check at least one layer pair.")
+            return
+
+        # Show busy indicator
+        self.progressBar.setVisible(True)
+        self.progressBar.setMaximum(0)
+        self.progressBar.setTextVisible(False)
+        self.btnLocalRun.setEnabled(False)
+
+        self.local_thread = QThread()
+        self.local_worker = LocalCorrelationWorker(
+            pairs,
+            self._mask_path,
+            out_folder,
+            method=self.cboLocalMethod.currentText(),
+            window=self.spinLocalWindow.value(),
+            per_tile=self.cboLocalMode.currentIndex() == 1,
+        )
+        self.local_worker.moveToThread(self.local_thread)
+
+        self.local_thread.started.connect(self.local_worker.run)
+        self.local_worker.finished.connect(self.onLocalMapsReady)
+        self.local_worker.error.connect(self.onLocalMapsError)
+        self.local_worker.finished.connect(self.local_thread.quit)
+        self.local_worker.error.connect(self.local_thread.quit)
+        self.local_worker.finished.connect(self.local_worker.deleteLater)
+        self.local_thread.finished.connect(self.local_thread.deleteLater)
+
+        self.local_thread.start()
+
+    def onLocalMapsReady(self, paths):
+        self.progressBar.setVisible(False)
+        self.btnLocalRun.setEnabled(True)
+
+        if self.chkLocalAddProject.isChecked():
+            root  = QgsProject.instance().layerTreeRoot()
+            group = root.findGroup("Local correlation maps")
+            if not group:
+                group = root.addGroup("Local correlation maps")
+            for path in paths:
+                rl = QgsRasterLayer(path, os.path.splitext(os.path.basename(path))[0])
+                if rl.isValid():
+                    QgsProject.instance().addMapLayer(rl, False)
+                    group.addLayer(rl)
+
+        QMessageBox.information(
+            self,
+            "Local correlation maps",
+            f"{len(paths)} local correlation raster(s) written to:\n"
+            f"{os.path.dirname(paths[0]) if paths else ''}"
+        )
+
+    def onLocalMapsError(self, message):
+        self.progressBar.setVisible(False)
+        self.btnLocalRun.setEnabled(True)
+        QMessageBox.critical(self, "Local correlation error", message)
+
+    def onCorrelationProgress(self, percent, text):
+        self.progressBar.setValue(percent)
+        self.progressBar.setFormat(f"{text} – %p%")
+
+    def stopCorrelation(self):
+        # cooperative cancel: the worker stops at the next strip / layer
+        if getattr(self, "_correlation_running", False):
+            self.worker.cancel()
+            self.btnStop.setEnabled(False)
+            self.progressBar.setFormat("Stopping…")
+
+    def onCorrelationCancelled(self):
+        self._correlation_running = False
+        self.progressBar.setVisible(False)
+        self.btnStop.setEnabled(False)
+        # alignment was already verified: allow a new run straight away
+        self.btnRun.setEnabled(True)
+        self.btnRun.setStyleSheet(self.highlight_style)
+        self.iface.messageBar().pushMessage(
+            "Multicollinearity assessment", "Calculation stopped.", level=0, duration=5
+        )
+
+    def reject(self):
+        # closing the dialog also stops a running calculation
+        self.stopCorrelation()
+        super().reject()
+
     def onResultsError(self, message):
+        self._correlation_running = False
+        self.btnStop.setEnabled(False)
         self.progressBar.setVisible(False)
         self.thread.quit()
         QMessageBox.critical(self, "Calculation error", message)
@@ -585,6 +1797,11 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
                 writer.writerow([""] + self._layer_names)
                 for name, row in zip(self._layer_names, self._corr_matrix):
                     writer.writerow([name] + [f"{val:.4f}" for val in row])
+                if getattr(self, "_nmi", None) is not None:
+                    writer.writerow([])
+                    writer.writerow(["nmi"] + self._layer_names)
+                    for name, row in zip(self._layer_names, self._nmi):
+                        writer.writerow([name] + [f"{val:.4f}" for val in row])
 
     def exportHTML(self):
         if self._corr_matrix is None:
@@ -627,7 +1844,42 @@ class CheckMulticollinearityDialog(QDialog, FORM_CLASS): # BEFORE: TestMulticoll
         clipboard = QApplication.clipboard()
         clipboard.setText("\n".join(output))
 
+    def exportEdgeList(self):
+        if getattr(self, "_edges", None) is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export edge list", "", "CSV files (*.csv)")
+        if path:
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                nmi = getattr(self, "_nmi", None)
+                writer.writerow(["source", "target", "rho"] + (["nmi"] if nmi is not None else []))
+                for i, j, rho in zip(*self._edges):
+                    row = [self._layer_names[i], self._layer_names[j], f"{rho:.4f}"]
+                    if nmi is not None:
+                        row.append(f"{nmi[i, j]:.4f}")
+                    writer.writerow(row)
+
+    def exportPearsonCSV(self):
+        if getattr(self, "_pearson_matrix", None) is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export Pearson/covariance CSV", "", "CSV files (*.csv)")
+        if path:
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                for title, matrix in (("pearson", self._pearson_matrix),
+                                      ("covariance", self._cov_matrix)):
+                    writer.writerow([title] + self._layer_names)
+                    for name, row in zip(self._layer_names, matrix):
+                        writer.writerow([name] + [f"{val:.6g}" for val in row])
+                    writer.writerow([])
+                writer.writerow(["layer"] + list(MOMENT_COLUMNS))
+                for name, stats in self._moments.items():
+                    writer.writerow([name] + [f"{stats[col]:.6g}" for col in MOMENT_COLUMNS])
+
     def run(self):
-        """Show the dialog modally."""
+        """Show the dialog modally (reused across launches: reset it first)."""
+        self.linePcaFolder.clear()
+        self.lineLocalFolder.clear()
+        self.loadAvailableLayers()
         return self.exec_()
 
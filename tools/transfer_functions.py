@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Transfer functions (indicator value -> 0–1 condition score) for the
+EcoCondition Toolbox normalisation tool
+"""
+
+import numpy as np
+
+# Transfer functions, in the order of the per-layer combobox items
+TRANSFER_KINDS = ('linear', 'piecewise', 'sigmoid', 'threshold', 'log')
+
+# Parameters accepted by each transfer function (see TransferFunction)
+TRANSFER_PARAMS = {
+    'linear':    ('critical', 'reference'),
+    'piecewise': ('points',),
+    'sigmoid':   ('critical', 'reference', 'midpoint', 'steepness'),
+    'threshold': ('critical', 'reference', 'threshold'),
+    'log':       ('critical', 'reference'),
+}
+
+# Samples of a smooth transfer function in a VRT lookup table
+TRANSFER_LUT_SAMPLES = 64
+
+
+class TransferFunction:
+    """
+    A per-layer rescaling of (capped) indicator values to 0–1.
+
+    Parameters are given as text, "key=value" pairs separated by commas:
+
+    - critical / reference: values scoring 0 and 1 (default: the lower and
+      upper normalisation bounds; critical > reference gives a decreasing
+      function), for linear, sigmoid, threshold and log;
+    - points: piecewise-linear breakpoints "value:score" separated by
+      spaces, values strictly increasing, e.g. "points=0:0 10:0.5 40:1"
+      (clamped outside);
+    - midpoint / steepness: sigmoid centre (default halfway) and slope per
+      value unit, positive (default 10 / |reference - critical|);
+    - threshold: scores 1 at and beyond it (default halfway).
+
+    With the quantile method the function receives ranks, so levels are
+    given as ranks (0–1) too.
+
+    `apply` works in place on a float strip: no full-size temporaries.
+    """
+
+    def __init__(self, kind='linear', params=None):
+        if kind not in TRANSFER_KINDS:
+            raise ValueError(f"Unknown transfer function: {kind}")
+        params = dict(params or {})
+        unknown = set(params) - set(TRANSFER_PARAMS[kind])
+        if unknown:
+            raise ValueError(f"{kind}: unknown parameter(s) {', '.join(sorted(unknown))}")
+        self.kind   = kind
+        self.params = params
+        if kind == 'piecewise':
+            points = params.get('points')
+            if not points or len(points) < 2:
+                raise ValueError("piecewise: give at least two points, e.g. points=0:0 10:1")
+            xp, fp = zip(*points)
+            if any(b <= a for a, b in zip(xp, xp[1:])):
+                raise ValueError("piecewise: breakpoint values must be strictly increasing")
+            self.xp, self.fp = np.array(xp, dtype=float), np.array(fp, dtype=float)
+        # levels given explicitly are checked now (defaults when applied)
+        if 'critical' in params and 'reference' in params and params['critical'] == params['reference']:
+            raise ValueError(f"{kind}: critical and reference must differ")
+        if params.get('steepness', 1.0) <= 0:
+            raise ValueError(f"{kind}: steepness must be positive")
+
+    @classmethod
+    def from_text(cls, kind, text):
+        """Parse "key=value, …" parameter text (empty text: defaults)."""
+        params = {}
+        for part in filter(None, (p.strip() for p in (text or '').split(','))):
+            key, sep, value = part.partition('=')
+            key = key.strip().lower()
+            if not sep:
+                raise ValueError(f"{kind}: expected key=value, got '{part}'")
+            if key == 'points':
+                try:
+                    params[key] = [tuple(float(v) for v in pt.split(':'))
+                                   for pt in value.split()]
+                except ValueError:
+                    raise ValueError(f"{kind}: points must look like 0:0 10:0.5 40:1")
+                if any(len(pt) != 2 for pt in params[key]):
+                    raise ValueError(f"{kind}: points must look like 0:0 10:0.5 40:1")
+            else:
+                try:
+                    params[key] = float(value)
+                except ValueError:
+                    raise ValueError(f"{kind}: '{key}' must be a number")
+        return cls(kind, params)
+
+    def describe(self):
+        """Compact text for summaries, e.g. "sigmoid(midpoint=20)"."""
+        if not self.params:
+            return self.kind
+        items = []
+        for key, value in self.params.items():
+            if key == 'points':
+                value = ' '.join(f"{x:g}:{y:g}" for x, y in value)
+            else:
+                value = f"{value:g}"
+            items.append(f"{key}={value}")
+        return f"{self.kind}({'; '.join(items)})"
+
+    def levels(self, lo, hi):
+        """(critical, reference): the values scoring 0 and 1."""
+        c, r = self.params.get('critical', lo), self.params.get('reference', hi)
+        if c == r:
+            raise ValueError(f"{self.kind}: critical and reference levels are equal ({c:g})")
+        return c, r
+
+    def apply(self, x, lo, hi):
+        """
+        Scores (0–1) of the float array `x`, computed in place where
+        possible; NaN stays NaN. `lo` / `hi` are the normalisation bounds.
+        """
+        if self.kind == 'piecewise':
+            return np.interp(x, self.xp, self.fp)
+
+        c, r = self.levels(lo, hi)
+        if self.kind == 'threshold':
+            t = self.params.get('threshold', 0.5 * (c + r))
+            nan = np.isnan(x)
+            hit = (x >= t) if r >= c else (x <= t)
+            x[...] = hit
+            x[nan] = np.nan
+            return x
+
+        span = r - c
+        if self.kind == 'linear':
+            x -= c
+            x /= span
+        elif self.kind == 'log':
+            # log(1 + distance from the critical level), 1 at the reference
+            x -= c
+            x *= np.sign(span)
+            np.maximum(x, 0.0, out=x)
+            np.log1p(x, out=x)
+            x /= np.log1p(abs(span))
+        else:  # sigmoid, rescaled so the critical / reference levels hit 0 / 1
+            m = self.params.get('midpoint', 0.5 * (c + r))
+            k = self.params.get('steepness', 10.0 / abs(span)) * np.sign(span)
+            s0, s1 = (1.0 / (1.0 + np.exp(-k * (v - m))) for v in (c, r))
+            x -= m
+            x *= -k
+            np.exp(x, out=x)
+            x += 1.0
+            np.reciprocal(x, out=x)
+            x -= s0
+            x /= (s1 - s0)
+        np.clip(x, 0.0, 1.0, out=x)
+        return x
+
+    def breakpoints(self, lo, hi):
+        """
+        Input values at which a piecewise-linear approximation of the
+        function (for VRT lookup tables) needs breakpoints.
+        """
+        if self.kind == 'piecewise':
+            return self.xp
+        c, r = self.levels(lo, hi)
+        if self.kind == 'linear':
+            return np.array([c, r])
+        if self.kind == 'threshold':
+            t = self.params.get('threshold', 0.5 * (c + r))
+            eps = max(abs(t), 1.0) * 1e-9
+            return np.array([t - eps, t]) if r >= c else np.array([t, t + eps])
+        return np.linspace(min(c, r), max(c, r), TRANSFER_LUT_SAMPLES)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Cached Qt Designer forms for the EcoCondition Toolbox dialogs
+"""
+
+import os
+from functools import lru_cache
+
+from qgis.PyQt import uic
+
+_TOOLS_DIR = os.path.dirname(__file__)
+
+
+@lru_cache(maxsize=None)
+def form_class(ui_file):
+    """
+    (form class, Qt base class) of tools/<ui_file>: the .ui XML is parsed
+    and compiled once per QGIS session instead of at every uic.loadUi call.
+    """
+    return uic.loadUiType(os.path.join(_TOOLS_DIR, ui_file))
+
+
+@lru_cache(maxsize=None)
+def _dialog_class(ui_file):
+    form, base = form_class(ui_file)
+    name = os.path.splitext(ui_file)[0].title().replace('_', '') + 'Dialog'
+    return type(name, (base, form), {})
+
+
+def load_dialog(ui_file, parent=None):
+    """
+    A dialog built from the cached form class of `ui_file`, with its widgets
+    as attributes (like uic.loadUi(ui_file, QDialog(parent))).
+    """
+    dialog = _dialog_class(ui_file)(parent)
+    dialog.setupUi(dialog)
+    return dialog
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Worker pools for the EcoCondition Toolbox tools
+"""
+
+import os
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def default_workers():
+    """Leave one core for QGIS itself."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def _python_executable():
+    # Inside QGIS sys.executable is usually the QGIS binary, which must not
+    # be used to spawn pool processes: look for the bundled interpreter.
+    exe = sys.executable or ''
+    if os.path.basename(exe).lower().startswith('python'):
+        return exe
+    names = ('pythonw.exe', 'python.exe') if os.name == 'nt' else (
+        f'python{sys.version_info.major}.{sys.version_info.minor}',
+        f'python{sys.version_info.major}', 'python')
+    for folder in (sys.exec_prefix, os.path.join(sys.exec_prefix, 'bin')):
+        for name in names:
+            candidate = os.path.join(folder, name)
+            if os.path.isfile(candidate):
+                return candidate
+    return None
+
+
+def process_pool(max_workers=None):
+    """
+    A ProcessPoolExecutor using a spawned standalone Python interpreter, or
+    a ThreadPoolExecutor when no interpreter can be found (NumPy releases
+    the GIL in its heavy kernels, so threads still scale reasonably).
+    Returns (executor, is_process_pool).
+    """
+    max_workers = max_workers or default_workers()
+    exe = _python_executable()
+    if exe:
+        try:
+            ctx = multiprocessing.get_context('spawn')
+            ctx.set_executable(exe)
+            return ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx), True
+        except (OSError, ValueError):
+            pass
+    return ThreadPoolExecutor(max_workers=max_workers), False